@@ -1,25 +1,47 @@
-import os, json, re
 import numpy as np
-from io import StringIO, BytesIO
+from io import StringIO, BytesIO, TextIOWrapper
 from local_classes.variables import Lists, Dicts
+from local_classes.cache import upload_hash
+from local_classes.profiling import profiled
 import streamlit as st
-from datetime import time, datetime
 import datetime
 import pandas as pd
+from typing import NamedTuple
+from contextlib import ExitStack
 
+#the NAMRIA parser core lives in namria.py, free of Streamlit; re-exported here for the pages
+from namria import (TideReadings, IngestResult, PARSE_CACHE, PARSE_CHUNK_BYTES, hourly_frame, parse_many,
+                    _decode_digits, _decode_fixed_width, _decode_stream)
 
-from pykrige.ok import OrdinaryKriging
+from reprojection import transform_points, block_windows, crs_bounds, degree_lengths, REPROJECT_BLOCK
+from interpolation import interpolate_grid, select_variogram, thin_points, INTERPOLATORS, AUTO_MODELS, THIN_OUTLIER_MAD, GLOBAL_KRIGING_MAX_POINTS, DEFAULT_NEIGHBOURS
 
-import rasterio
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.warp import Resampling
 from rasterio.transform import from_origin
 from rasterio.io import MemoryFile
+from rasterio.shutil import copy as rio_copy
+from rasterio.vrt import WarpedVRT
 from rasterio.crs import CRS
 
 from plotly import graph_objects as go
 
 
 
+# rows per block when streaming surface CSV uploads
+SURFACE_CHUNK_ROWS = 100_000
+SURFACE_COLUMNS = ['Longitude', 'Latitude', 'depth']
+# search radii are entered in meters; approximate length of a degree for geographic surveys
+METERS_PER_DEGREE = 111_320
+# GeoTIFF band descriptions of the surface model
+RASTER_BANDS = ("depth", "kriging_variance")
+# tile size of Cloud-Optimized GeoTIFF exports; overviews are added until a level fits in one tile
+RASTER_BLOCKSIZE = 256
+# PAGASA wind records mark missing values with -999; 16-point compass rose from north
+WIND_MISSING_VALUE = -999
+COMPASS_POINTS = np.array(['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                           'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW'], dtype=object)
+
+
 class ElevationParser:
     def __init__(self):
         #constant List Values
@@ -37,34 +59,45 @@ class ElevationParser:
         return string_data
     
 
-    def parse_data_linestring(self, dataset):
-        '''Parse the string data representation into a compatible dataset'''
-
-        data_collection = {}
-
-        for line_values in dataset.strip().split("\n"):
-            line_values = line_values.rstrip()
-            readings = line_values[:72]
-            mtd = line_values[-8:]
-
-            #reading parser
-            readings = [readings[i:i+3].strip() for i in range(0, 72, 3)]
-            # Convert readings to integers, using NaN for missing values
-            readings = np.array([int(r) if r.isdigit() else np.nan for r in readings])
-
-            #mtd match
-            station_id, month, day, year = [x.strip() for x in (mtd[:2], mtd[2:4], mtd[4:6], mtd[6:])]
-            # st.write(station_id, month, day, year)
-            # Ensure exactly 24 readings
-            while len(readings) < 24:
-                readings.append(np.nan)
-
-            # Store data in dictionary
-            data_collection[f"{month}-{day}-20{year}"] = {                       
-                "Station_ID": station_id,
-                **{f"Hour_{i}": readings[i] for i in range(24)}
-            }
-        return data_collection
+    @profiled
+    def parse_upload(self, upload) -> TideReadings:
+        '''Parse an uploaded NAMRIA file through the parse cache, streaming it in
+        fixed-size blocks on a miss'''
+        key = upload_hash(upload)
+        parsed = PARSE_CACHE.get(key)
+        if parsed is None:
+            parsed = PARSE_CACHE.put(key, self.parse_stream(upload))
+        return parsed
+
+    @profiled
+    def parse_stream(self, stream, chunk_size: int = PARSE_CHUNK_BYTES) -> TideReadings:
+        '''Parse a binary NAMRIA stream incrementally, one block of whole lines at a time'''
+        stream.seek(0)
+        size_hint = getattr(stream, "size", None) or 0
+        return _decode_stream(stream, size_hint=size_hint, chunk_size=chunk_size)
+
+    @profiled
+    def parse_data_linestring(self, dataset) -> TideReadings:
+        '''Parse the NAMRIA fixed-width text (str or bytes) into a columnar dataset.
+        Returns one row of 24 hourly readings per line in file order; readings that are
+        not plain digits or equal to 999 are NaN.'''
+
+        if isinstance(dataset, str):
+            dataset = dataset.encode("utf-8")
+        return _decode_stream(dataset, size_hint=len(dataset))
+
+    @profiled
+    def parse_many(self, files: list, parallel: bool = True) -> IngestResult:
+        '''Parse (name, bytes) pairs concurrently and merge them.
+        Later files win on repeated dates; every repeat is reported.'''
+        return parse_many(files, parallel)
+
+    def parse_uploads(self, uploads: list, parallel: bool = True) -> IngestResult:
+        '''parse_many over uploaded files, read through zero-copy views that are
+        released before returning, so the uploads can still be resized or closed'''
+        with ExitStack() as views:
+            files = [(upload.name, views.enter_context(upload.getbuffer())) for upload in uploads]
+            return self.parse_many(files, parallel)
     
 class TideParser(ElevationParser):
     def __init__(self):
@@ -78,15 +111,135 @@ class TideParser(ElevationParser):
         tide_formatted = [[float(x[0]),  datetime.datetime.strptime(date+" "+x[1].strip(),"%m-%d-%Y %H:%M")] for x in tide_readings]
 
         return station_name, tide_formatted, date
+
+    @profiled
+    def parse_tide_stream(self, upload):
+        '''Streaming variant of parse_tide_data_linestring: decodes the upload one line
+        at a time instead of holding the whole text and its split lines'''
+        upload.seek(0)
+        text = TextIOWrapper(upload, encoding="utf-8")
+        station_name, date, tide_formatted = None, None, []
+        try:
+            for i, line in enumerate(text):
+                line = line.rstrip("\r\n")
+                if i == 0:
+                    station_name = line.strip()
+                if i < 5 or not line.strip():
+                    continue
+                if date is None:
+                    date = line.split(" ")[-1]
+                x = line.strip().split(" ")[:2]
+                tide_formatted.append([float(x[0]), datetime.datetime.strptime(date+" "+x[1].strip(),"%m-%d-%Y %H:%M")])
+        finally:
+            #leave the upload open for the next rerun
+            text.detach()
+
+        return station_name, tide_formatted, date
     
 class WindroseParser(ElevationParser):
     def __init__(self):
         pass
 
+    @profiled
+    def read_wind_csv(self, upload) -> pd.DataFrame:
+        '''Monthly PAGASA wind records (YEAR, MONTH, WIND_SPEED, WIND_DIRECTION) as the windrose frame'''
+        raw = pd.read_csv(upload)
+
+        new_df = pd.DataFrame()
+        #create a dateobject by merging 2 columns of Year and Month
+        new_df["Date"] = pd.to_datetime(raw["YEAR"].astype(str) + "-" + raw["MONTH"].astype(str), format="%Y-%m")
+        new_df["STRDate"] = new_df["Date"].dt.strftime("%Y-%B")
+        new_df["WindSpeed"] = raw["WIND_SPEED"].replace(WIND_MISSING_VALUE, np.nan)
+        new_df["WindDirection"] = raw["WIND_DIRECTION"].replace(WIND_MISSING_VALUE, np.nan)
+        new_df["WindDirectionDesc"] = self.deg_to_compass(new_df["WindDirection"])
+
+        #create a col where it indicates where the wind is blowing to
+        new_df['WindDirectionTo'] = (new_df['WindDirection'] + 180) % 360
+        return new_df
+
+    @staticmethod
+    def deg_to_compass(degrees: pd.Series) -> pd.Series:
+        '''16-point compass names of bearings in degrees, NaN where the bearing is missing'''
+        index = ((degrees % 360) / 22.5 + 0.5).fillna(0).astype(np.int64) % len(COMPASS_POINTS)
+        return pd.Series(COMPASS_POINTS[index.values], index=degrees.index).where(degrees.notna())
+
+class CleanReport(NamedTuple):
+    '''Row counts of a surface cleaning pass; every row read is either kept or dropped for one reason'''
+    rows: int = 0
+    non_numeric: int = 0        # a coordinate or depth that is not a number
+    missing: int = 0            # an empty (NaN/None) or infinite coordinate or depth
+    zero_depth: int = 0
+    out_of_bounds: int = 0      # kept, but outside the area of use of the survey CRS
+    kept: int = 0
+
+    @classmethod
+    def total(cls, reports):
+        return cls(*(sum(values) for values in zip(*reports))) if reports else cls()
+
+
 class SurfaceParser(ElevationParser):
     def __init__(self):
-        pass
+        #variogram chosen and kriging variance of the last kriging run
+        self.variogram = None
+        self.variance = None
+        #cleaning report of the last surface read
+        self.cleaning = CleanReport()
     
+    @profiled
+    def read_surface_csv(self, upload, chunksize: int = SURFACE_CHUNK_ROWS, crs: str = None) -> pd.DataFrame:
+        '''Stream a surface CSV upload in row blocks, cleaning soundings block by block so the
+        raw text and the uncleaned frame are never held at once; the counts land in self.cleaning.
+        Raises KeyError naming the upload when a required column is missing.'''
+        upload.seek(0)
+
+        chunks, reports = [], []
+        for chunk in pd.read_csv(upload, delimiter=",", chunksize=chunksize):
+            missing = [col for col in SURFACE_COLUMNS if col not in chunk.columns]
+            if missing:
+                raise KeyError(f"{getattr(upload, 'name', 'the upload')} has no {', '.join(missing)} column. "
+                               f"Surface CSVs need the columns {', '.join(SURFACE_COLUMNS)}.")
+            cleaned, report = self.clean_soundings(chunk, crs)
+            chunks.append(cleaned)
+            reports.append(report)
+
+        self.cleaning = CleanReport.total(reports)
+        if self.cleaning.kept < self.cleaning.rows:
+            st.toast(f"Removed {self.cleaning.rows - self.cleaning.kept:,} of {self.cleaning.rows:,} soundings during cleanup.")
+        if not chunks:
+            return pd.DataFrame(columns=SURFACE_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    @staticmethod
+    def clean_soundings(df: pd.DataFrame, crs: str = None):
+        '''Coerce coordinates and depth to numbers and drop unusable rows in one vectorized pass:
+        non-numeric, empty or infinite values and zero depths. With a CRS, soundings outside its
+        area of use are counted but kept. Returns the cleaned frame and its CleanReport.'''
+        raw = df[SURFACE_COLUMNS]
+        values = raw.apply(pd.to_numeric, errors="coerce")
+        present = raw.notna().to_numpy()
+        numeric = values.notna().to_numpy()
+        finite = np.isfinite(values.to_numpy(dtype=np.float64))
+
+        non_numeric = (present & ~numeric).any(axis=1)
+        missing = ~non_numeric & ~finite.all(axis=1)
+        zero_depth = ~non_numeric & ~missing & (values['depth'].to_numpy() == 0)
+        keep = ~(non_numeric | missing | zero_depth)
+
+        cleaned = df.loc[keep].assign(**{column: values.loc[keep, column] for column in SURFACE_COLUMNS})
+        cleaned = cleaned.reset_index(drop=True)
+        outside = int(SurfaceParser.out_of_bounds(cleaned, crs).sum()) if crs else 0
+
+        report = CleanReport(len(df), int(non_numeric.sum()), int(missing.sum()), int(zero_depth.sum()),
+                             outside, len(cleaned))
+        return cleaned, report
+
+    @staticmethod
+    def out_of_bounds(df: pd.DataFrame, crs: str) -> np.ndarray:
+        '''Mask of soundings outside the area of use of the CRS, e.g. a survey tagged with the wrong projection'''
+        minx, miny, maxx, maxy = crs_bounds(crs)
+        x, y = df['Longitude'].to_numpy(), df['Latitude'].to_numpy()
+        return (x < minx) | (x > maxx) | (y < miny) | (y > maxy)
+
     def parse_surface_data_linestring(self, surface_data: str):
         # additional processing add here
         if not surface_data:
@@ -94,7 +247,28 @@ class SurfaceParser(ElevationParser):
         else:
             return surface_data
 
-    def interpolate_data(self, data: pd.DataFrame, resolution: int = 10):
+    @profiled
+    def thin_soundings(self, data: pd.DataFrame, cell: float, aggregate: str = "median",
+                       outlier_mad: float = THIN_OUTLIER_MAD):
+        '''One sounding per `cell` (coordinate units, or an (x, y) pair as thinning_cell gives it),
+        outliers rejected per cell first; returns the thinned frame and the interpolation.Thinned report'''
+        thinned = thin_points(data['Longitude'].values, data['Latitude'].values, data['depth'].values,
+                              cell, aggregate=aggregate, outlier_mad=outlier_mad)
+        if not cell:
+            return data, thinned
+        return pd.DataFrame({'Longitude': thinned.x, 'Latitude': thinned.y, 'depth': thinned.z}), thinned
+
+    @profiled
+    def interpolate_data(self, data: pd.DataFrame, resolution: int = 10, method: str = "kriging",
+                         neighbours: int = None, radius: float = None, variogram: str = "linear",
+                         workers: int = None, progress=None):
+        '''Grid the soundings on a resolution x resolution grid with a registered interpolator
+        (interpolation.INTERPOLATORS), in tiles on a process pool. For kriging, neighbours=None picks
+        global kriging for small surveys and the moving window otherwise and 0 forces global kriging,
+        and variogram="auto" picks the cross-validated best model (kept in self.variogram, the kriging
+        variance in self.variance);
+        neighbourhood methods use that many nearest soundings within `radius` (coordinate units),
+        or their own default. `progress(done, total)` is called per tile.'''
 
         # Coords
         x = data['Longitude'].values
@@ -105,31 +279,59 @@ class SurfaceParser(ElevationParser):
         gridx = np.linspace(x.min(), x.max(), resolution)
         gridy = np.linspace(y.min(), y.max(), resolution)
 
-
-        # Create an Ordinary Kriging object
-        OK = OrdinaryKriging(x, y, z, variogram_model='linear', verbose=False, enable_plotting=False)
-        z_interp, ss = OK.execute('grid', gridx, gridy)
+        options = {}
+        if method == "kriging":
+            if neighbours is None:
+                neighbours = 0 if len(z) <= GLOBAL_KRIGING_MAX_POINTS else DEFAULT_NEIGHBOURS
+            #cached by the soundings' hash, so re-gridding the same survey reuses the fit
+            self.variogram = select_variogram(x, y, z, AUTO_MODELS if variogram == "auto" else (variogram,),
+                                              neighbours=neighbours)
+            options = {"neighbours": neighbours, "radius": radius,
+                       "model": self.variogram.model, "params": self.variogram.params}
+        elif INTERPOLATORS[method].local:
+            options = {"radius": radius}
+            if neighbours:
+                options["neighbours"] = neighbours
+
+        #tiles only see the soundings in their halo, so results match a single untiled run
+        z_interp, ss = interpolate_grid(method, x, y, z, gridx, gridy, workers=workers, progress=progress, **options)
+        self.variance = ss
 
         return gridx, gridy, z_interp
 
-    def raster_to_bytes(self, z_interp, gridx, gridy, projection):
-        transform = from_origin(gridx[0], gridy[-1], gridx[1]-gridx[0], gridy[1]-gridy[0])
-        memfile = BytesIO()
-        with rasterio.MemoryFile() as mem:
-            with mem.open(
-                driver='GTiff',
-                height=z_interp.shape[0],
-                width=z_interp.shape[1],
-                count=1,
-                dtype='float32',
-                crs=projection,  # Use appropriate CRS
-                transform=transform
-            ) as dataset:
-                dataset.write(z_interp.astype('float32'), 1)
-            memfile.write(mem.read())
-        memfile.seek(0)
-        return memfile
+    @staticmethod
+    def geotiff_options(compress: str = None) -> dict:
+        '''Creation options of an export: COG when `compress` names a codec, plain GTiff otherwise'''
+        if not compress:
+            return {"driver": "GTiff"}
+        return {"driver": "COG", "compress": compress, "predictor": "YES",
+                "blocksize": RASTER_BLOCKSIZE, "overview_resampling": "average"}
 
+    @staticmethod
+    def write_geotiff(bands: list, transform, crs, compress: str = None) -> BytesIO:
+        '''Float32 GeoTIFF of (name, array) bands with NaN as nodata: a tiled Cloud-Optimized GeoTIFF
+        with internal overviews when `compress` names a codec, the plain striped GTiff otherwise'''
+        height, width = bands[0][1].shape
+        with MemoryFile() as mem:
+            with mem.open(height=height, width=width, count=len(bands), dtype='float32', crs=crs,
+                          transform=transform, nodata=np.nan, **SurfaceParser.geotiff_options(compress)) as dataset:
+                for band, (name, values) in enumerate(bands, start=1):
+                    dataset.write(values.astype('float32', copy=False), band)
+                    dataset.set_band_description(band, name)
+            #one copy out of GDAL's memory file; BytesIO shares those bytes instead of copying them again
+            return BytesIO(mem.read())
+
+    @profiled
+    def raster_to_bytes(self, z_interp, gridx, gridy, projection, variance=None, compress: str = None):
+        '''GeoTIFF of the surface, north up; the kriging variance, when given, is written as band 2'''
+        #grid nodes are cell centres and the grid rows run south to north
+        dx, dy = gridx[1] - gridx[0], gridy[1] - gridy[0]
+        transform = from_origin(gridx[0] - dx / 2, gridy[-1] + dy / 2, dx, dy)
+        bands = [z_interp] if variance is None else [z_interp, variance]
+        return self.write_geotiff([(name, np.flipud(values)) for name, values in zip(RASTER_BANDS, bands)],
+                                  transform, projection, compress)
+
+    @profiled
     def surface_fig(self, gridx, gridy, z_interp, fig , **kwargs):
 
         # colorscale from kwargs
@@ -172,90 +374,45 @@ class SurfaceParser(ElevationParser):
         fig.update_traces(contours_z=dict(show=True, usecolormap=True,
                                   highlightcolor="limegreen", project_z=True))
 
-    def reproject_memfile(self, memfile: BytesIO, dst_crs: str = 'EPSG:4326') -> BytesIO:
+    @profiled
+    def reproject_memfile(self, memfile: BytesIO, dst_crs: str = 'EPSG:4326', compress: str = None,
+                          block: int = REPROJECT_BLOCK) -> BytesIO:
+        '''Warp a GeoTIFF to another CRS through a WarpedVRT, reading and writing one block at a time.
+        A compressed export is warped into a tiled GTiff with the same codec and translated to COG
+        once at the end, so the warped bands are only ever held compressed.'''
         memfile.seek(0) #starting pointer at zero
 
-        with MemoryFile(memfile) as src_mem:
-            with src_mem.open() as src:
-                src_crs = src.crs
-                src_transform = src.transform
-                src_data = src.read(1)
-                src_height, src_width = src.shape
-
-                #calc target transform and shape
-                transform, width, height = calculate_default_transform(
-                    src_crs, dst_crs, src_width, src_height,
-                    *src.bounds
-                )
-
-                dst_data = np.empty((height, width), dtype=np.float32)
-
-                # reproj the data
-                reproject(
-                    source=src_data,
-                    destination=dst_data,
-                    src_transform=src_transform,
-                    src_crs=src_crs,
-                    dst_transform=transform,
-                    dst_crs=dst_crs,
-                    resampling=Resampling.bilinear
-                )
-
-                out_memfile = BytesIO()
-                with MemoryFile() as mem:
-                    with mem.open(
-                        driver='GTiff',
-                        height=height,
-                        width=width,
-                        count=1,
-                        dtype='float32',
-                        crs=dst_crs,
-                        transform=transform
-                    ) as dst:
-                        dst.write(dst_data, 1)
-                    out_memfile.write(mem.read())
-                out_memfile.seek(0)
-                return out_memfile          
+        with MemoryFile(memfile) as src_mem, src_mem.open() as src:
+            #target transform and shape as calculate_default_transform gives them
+            with WarpedVRT(src, crs=dst_crs, resampling=Resampling.bilinear, src_nodata=np.nan, nodata=np.nan) as vrt:
+                layout = {"driver": "GTiff"}
+                if compress:
+                    layout.update(tiled=True, blockxsize=RASTER_BLOCKSIZE, blockysize=RASTER_BLOCKSIZE,
+                                  compress=compress, predictor=3)
+                with MemoryFile() as warped:
+                    with warped.open(height=vrt.height, width=vrt.width, count=vrt.count, dtype='float32', crs=dst_crs,
+                                     transform=vrt.transform, nodata=np.nan, **layout) as dst:
+                        for window in block_windows(vrt.height, vrt.width, block):
+                            dst.write(vrt.read(window=window).astype('float32', copy=False), window=window)
+                        for band, name in enumerate(src.descriptions, start=1):
+                            dst.set_band_description(band, name or f"band_{band}")
+                    if not compress:
+                        return BytesIO(warped.read())
+
+                    with MemoryFile() as cog:
+                        with warped.open() as tiled:
+                            rio_copy(tiled, cog.name, **self.geotiff_options(compress))
+                        return BytesIO(cog.read())
+
+    @staticmethod
+    def reproject_soundings(data: pd.DataFrame, src_crs: str, dst_crs: str) -> pd.DataFrame:
+        '''Soundings with Longitude/Latitude moved to another CRS by a cached pyproj transformer'''
+        x, y = transform_points(data['Longitude'].values, data['Latitude'].values, src_crs, dst_crs)
+        return data.assign(Longitude=x, Latitude=y)
 
     def temp_save(self, rdata):
         st.session_state['raster_data_cache'] = rdata
 
-    def validate_df(self, df: pd.DataFrame):
-        '''Validate the DataFrame for surface data'''
-        if df.empty:
-            st.toast("The DataFrame is empty. Please upload a valid surface data file.")
-            return False
-        
-        required_columns = ['Longitude', 'Latitude', 'depth']
-        if not all(col in df.columns for col in required_columns):
-            st.toast(f"The DataFrame must contain the following columns: {', '.join(required_columns)}")
-            return False
-        
-        if df[required_columns].isnull().values.any():
-            st.toast("The DataFrame contains NaN values. Performing Cleanup...")
-            return False
-        
-        # check all rows if they have None Long, Lat, and depth
-        if df[required_columns].map(lambda x: x is None).any().any():
-            st.toast("The DataFrame contains None values in Longitude, Latitude, or depth columns. Performing Cleanup...")
-            return False
-        
-        return True
-
-    def remove_incomplete_rows(self, df: pd.DataFrame):
-        '''Remove rows with NaN values in Longitude, Latitude, or depth columns'''
-        if df.empty:
-            return df
-        else:
-            return df.dropna(subset=['Longitude', 'Latitude', 'depth']).reset_index(drop=True)
-        
-    def remove_zero_depth_rows(self, df: pd.DataFrame):
-        '''Remove rows with zero depth values'''
-        if df.empty:
-            return df
-        else:
-            return df[df['depth'] != 0].reset_index(inplace=True,drop=True)
-    
     #other methodsss
     @staticmethod
     def choose_projection():
@@ -272,6 +429,25 @@ class SurfaceParser(ElevationParser):
         st.caption('Choose the projection used during the survey. This will affect how the data is displayed on the map. If unsure, use the default UTM Zone 51N.')
         return projections[proj]
     
+    @staticmethod
+    def choose_export_projections():
+        '''Choose the CRSs the surface is exported in, and how it gets there'''
+        projections = Dicts.PROJECTIONS.value
+        targets = st.multiselect(
+            "Export Projections",
+            projections.keys(),
+            default=[name for name in projections if projections[name]["ALIAS"] in ("UTM51N", "WGS84")],
+            help="One GeoTIFF is produced per projection."
+        )
+        modes = Dicts.REPROJECTION_MODES.value
+        mode = st.selectbox(
+            "Reprojection",
+            modes.keys(),
+            index=0,
+            help="Resampling warps the finished raster and is quick. Re-gridding moves the soundings into each projection and interpolates again, so the raster is exact but takes one interpolation per projection."
+        )
+        return [projections[name] for name in targets], modes[mode]
+
     @staticmethod
     def choose_colorscale():
         '''Choose the colorscale for the surface data'''
@@ -299,12 +475,119 @@ class SurfaceParser(ElevationParser):
     @staticmethod
     def resolution_slider():
         '''Choose the resolution for the surface data'''
-        resolution = st.slider('Resolution', min_value=20, max_value=200, value=10,
+        resolution = st.slider('Resolution', min_value=20, max_value=400, value=10,
                                help='Adjust the resolution of the surface model. Higher values result in finer detail but longer processing time.')
         st.caption("Adjust the resolution of the surface model. Higher values result in finer detail but longer processing time.")
         return resolution
     
 
+    @staticmethod
+    def choose_interpolator():
+        '''Choose the interpolation method for the surface data'''
+        methods = {interpolator.label: name for name, interpolator in INTERPOLATORS.items()}
+        method = st.selectbox(
+            "Interpolation Method",
+            methods.keys(),
+            index=0,
+            help="Kriging gives the final product and its variance. IDW, linear TIN and local RBF are fast previews for field QA."
+        )
+        st.caption("Use the fast methods to check a survey quickly, then switch back to kriging for the deliverable.")
+        return methods[method]
+
+    @staticmethod
+    def choose_variogram():
+        '''Choose the kriging variogram model for the surface data'''
+        models = Dicts.VARIOGRAM_MODELS.value
+        model = st.selectbox(
+            "Variogram Model",
+            models.keys(),
+            index=0,
+            help="Kriging only. Automatic fits every model to the survey and keeps the one with the lowest cross-validated error."
+        )
+        return models[model]
+
+    @staticmethod
+    def thinning_options():
+        '''Choose how the soundings are thinned before interpolation'''
+        cell = st.number_input('Thinning Cell (m)', min_value=0.0, value=0.0, step=1.0,
+                               help='Replace the soundings inside each cell of this size by one. 0 keeps every sounding.')
+        aggregates = Dicts.THINNING_AGGREGATES.value
+        aggregate = st.selectbox("Thinning Aggregate", aggregates.keys(), index=0,
+                                 help="How the soundings left in a cell are combined.")
+        outlier_mad = st.number_input('Outlier Rejection (MAD)', min_value=0.0, value=THIN_OUTLIER_MAD, step=0.5,
+                                      help='Drop soundings further than this many median absolute deviations from their cell median, in cells of three or more. 0 keeps them.')
+        st.caption("Echo-sounder logs repeat nearly the same sounding along survey lines. A cell of a few meters cuts the problem size with little loss of detail.")
+        return cell, aggregates[aggregate], outlier_mad
+
+    @staticmethod
+    def kriging_neighbourhood():
+        '''Choose the kriging neighbourhood for the surface data'''
+        modes = Dicts.KRIGING_NEIGHBOURHOODS.value
+        mode = st.selectbox(
+            "Kriging Neighbourhood",
+            modes.keys(),
+            index=0,
+            help="Global kriging solves one system over every sounding; the moving window kriges each grid node from its nearest soundings only. Neighbours and radius also apply to IDW and RBF when set to Moving window."
+        )
+        neighbours = st.slider('Neighbours', min_value=4, max_value=128, value=DEFAULT_NEIGHBOURS,
+                               help='Moving window only: number of nearest soundings used for each grid node.')
+        radius = st.number_input('Search Radius (m)', min_value=0.0, value=0.0, step=50.0,
+                                 help='Moving window only: soundings farther than this are ignored. 0 searches without a limit.')
+        st.caption(f"Automatic uses global kriging up to {GLOBAL_KRIGING_MAX_POINTS:,} soundings and a {DEFAULT_NEIGHBOURS}-neighbour moving window above that. Grid nodes with no sounding inside the search radius are left blank.")
+
+        if modes[mode] == "auto":
+            return None, None
+        if modes[mode] == "global":
+            return 0, None
+        return neighbours, radius or None
+
+    @staticmethod
+    def search_radius(radius_m: float, projection: dict):
+        '''Search radius in meters converted to the units of the survey coordinates'''
+        if not radius_m:
+            return None
+        if CRS.from_user_input(projection["COMPLETE_CRS_CODE"]).is_geographic:
+            return radius_m / METERS_PER_DEGREE
+        return radius_m
+
+    @staticmethod
+    def thinning_cell(cell_m: float, projection: dict, latitude: float):
+        '''Thinning cell in meters in the units of the survey coordinates. For a geographic CRS it
+        is (degrees of longitude, degrees of latitude) spanning `cell_m` at the survey's latitude.'''
+        if not cell_m:
+            return None
+        crs = projection["COMPLETE_CRS_CODE"]
+        if CRS.from_user_input(crs).is_geographic:
+            per_lon, per_lat = degree_lengths(crs, latitude)
+            return cell_m / per_lon, cell_m / per_lat
+        return cell_m
+
+    @staticmethod
+    def choose_export():
+        '''Choose the GeoTIFF layout and compression of the raster download'''
+        exports = Dicts.RASTER_EXPORTS.value
+        export = st.selectbox(
+            "Raster Export",
+            exports.keys(),
+            index=0,
+            help="Cloud-optimized GeoTIFFs are tiled and compressed, with internal overviews, and open faster in QGIS. ZSTD is smallest; LZW is the most widely readable."
+        )
+        return exports[export]
+
+    @staticmethod
+    def variance_mask():
+        '''Choose the kriging variance above which the surface is hidden'''
+        threshold = st.number_input('Variance Mask (m²)', min_value=0.0, value=0.0, step=0.1,
+                                    help='Kriging only: hide cells whose kriging variance is above this value, in the figure and the downloaded surface band. 0 shows every cell.')
+        return threshold or None
+
+    @staticmethod
+    def mask_variance(z_interp, variance, threshold):
+        '''Surface with the cells above the variance threshold blanked'''
+        if variance is None or not threshold:
+            return z_interp
+        return np.where(variance > threshold, np.nan, z_interp)
+
     @staticmethod
     def contour_interval():
         '''Choose the contour interval for the surface data'''
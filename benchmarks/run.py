@@ -0,0 +1,314 @@
+'''Time the tideHunter engines on synthetic data and compare against saved baselines.
+
+    python -m benchmarks.run                      # run everything, print a table
+    python -m benchmarks.run --quick -k namria    # small sizes, cases matching "namria"
+    python -m benchmarks.run --save               # store results as the "baseline"
+    python -m benchmarks.run --compare            # diff against the stored baseline
+
+Wall time is the median of the repeats after one warm-up call. Peak memory is
+measured on a separate call under tracemalloc, which sees numpy and pandas
+buffers as well as Python objects.
+'''
+import os
+import io
+import sys
+import json
+import logging
+import platform
+import argparse
+import tracemalloc
+import statistics
+from time import perf_counter
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+# a case slower than its baseline by more than this fraction is flagged
+DEFAULT_THRESHOLD = 0.15
+MIB = 1024 * 1024
+
+CASES = {}
+
+
+def case(name: str, param: str, sizes: tuple, quick: tuple):
+    '''Register a benchmark; the decorated function does the setup for one size
+    and returns the zero-argument callable that gets timed'''
+    def register(setup):
+        CASES[name] = {"param": param, "sizes": sizes, "quick": quick, "setup": setup}
+        return setup
+    return register
+
+
+def upload(data: bytes, name: str = "upload"):
+    '''In-memory stand-in for a Streamlit UploadedFile'''
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return buffer
+
+
+@case("namria_parse", "years", (1, 10, 50), quick=(1, 10))
+def namria_parse(years):
+    from appcore import ElevationParser
+    data = synthetic.namria_text(years)
+    return lambda: ElevationParser().parse_data_linestring(data)
+
+
+@case("namria_ingest", "files", (2, 10), quick=(2,))
+def namria_ingest(files):
+    from appcore import ElevationParser
+    from namria import ParseCache
+    payloads = [(f"st{i}.lev", synthetic.namria_text(5, start=f"{2000 + 5 * i}-01-01", seed=i)) for i in range(files)]
+    cache = ParseCache(spill=False)
+
+    def run():
+        #measure parsing, not the cache
+        cache.clear()
+        with patch("namria.PARSE_CACHE", cache):
+            return ElevationParser().parse_many(payloads)
+    return run
+
+
+@case("namria_summary", "years", (1, 10, 50), quick=(1, 10))
+def namria_summary(years):
+    from appcore import ElevationParser
+    from tidestats import summarize
+    series = ElevationParser().parse_data_linestring(synthetic.namria_text(years)).consolidate().to_series()
+    return lambda: summarize(series)
+
+
+@case("wxtide_parse", "cadence_min", (1, 5), quick=(5,))
+def wxtide_parse(cadence):
+    from appcore import TideParser
+    data = synthetic.wxtide_text(days=7, cadence=cadence)
+    return lambda: TideParser().parse_tide_stream(upload(data))
+
+
+@case("wind_read", "rows", (480, 50_000), quick=(480,))
+def wind_read(rows):
+    from appcore import WindroseParser
+    data = synthetic.wind_csv(rows)
+    return lambda: WindroseParser().read_wind_csv(upload(data))
+
+
+@case("surface_read", "points", (1_000, 20_000, 200_000), quick=(1_000, 20_000))
+def surface_read(points):
+    from appcore import SurfaceParser
+    data = synthetic.bathymetry_csv(points)
+    return lambda: SurfaceParser().read_surface_csv(upload(data))
+
+
+@case("kriging", "points", (1_000, 2_000), quick=(1_000,))
+def kriging(points):
+    from appcore import SurfaceParser
+    data = synthetic.bathymetry_points(points)
+    return lambda: SurfaceParser().interpolate_data(data, resolution=100, neighbours=0)
+
+
+@case("kriging_local", "points", (20_000, 200_000), quick=(20_000,))
+def kriging_local(points):
+    from appcore import SurfaceParser
+    data = synthetic.bathymetry_points(points)
+    return lambda: SurfaceParser().interpolate_data(data, resolution=100)
+
+
+@case("thinning", "points", (20_000, 200_000), quick=(20_000,))
+def thinning(points):
+    from interpolation import thin_points
+    data = synthetic.bathymetry_points(points)
+    #about 50 m cells over Manila Bay
+    return lambda: thin_points(data["Longitude"], data["Latitude"], data["depth"], cell=0.00045)
+
+
+@case("variogram_select", "points", (2_000, 200_000), quick=(2_000,))
+def variogram_select(points):
+    import interpolation
+    data = synthetic.bathymetry_points(points)
+
+    def run():
+        #measure the fit and cross-validation, not the cache
+        interpolation._VARIOGRAM_CACHE.clear()
+        return interpolation.select_variogram(data["Longitude"], data["Latitude"], data["depth"])
+    return run
+
+
+@case("interpolators", "method", ("idw", "linear", "rbf"), quick=("idw",))
+def interpolators(method):
+    from appcore import SurfaceParser
+    data = synthetic.bathymetry_points(100_000)
+    return lambda: SurfaceParser().interpolate_data(data, resolution=200, method=method)
+
+
+@case("station_search", "queries", (1, 100), quick=(1,))
+def station_search(queries):
+    from local_classes.variables import Tools, RESOURCES
+    primary = pd.read_csv(os.path.join(RESOURCES, "geospatial", "primary_stations.csv"))
+    secondary = pd.read_csv(os.path.join(RESOURCES, "geospatial", "secondary_stations.csv"))
+    points = [tuple(p) for p in synthetic.query_points(queries)]
+    return lambda: [Tools.calculate_distances_from_points(p, primary, secondary, 5) for p in points]
+
+
+@case("station_index", "queries", (1_000, 100_000), quick=(1_000,))
+def station_index(queries):
+    from local_classes.variables import RESOURCES
+    from stations import StationIndex
+    primary = pd.read_csv(os.path.join(RESOURCES, "geospatial", "primary_stations.csv"))
+    secondary = pd.read_csv(os.path.join(RESOURCES, "geospatial", "secondary_stations.csv"))
+    index = StationIndex.from_frames(primary, secondary)
+    points = synthetic.query_points(queries)
+    return lambda: index.query(points[:, 0], points[:, 1], 5)
+
+
+@case("vector_tiles", "max_zoom", (8, 12), quick=(8,))
+def vector_tiles(max_zoom):
+    import geopandas as gpd
+    from vectortiles import cut_tiles, SHAPEFILES, MIN_ZOOM
+    #the one bundled overlay whose geometry ships with the repo
+    layer = gpd.read_file(os.path.join(SHAPEFILES, "typhoon_tracks", "typhoon_traversing_r3.shp"),
+                          columns=["SID", "NAME", "NATURE"])
+    return lambda: sum(len(tile) for *_, tile in cut_tiles(layer, "typhoon_tracks", range(MIN_ZOOM, max_zoom + 1)))
+
+
+def measure(fn, repeat: int, budget: float) -> dict:
+    '''Median/min wall time over up to `repeat` calls (stopping once `budget` seconds
+    are spent) and the peak traced allocation of one more call'''
+    fn()
+    times = []
+    while len(times) < repeat and (not times or sum(times) < budget):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeats": len(times),
+            "peak_mib": peak / MIB}
+
+
+def run_cases(pattern: str = None, quick: bool = False, repeat: int = 5, budget: float = 10.0) -> dict:
+    results = {}
+    for name, spec in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        for size in spec["quick"] if quick else spec["sizes"]:
+            key = f"{name}[{spec['param']}={size}]"
+            fn = spec["setup"](size)
+            results[key] = measure(fn, repeat, budget)
+            print(f"{key:<40} {results[key]['median_s']*1000:>10.2f} ms {results[key]['peak_mib']:>9.1f} MiB",
+                  file=sys.stderr)
+    return results
+
+
+def environment() -> dict:
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, results: dict):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = baseline_path(name)
+
+    #keep cases from earlier runs that were filtered out of this one
+    stored = load_baseline(name) or {"results": {}}
+    stored["results"].update(results)
+    stored["environment"] = environment()
+    with open(path, "w") as f:
+        json.dump(stored, f, indent=1, sort_keys=True)
+    print(f"Saved {len(results)} results to {path}")
+
+
+def load_baseline(name: str) -> dict:
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> pd.DataFrame:
+    '''Side-by-side table of current and baseline timings; `regression` marks slowdowns past the threshold'''
+    rows = []
+    for key, now in results.items():
+        before = baseline["results"].get(key)
+        row = {"case": key, "ms": now["median_s"] * 1000, "peak_mib": now["peak_mib"]}
+        if before:
+            row.update({
+                "base_ms": before["median_s"] * 1000,
+                "time_change": now["median_s"] / before["median_s"] - 1,
+                "base_peak_mib": before["peak_mib"],
+                "mem_change": now["peak_mib"] / before["peak_mib"] - 1 if before["peak_mib"] else np.nan,
+            })
+        rows.append(row)
+
+    table = pd.DataFrame(rows).set_index("case")
+    if "time_change" in table:
+        table["regression"] = table["time_change"] > threshold
+    return table
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="tideHunter benchmarks")
+    parser.add_argument("-k", "--filter", help="Only cases whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Run the small sizes only")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per case (default 5)")
+    parser.add_argument("--budget", type=float, default=10.0, help="Stop repeating a case after this many seconds")
+    parser.add_argument("--save", nargs="?", const="baseline", metavar="NAME", help="Save results as a baseline")
+    parser.add_argument("--compare", nargs="?", const="baseline", metavar="NAME", help="Diff against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown reported as a regression (default 0.15)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the raw results to PATH")
+    args = parser.parse_args(argv)
+
+    #the parsers report through st.toast, which only logs outside a Streamlit session
+    logging.disable(logging.WARNING)
+
+    results = run_cases(args.filter, args.quick, args.repeat, args.budget)
+    if not results:
+        print("No benchmark matched.", file=sys.stderr)
+        return 1
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=1)
+
+    status = 0
+    baseline = load_baseline(args.compare) if args.compare else None
+    if args.compare and baseline is None:
+        print(f"No baseline named {args.compare!r} in {BASELINE_DIR}", file=sys.stderr)
+        status = 1
+
+    table = compare(results, baseline or {"results": {}}, args.threshold)
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.max_columns", None, "display.float_format", "{:.3f}".format):
+        print(table)
+
+    if baseline is not None and "regression" in table and table["regression"].any():
+        print(f"\n{int(table['regression'].sum())} case(s) slower than the baseline by more than {args.threshold:.0%}")
+        status = 1
+
+    if args.save:
+        save_baseline(args.save, results)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
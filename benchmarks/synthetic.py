@@ -0,0 +1,93 @@
+'''Synthetic inputs for the benchmarks, shaped like the files the app accepts.
+
+Every generator is seeded, so a given size always produces the same bytes and
+timings stay comparable between runs and machines.
+'''
+import numpy as np
+import pandas as pd
+
+# Manila Bay, roughly; keeps coordinates and station distances realistic
+BAY_BOUNDS = (120.55, 14.35, 120.95, 14.80)
+PH_BOUNDS = (117.0, 5.0, 126.5, 20.5)
+
+# principal lunar and solar semidiurnal, luni-solar diurnal constituents (period h, amplitude cm)
+CONSTITUENTS = ((12.42, 45.0), (12.00, 20.0), (23.93, 25.0))
+MEAN_LEVEL = 150.0
+
+
+def tide_curve(hours: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    '''Harmonic tide level in cm at the given hours since the start, with noise'''
+    level = np.full(hours.shape, MEAN_LEVEL)
+    for period, amplitude in CONSTITUENTS:
+        level += amplitude * np.sin(2 * np.pi * hours / period + rng.uniform(0, 2 * np.pi))
+    return level + rng.normal(0, 3, hours.shape)
+
+
+def namria_text(years: float, station: str = "MN", start: str = "2000-01-01",
+                missing: float = 0.01, seed: int = 0) -> bytes:
+    '''NAMRIA fixed-width hourly file: 24 three-digit readings and a station/date stamp per day'''
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, periods=int(round(years * 365.25)), freq="D")
+
+    levels = tide_curve(np.arange(len(days) * 24, dtype=np.float64), rng)
+    readings = np.clip(np.rint(levels), 0, 998).astype(np.int64).reshape(-1, 24)
+    readings[rng.random(readings.shape) < missing] = 999
+
+    stamps = [f"{station}{d.day:2d}{d.month:02d}{d.year % 100:02d}" for d in days]
+    lines = ["".join(f"{v:3d}" for v in row) + stamp for row, stamp in zip(readings.tolist(), stamps)]
+    return ("\r\n".join(lines) + "\r\n").encode("ascii")
+
+
+def wxtide_text(days: int = 1, cadence: int = 5, station: str = "Manila, Manila Bay, Philippines",
+                start: str = "2025-01-15", seed: int = 0) -> bytes:
+    '''WXTide32 text export: station name, four header lines, then "level HH:MM MM-DD-YYYY" rows'''
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(start, periods=days * 24 * 60 // cadence, freq=f"{cadence}min")
+    levels = (tide_curve(np.arange(len(stamps)) * cadence / 60.0, rng) - MEAN_LEVEL) / 100 + 0.6
+
+    header = [station, "Lat 14.5833N Long 120.9667E", "Units: meters", "Time zone: PST", ""]
+    rows = [f"{level:.3f} {stamp:%H:%M} {stamp:%m-%d-%Y}" for level, stamp in zip(levels, stamps)]
+    return ("\n".join(header + rows) + "\n").encode("ascii")
+
+
+def wind_csv(rows: int = 120, start_year: int = 1980, years: int = 45, missing: float = 0.02, seed: int = 0) -> bytes:
+    '''PAGASA monthly wind record with YEAR, MONTH, WIND_SPEED and WIND_DIRECTION (-999 missing).
+    Beyond `years` of records the calendar repeats, as in a file holding several stations.'''
+    rng = np.random.default_rng(seed)
+    months = np.arange(rows)
+    frame = pd.DataFrame({
+        "YEAR": start_year + (months // 12) % years,
+        "MONTH": months % 12 + 1,
+        "WIND_SPEED": np.round(rng.gamma(2.0, 1.5, rows), 1),
+        "WIND_DIRECTION": rng.integers(0, 36, rows) * 10,
+    })
+    for column in ("WIND_SPEED", "WIND_DIRECTION"):
+        frame.loc[rng.random(rows) < missing, column] = -999
+    return frame.to_csv(index=False).encode("ascii")
+
+
+def bathymetry_points(points: int = 1000, bounds: tuple = BAY_BOUNDS, seed: int = 0) -> pd.DataFrame:
+    '''Scattered soundings over a smooth sloping seabed, positive depth in meters'''
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    lon = rng.uniform(minx, maxx, points)
+    lat = rng.uniform(miny, maxy, points)
+
+    u, v = (lon - minx) / (maxx - minx), (lat - miny) / (maxy - miny)
+    depth = 2 + 25 * u * (1 - 0.4 * v) + 3 * np.sin(6 * u) * np.cos(4 * v) + rng.normal(0, 0.3, points)
+    return pd.DataFrame({"Longitude": lon, "Latitude": lat, "depth": np.round(depth, 2)})
+
+
+def bathymetry_csv(points: int = 1000, incomplete: float = 0.01, seed: int = 0) -> bytes:
+    '''Surface CSV as uploaded to the Modeller, with a share of incomplete rows'''
+    frame = bathymetry_points(points, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    frame.loc[rng.random(points) < incomplete, "depth"] = np.nan
+    return frame.to_csv(index=False).encode("ascii")
+
+
+def query_points(points: int = 100, bounds: tuple = PH_BOUNDS, seed: int = 0) -> np.ndarray:
+    '''(lat, lon) pairs to look up tide stations for'''
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    return np.column_stack([rng.uniform(miny, maxy, points), rng.uniform(minx, maxx, points)])
@@ -0,0 +1,508 @@
+import os
+import atexit
+import threading
+import numpy as np
+from typing import NamedTuple, Callable
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scipy.optimize import least_squares
+from scipy.spatial import cKDTree, Delaunay
+from scipy.spatial.distance import pdist
+from scipy.interpolate import LinearNDInterpolator, RBFInterpolator
+from pykrige.ok import OrdinaryKriging
+from pykrige import variogram_models
+
+from local_classes.cache import content_hash, LRUCache
+
+# kept free of Streamlit so the Modeller, the CLI and the benchmarks share one engine
+VARIOGRAM_FUNCTIONS = {
+    "linear": variogram_models.linear_variogram_model,
+    "power": variogram_models.power_variogram_model,
+    "gaussian": variogram_models.gaussian_variogram_model,
+    "spherical": variogram_models.spherical_variogram_model,
+    "exponential": variogram_models.exponential_variogram_model,
+}
+# above this many soundings the global system (n x n) is replaced by the moving window
+GLOBAL_KRIGING_MAX_POINTS = 1500
+DEFAULT_NEIGHBOURS = 32
+# scratch memory for one batch of kriging systems; a batch holds about 5 (neighbours + 1)^2 doubles per node
+KRIGING_BATCH_BYTES = 64 * 1024 * 1024
+# soundings used to fit the variogram of a large survey
+VARIOGRAM_SAMPLE = 2000
+# distance bins of the empirical variogram, as in pykrige
+VARIOGRAM_LAGS = 6
+# candidates of the automatic variogram choice, scored by k-fold cross-validation on the subsample
+AUTO_MODELS = ("linear", "spherical", "exponential", "gaussian")
+CV_FOLDS = 5
+# pykrige's tolerance for a grid node sitting on a sounding
+EXACT_EPS = 1e-10
+# output grid nodes per tile side; tiles are interpolated independently and stitched back
+TILE_SIZE = 64
+# below this many output nodes, starting workers and shipping them soundings costs more than gridding inline
+PARALLEL_MIN_NODES = 4 * TILE_SIZE ** 2
+# the tile pool is shared by every session of the server, so it stays small
+TILE_MAX_WORKERS = 4
+# global kriging rebuilds the n x n system per tile, so its tiles are sized by the (nodes x n)
+# right-hand sides pykrige holds instead, about three doubles per node and sounding
+GLOBAL_TILE_BYTES = 256 * 1024 * 1024
+# thinning: soundings further than this many scaled MADs from their cell median are rejected
+THIN_OUTLIER_MAD = 3.0
+MAD_TO_SIGMA = 1.4826
+# defaults of the quick-look interpolators
+IDW_NEIGHBOURS = 12
+IDW_POWER = 2.0
+RBF_NEIGHBOURS = 32
+RBF_KERNEL = "thin_plate_spline"
+
+
+class EmpiricalVariogram(NamedTuple):
+    '''Mean separation and semivariance of sounding pairs, per distance bin'''
+    lags: np.ndarray
+    semivariance: np.ndarray
+    pairs: np.ndarray
+
+
+class VariogramFit(NamedTuple):
+    '''The chosen variogram model, with the fit and cross-validation error of every candidate'''
+    model: str
+    params: list
+    rmse: float
+    scores: dict            # model -> cross-validated RMSE
+    fitted: dict            # model -> parameters
+    empirical: EmpiricalVariogram
+
+
+def _subsample(x, y, z, sample: int, seed: int):
+    x, y, z = (np.asarray(a, dtype=np.float64) for a in (x, y, z))
+    if len(z) > sample:
+        keep = np.random.default_rng(seed).choice(len(z), sample, replace=False)
+        x, y, z = x[keep], y[keep], z[keep]
+    return x, y, z
+
+
+def empirical_variogram(x, y, z, lags: int = VARIOGRAM_LAGS) -> EmpiricalVariogram:
+    '''Semivariance in equal-width distance bins, binned as pykrige bins it; empty bins are dropped'''
+    d = pdist(np.column_stack([x, y]))
+    g = 0.5 * pdist(np.asarray(z, dtype=np.float64)[:, None], metric="sqeuclidean")
+
+    edges = d.min() + (d.max() - d.min()) / lags * np.arange(lags + 1)
+    edges[-1] = d.max() + 0.001
+    bins = np.clip(np.searchsorted(edges, d, side="right") - 1, 0, lags - 1)
+    pairs = np.bincount(bins, minlength=lags)
+    filled = pairs > 0
+    return EmpiricalVariogram(np.bincount(bins, d, lags)[filled] / pairs[filled],
+                              np.bincount(bins, g, lags)[filled] / pairs[filled], pairs[filled])
+
+
+def fit_model(empirical: EmpiricalVariogram, model: str) -> list:
+    '''Soft-L1 least-squares fit of a variogram model, from pykrige's starting values and bounds'''
+    lags, semivariance = empirical.lags, empirical.semivariance
+    if model == "linear":
+        spread = np.ptp(lags)
+        x0 = [np.ptp(semivariance) / spread if spread else 0.0, semivariance.min()]
+        lower, upper = [0.0, 0.0], [np.inf, semivariance.max()]
+    else:
+        x0 = [np.ptp(semivariance), 0.25 * lags.max(), semivariance.min()]
+        lower, upper = [0.0, 0.0, 0.0], [10.0 * semivariance.max(), lags.max(), semivariance.max()]
+    #a flat variogram collapses the bounds, which least_squares rejects
+    upper = np.maximum(upper, np.asarray(lower) + EXACT_EPS)
+    x0 = np.clip(x0, lower, upper)
+
+    function = VARIOGRAM_FUNCTIONS[model]
+    result = least_squares(lambda p: function(p, lags) - semivariance, x0, bounds=(lower, upper), loss="soft_l1")
+    return [float(v) for v in result.x]
+
+
+def fit_variogram(x, y, z, model: str = "linear", sample: int = VARIOGRAM_SAMPLE, seed: int = 0) -> list:
+    '''Variogram parameters fitted on at most `sample` randomly chosen soundings'''
+    return fit_model(empirical_variogram(*_subsample(x, y, z, sample, seed)), model)
+
+
+def cross_validate(x, y, z, model: str, params: list, folds: int = CV_FOLDS,
+                   neighbours: int = DEFAULT_NEIGHBOURS, seed: int = 0) -> float:
+    '''RMSE of k-fold moving-window kriging, every sounding predicted from the other folds'''
+    points = np.column_stack([x, y])
+    z = np.asarray(z, dtype=np.float64)
+    fold = np.random.default_rng(seed).permutation(len(z)) % folds
+    gamma = lambda d: VARIOGRAM_FUNCTIONS[model](params, d)
+
+    errors = np.full(len(z), np.nan)
+    for f in range(folds):
+        test = fold == f
+        if test.all() or not test.any():
+            continue
+        predicted, _ = _krige_nodes(points[~test], z[~test], points[test], neighbours, None, gamma)
+        errors[test] = predicted - z[test]
+    return float(np.sqrt(np.nanmean(errors ** 2))) if np.isfinite(errors).any() else np.nan
+
+
+_VARIOGRAM_CACHE = LRUCache(max_entries=32)
+
+def select_variogram(x, y, z, models: tuple = AUTO_MODELS, neighbours: int = None,
+                     sample: int = VARIOGRAM_SAMPLE, seed: int = 0) -> VariogramFit:
+    '''Fit every candidate model to one empirical variogram of a subsample and keep the one with
+    the lowest cross-validated RMSE. Cached by the hash of the soundings, so gridding the same
+    survey again (another resolution, projection or colour scale) skips the fit.'''
+    x, y, z = (np.ascontiguousarray(a, dtype=np.float64) for a in (x, y, z))
+    models = tuple(models)
+    key = content_hash(x, y, z, f"{','.join(models)}|{neighbours}|{sample}|{seed}".encode())
+    cached = _VARIOGRAM_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    sx, sy, sz = _subsample(x, y, z, sample, seed)
+    empirical = empirical_variogram(sx, sy, sz)
+    fitted = {model: fit_model(empirical, model) for model in models}
+    k = max(1, min(int(neighbours or DEFAULT_NEIGHBOURS), len(sz) - 1))
+    scores = {model: cross_validate(sx, sy, sz, model, params, neighbours=k, seed=seed)
+              for model, params in fitted.items()}
+
+    #ties and unscored candidates fall back to the earlier, simpler model
+    best = min(models, key=lambda m: (np.nan_to_num(scores[m], nan=np.inf), models.index(m)))
+    return _VARIOGRAM_CACHE.put(key, VariogramFit(best, fitted[best], scores[best], scores, fitted, empirical))
+
+
+class Thinned(NamedTuple):
+    '''Soundings aggregated per cell, with what the thinning removed'''
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    counts: np.ndarray      # soundings kept in each cell
+    removed: int            # input soundings minus output cells
+    outliers: int           # soundings rejected before aggregating
+
+
+def _group_median(keys, values):
+    '''Median of `values` per group of `keys` (non-negative ints); returns (group keys, medians, inverse)'''
+    order = np.lexsort((values, keys))
+    groups, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    ordered = values[order]
+    medians = 0.5 * (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2])
+    return groups, medians, np.searchsorted(groups, keys)
+
+
+def thin_points(x, y, z, cell, aggregate: str = "median", outlier_mad: float = THIN_OUTLIER_MAD) -> Thinned:
+    '''Bin soundings into cells of side `cell` (coordinate units; an (x, y) pair for cells whose
+    sides differ in those units, as metre cells do in degrees) and replace each cell by one
+    sounding at the centroid of its points. Within a cell of three or more soundings, depths further
+    than `outlier_mad` scaled median absolute deviations from the cell median are rejected first
+    (0 keeps every sounding); the rest are reduced by `aggregate`, "median" or "mean".'''
+    x, y, z = (np.asarray(a, dtype=np.float64) for a in (x, y, z))
+    cell_x, cell_y = np.broadcast_to(np.asarray(cell if cell is not None else 0, dtype=np.float64), 2)
+    if not len(z) or not (cell_x and cell_y):
+        return Thinned(x, y, z, np.ones(len(z), dtype=np.int64), 0, 0)
+
+    col = np.floor((x - x.min()) / cell_x).astype(np.int64)
+    row = np.floor((y - y.min()) / cell_y).astype(np.int64)
+    keys = row * (col.max() + 1) + col
+
+    keep = np.ones(len(z), dtype=bool)
+    if outlier_mad:
+        _, medians, inverse = _group_median(keys, z)
+        deviation = np.abs(z - medians[inverse])
+        _, mad, _ = _group_median(keys, deviation)
+        sizes = np.bincount(inverse)
+        limit = outlier_mad * MAD_TO_SIGMA * mad[inverse]
+        keep = (sizes[inverse] < 3) | (deviation <= np.maximum(limit, EXACT_EPS))
+
+    keys, x, y, z = keys[keep], x[keep], y[keep], z[keep]
+    if aggregate == "median":
+        groups, values, inverse = _group_median(keys, z)
+    else:
+        groups, inverse = np.unique(keys, return_inverse=True)
+        values = np.bincount(inverse, z) / np.bincount(inverse)
+    counts = np.bincount(inverse, minlength=len(groups))
+    cx = np.bincount(inverse, x, len(groups)) / counts
+    cy = np.bincount(inverse, y, len(groups)) / counts
+
+    outliers = int(np.count_nonzero(~keep))
+    return Thinned(cx, cy, values, counts, len(keep) - len(groups), outliers)
+
+
+def _solve_batch(points, values, dist, index, gamma):
+    '''Ordinary kriging at a batch of nodes from their own neighbours, as stacked systems.
+    Neighbours missing from a node (outside the search radius) get a decoupled unit row and zero weight.'''
+    found = np.isfinite(dist)
+    index = np.where(found, index, 0)
+    batch, k = index.shape
+    near = points[index]
+
+    #same conventions as pykrige: -gamma off the diagonal, zero on it, bordered by ones
+    pair = np.hypot(near[:, :, None, 0] - near[:, None, :, 0], near[:, :, None, 1] - near[:, None, :, 1])
+    a = np.zeros((batch, k + 1, k + 1))
+    a[:, :k, :k] = -gamma(pair)
+    a[:, :k, k] = 1.0
+    a[:, k, :k] = 1.0
+    diagonal = np.arange(k)
+    a[:, diagonal, diagonal] = 0.0
+
+    b = np.zeros((batch, k + 1))
+    b[:, :k] = -gamma(np.where(found, dist, 0.0))
+    b[:, :k][np.where(found, dist, np.inf) <= EXACT_EPS] = 0.0
+    b[:, k] = 1.0
+
+    missing = ~found
+    if missing.any():
+        rows, cols = np.nonzero(missing)
+        a[rows, cols, :] = 0.0
+        a[rows, :, cols] = 0.0
+        a[rows, cols, cols] = 1.0
+        b[rows, cols] = 0.0
+
+    try:
+        weights = np.linalg.solve(a, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        #coincident soundings make a system singular; fall back to least squares for this batch
+        weights = (np.linalg.pinv(a) @ b[..., None])[..., 0]
+
+    z = (weights[:, :k] * values[index] * found).sum(axis=1)
+    ss = (weights * -b).sum(axis=1)
+
+    empty = ~found.any(axis=1)
+    z[empty] = np.nan
+    ss[empty] = np.nan
+    return z, ss
+
+
+def local_kriging(x, y, z, gridx, gridy, neighbours: int = DEFAULT_NEIGHBOURS, radius: float = None,
+                  model: str = "linear", params: list = None, batch_bytes: int = KRIGING_BATCH_BYTES):
+    '''Moving-window ordinary kriging on a grid: every node is estimated from its `neighbours`
+    nearest soundings within `radius` (coordinate units), found with a KD-tree and solved in
+    batches, so memory depends on the batch and neighbourhood size and not on the survey size.
+    Returns the estimate and kriging variance as (len(gridy), len(gridx)) arrays, NaN where a
+    node has no sounding within the radius.'''
+    x, y, z = (np.asarray(a, dtype=np.float64) for a in (x, y, z))
+    if params is None:
+        params = fit_variogram(x, y, z, model)
+    gamma = lambda d: VARIOGRAM_FUNCTIONS[model](params, d)
+
+    nodes, shape = _grid_nodes(gridx, gridy)
+    z_out, ss_out = _krige_nodes(np.column_stack([x, y]), z, nodes, neighbours, radius, gamma, batch_bytes)
+    return z_out.reshape(shape), ss_out.reshape(shape)
+
+
+def _krige_nodes(points, values, nodes, neighbours: int, radius: float, gamma, batch_bytes: int = KRIGING_BATCH_BYTES):
+    '''Moving-window ordinary kriging at arbitrary (n, 2) nodes, in batches sized by `batch_bytes`'''
+    tree = cKDTree(points)
+    k = max(1, min(int(neighbours), len(points)))
+    upper = radius if radius else np.inf
+    batch_size = max(1, batch_bytes // (5 * 8 * (k + 1) ** 2))
+
+    z_out = np.empty(len(nodes))
+    ss_out = np.empty(len(nodes))
+    for start in range(0, len(nodes), batch_size):
+        chunk = nodes[start:start + batch_size]
+        dist, index = tree.query(chunk, k=k, distance_upper_bound=upper)
+        if k == 1:
+            dist, index = dist[:, None], index[:, None]
+        z_out[start:start + len(chunk)], ss_out[start:start + len(chunk)] = _solve_batch(points, values, dist, index, gamma)
+    return z_out, ss_out
+
+
+def _grid_nodes(gridx, gridy):
+    gx, gy = np.meshgrid(np.asarray(gridx, dtype=np.float64), np.asarray(gridy, dtype=np.float64))
+    return np.column_stack([gx.ravel(), gy.ravel()]), gx.shape
+
+
+def pykrige_parameters(model: str, params: list):
+    '''Fitted parameters as a pykrige dict; a bare list would be read as [sill, range, nugget],
+    while the fits (like pykrige's own) hold the partial sill'''
+    if params is None:
+        return None
+    names = {"linear": ("slope", "nugget"), "power": ("scale", "exponent", "nugget")}
+    return dict(zip(names.get(model, ("psill", "range", "nugget")), params))
+
+
+def krige_grid(x, y, z, gridx, gridy, neighbours: int = DEFAULT_NEIGHBOURS, radius: float = None,
+               model: str = "linear", params: list = None):
+    '''Ordinary kriging estimate and variance on a grid; neighbours=0 solves one global system'''
+    if neighbours:
+        return local_kriging(x, y, z, gridx, gridy, neighbours=neighbours, radius=radius, model=model, params=params)
+
+    OK = OrdinaryKriging(x, y, z, variogram_model=model, variogram_parameters=pykrige_parameters(model, params),
+                         verbose=False, enable_plotting=False)
+    z_interp, ss = OK.execute('grid', gridx, gridy)
+    return np.ma.filled(z_interp.astype(np.float64), np.nan), np.ma.filled(ss.astype(np.float64), np.nan)
+
+
+def _prepare_kriging(x, y, z, options: dict) -> dict:
+    '''Fit the variogram once for all tiles; model="auto" takes the best cross-validated candidate'''
+    if options.get("params") is None:
+        model = options.get("model", "linear")
+        fit = select_variogram(x, y, z, AUTO_MODELS if model == "auto" else (model,), neighbours=options.get("neighbours"))
+        options["model"], options["params"] = fit.model, fit.params
+    return options
+
+
+def idw_grid(x, y, z, gridx, gridy, neighbours: int = IDW_NEIGHBOURS, radius: float = None, power: float = IDW_POWER):
+    '''Inverse distance weighting over the nearest soundings found with a KD-tree'''
+    nodes, shape = _grid_nodes(gridx, gridy)
+    k = max(1, min(int(neighbours), len(z)))
+    dist, index = cKDTree(np.column_stack([x, y])).query(nodes, k=k, distance_upper_bound=radius if radius else np.inf)
+    if k == 1:
+        dist, index = dist[:, None], index[:, None]
+
+    found = np.isfinite(dist)
+    values = np.asarray(z, dtype=np.float64)[np.where(found, index, 0)]
+    with np.errstate(divide="ignore"):
+        weights = np.where(found, 1.0 / np.maximum(dist, EXACT_EPS) ** power, 0.0)
+    total = weights.sum(axis=1)
+
+    z_out = np.full(len(nodes), np.nan)
+    np.divide((weights * values).sum(axis=1), total, out=z_out, where=total > 0)
+    return z_out.reshape(shape), None
+
+
+def linear_grid(x, y, z, gridx, gridy):
+    '''Linear interpolation on the Delaunay triangulation (TIN); NaN outside the convex hull'''
+    nodes, shape = _grid_nodes(gridx, gridy)
+    tin = LinearNDInterpolator(Delaunay(np.column_stack([x, y])), np.asarray(z, dtype=np.float64))
+    return tin(nodes).reshape(shape), None
+
+
+def rbf_grid(x, y, z, gridx, gridy, neighbours: int = RBF_NEIGHBOURS, radius: float = None, kernel: str = RBF_KERNEL):
+    '''Radial basis function interpolation, each node fitted from its nearest soundings only'''
+    nodes, shape = _grid_nodes(gridx, gridy)
+    points = np.column_stack([x, y])
+    k = max(1, min(int(neighbours), len(z)))
+    try:
+        rbf = RBFInterpolator(points, np.asarray(z, dtype=np.float64), neighbors=k, kernel=kernel)
+    except ValueError:
+        #too few soundings for the kernel's polynomial term (3 for a thin plate spline)
+        return np.full(shape, np.nan), None
+    z_out = rbf(nodes)
+    if radius:
+        #keep the blank-outside-radius behaviour of the other local methods
+        dist, _ = cKDTree(points).query(nodes, k=1)
+        z_out[dist > radius] = np.nan
+    return z_out.reshape(shape), None
+
+
+class Interpolator(NamedTuple):
+    '''A gridding method: `grid(x, y, z, gridx, gridy, **options)` returns (z, variance or None)'''
+    label: str
+    grid: Callable
+    local: bool             # estimates from a neighbourhood, so tiles need only nearby soundings
+    tiled: bool = True      # False for methods that are fastest in one call over the whole grid
+    prepare: Callable = None    # shared fitting done once before the tiles are dispatched
+    neighbours: int = None      # neighbourhood size of a local method when none is given
+    radius_search: bool = True  # False when the radius only blanks nodes and neighbours may lie beyond it
+
+
+INTERPOLATORS = {
+    "kriging": Interpolator("Ordinary Kriging", krige_grid, local=True, prepare=_prepare_kriging,
+                            neighbours=DEFAULT_NEIGHBOURS),
+    "idw": Interpolator("Inverse Distance Weighting", idw_grid, local=True, neighbours=IDW_NEIGHBOURS),
+    "linear": Interpolator("Linear (TIN)", linear_grid, local=False, tiled=False),
+    "rbf": Interpolator("Radial Basis Function (local)", rbf_grid, local=True, neighbours=RBF_NEIGHBOURS,
+                        radius_search=False),
+}
+
+
+def _tile_worker(job):
+    '''Process pool entry point: interpolate one tile from the soundings inside its halo'''
+    rows, cols, method, x, y, z, gridx, gridy, options = job
+    z_tile, ss_tile = INTERPOLATORS[method].grid(x, y, z, gridx, gridy, **options)
+    return rows, cols, z_tile, ss_tile
+
+
+def _tile_workers() -> int:
+    '''Worker count of the tile pool, at most TILE_MAX_WORKERS'''
+    return min(TILE_MAX_WORKERS, os.cpu_count() or 1)
+
+
+_TILE_POOL = None
+_TILE_POOL_LOCK = threading.Lock()
+
+def _tile_pool() -> ProcessPoolExecutor:
+    '''Long-lived worker pool, kept warm across Streamlit reruns. Workers are spawned,
+    not forked, since forking the multi-threaded server can copy held locks.'''
+    global _TILE_POOL
+    with _TILE_POOL_LOCK:
+        if _TILE_POOL is None:
+            _TILE_POOL = ProcessPoolExecutor(max_workers=_tile_workers(), mp_context=get_context("spawn"))
+            atexit.register(shutdown_tile_pool)
+    return _TILE_POOL
+
+
+def shutdown_tile_pool():
+    '''Stop the worker pool; the next parallel grid starts a new one'''
+    global _TILE_POOL
+    with _TILE_POOL_LOCK:
+        pool, _TILE_POOL = _TILE_POOL, None
+    if pool is not None:
+        atexit.unregister(shutdown_tile_pool)
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _tiles(gridx, gridy, tile_size: int):
+    for r in range(0, len(gridy), tile_size):
+        for c in range(0, len(gridx), tile_size):
+            yield slice(r, min(r + tile_size, len(gridy))), slice(c, min(c + tile_size, len(gridx)))
+
+
+def interpolate_grid(method: str, x, y, z, gridx, gridy, tile_size: int = TILE_SIZE,
+                     workers: int = None, progress=None, **options):
+    '''Grid the soundings with a registered interpolator, split into tiles of the output grid
+    run on a process pool once the grid has PARALLEL_MIN_NODES nodes. Returns (z, variance), the
+    variance being None for methods without one.
+
+    A tile of a neighbourhood method is sent only the soundings inside its bounds grown by a
+    halo: the farthest k-th neighbour of any of its nodes, capped by the search radius for
+    methods that only search within it. Every node then sees the same neighbours as in an
+    untiled run. Global methods (and kriging with neighbours=0) send every sounding to every
+    tile. `progress(done, total)` is called after each tile.'''
+    interpolator = INTERPOLATORS[method]
+    x, y, z = (np.asarray(a, dtype=np.float64) for a in (x, y, z))
+    gridx, gridy = np.asarray(gridx, dtype=np.float64), np.asarray(gridy, dtype=np.float64)
+    if interpolator.prepare:
+        options = interpolator.prepare(x, y, z, dict(options))
+
+    neighbours = options.get("neighbours", interpolator.neighbours) if interpolator.local else None
+    radius = options.get("radius") if interpolator.radius_search else None
+    if not interpolator.tiled:
+        tile_size = max(len(gridx), len(gridy))
+    elif not neighbours:
+        tile_size = max(tile_size, int(np.sqrt(GLOBAL_TILE_BYTES // (3 * 8 * len(z)))))
+
+    tree = cKDTree(np.column_stack([x, y])) if neighbours else None
+    k = max(1, min(int(neighbours or 1), len(z)))
+    jobs = []
+    for rows, cols in _tiles(gridx, gridy, tile_size):
+        tx, ty = gridx[cols], gridy[rows]
+        if tree is None:
+            inside = slice(None)
+        else:
+            nodes, _ = _grid_nodes(tx, ty)
+            dist, _ = tree.query(nodes, k=k, distance_upper_bound=radius if radius else np.inf)
+            kth = dist if dist.ndim == 1 else dist[:, -1]
+            halo = np.max(np.where(np.isfinite(kth), kth, radius or 0.0))
+            inside = np.flatnonzero((x >= tx.min() - halo) & (x <= tx.max() + halo)
+                                    & (y >= ty.min() - halo) & (y <= ty.max() + halo))
+        jobs.append((rows, cols, method, x[inside], y[inside], z[inside], tx, ty, options))
+
+    z_out = np.full((len(gridy), len(gridx)), np.nan)
+    ss_out = None
+
+    def place(result, done):
+        nonlocal ss_out
+        rows, cols, z_tile, ss_tile = result
+        z_out[rows, cols] = z_tile
+        if ss_tile is not None:
+            if ss_out is None:
+                ss_out = np.full(z_out.shape, np.nan)
+            ss_out[rows, cols] = ss_tile
+        if progress:
+            progress(done, len(jobs))
+
+    #previews and other small grids run inline
+    workers = _tile_workers() if workers is None else workers
+    if workers <= 1 or len(jobs) == 1 or z_out.size < PARALLEL_MIN_NODES:
+        for done, job in enumerate(jobs, 1):
+            place(_tile_worker(job), done)
+    else:
+        futures = [_tile_pool().submit(_tile_worker, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            place(future.result(), done)
+
+    return z_out, ss_out
@@ -0,0 +1,82 @@
+import os
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+
+def content_hash(*chunks) -> str:
+    '''Hex digest over bytes-like chunks (bytes, memoryview, numpy buffers)'''
+    digest = hashlib.blake2b(digest_size=20)
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upload_hash(upload) -> str:
+    '''Digest of an uploaded file without copying its bytes when possible'''
+    if hasattr(upload, "getbuffer"):
+        with upload.getbuffer() as view:
+            return content_hash(view)
+    return content_hash(upload.getvalue())
+
+
+def cache_dir(*parts: str) -> str:
+    '''On-disk cache folder, TIDEHUNTER_CACHE_DIR or ./.cache/tidehunter'''
+    root = os.environ.get("TIDEHUNTER_CACHE_DIR", os.path.join(".cache", "tidehunter"))
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class LRUCache:
+    '''Thread-safe in-memory LRU cache bounded by entry count and total size.
+    `sizeof` measures an entry in bytes; without it only the entry count is bounded.'''
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._items = OrderedDict()
+        self._sizes = {}
+        self._total = 0
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self._total -= self._sizes.pop(key)
+                del self._items[key]
+            self._items[key] = value
+            self._sizes[key] = size
+            self._total += size
+
+            #evict least recently used, but always keep the newest entry
+            while len(self._items) > 1 and (len(self._items) > self.max_entries
+                                            or (self.max_bytes is not None and self._total > self.max_bytes)):
+                old, _ = self._items.popitem(last=False)
+                self._total -= self._sizes.pop(old)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self._total = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._total
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
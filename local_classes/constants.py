@@ -0,0 +1,13 @@
+from enum import Enum
+import os
+
+# kept free of Streamlit and plotting imports, and of file reads, so the CLI can share them with the pages
+
+# resources are resolved from the project root so the module also imports outside the app folder
+RESOURCES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources")
+
+class Lists(Enum):
+    ACCEPTED_UPLOAD_FORMATS = ['lev', 'cor', 'raw', 'dec', 'LEV', 'COR', 'RAW', 'DEC']
+    ACCEPTED_UPLOAD_FORMATS_WXTIDE = ["TXT"]
+    ACCEPTED_UPLOAD_FORMATS_WINDROSE = ["CSV"]
+    ACCEPTED_UPLOAD_FORMATS_SURFACE = ["CSV", "TXT"]
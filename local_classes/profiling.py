@@ -0,0 +1,201 @@
+import os
+import io
+import inspect
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from time import perf_counter
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from local_classes.cache import cache_dir
+
+# opt-in: TIDEHUNTER_PROFILE=1 (or ?profile=1) for timers and memory, "cprofile" to also keep a cProfile dump
+PROFILE_ENV = "TIDEHUNTER_PROFILE"
+PROFILE_PARAM = "profile"
+MODE_OFF, MODE_TIMERS, MODE_CPROFILE = "off", "timers", "cprofile"
+CPROFILE_LINES = 30
+MIB = 1024 * 1024
+
+#each Streamlit session reruns its script on its own thread
+_local = threading.local()
+#tracemalloc keeps one peak per process and only one cProfile profiler can be active at a time
+#(Python 3.12+), so profiled reruns take turns
+_profile_lock = threading.Lock()
+
+
+def _mode_of(value) -> str:
+    value = str(value or "").strip().lower()
+    if value == MODE_CPROFILE:
+        return MODE_CPROFILE
+    return MODE_TIMERS if value in ("1", "true", "on", "yes", MODE_TIMERS) else MODE_OFF
+
+
+def profile_mode() -> str:
+    '''Profiling mode for this rerun from the environment, or the ?profile= query parameter'''
+    mode = _mode_of(os.environ.get(PROFILE_ENV))
+    if mode != MODE_OFF:
+        return mode
+    try:
+        return _mode_of(st.query_params.get(PROFILE_PARAM))
+    except Exception:
+        #no Streamlit session, e.g. imported by the CLI or the benchmarks
+        return MODE_OFF
+
+
+class _Frame:
+    __slots__ = ("path", "start", "mem_start", "peak")
+
+    def __init__(self, path: tuple, mem_start: int):
+        self.path = path
+        self.start = perf_counter()
+        self.mem_start = mem_start
+        self.peak = mem_start
+
+
+class Recorder:
+    '''Wall time and traced memory of every profiled section in one rerun, nested by call path.
+    tracemalloc counts every thread, so allocations of unprofiled sessions running meanwhile are included.'''
+
+    def __init__(self):
+        self.stack = []
+        self.rows = {}
+        self.started = perf_counter()
+        self.finished = None
+
+    def enter(self, label: str):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            #the parent keeps the peak seen so far before the counter is reset for the child
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        path = (self.stack[-1].path if self.stack else ()) + (label,)
+        #rows are created on entry so the table lists parents before their children
+        self.rows.setdefault(path, {"calls": 0, "seconds": 0.0, "peak": 0, "net": 0})
+        self.stack.append(_Frame(path, current))
+
+    def exit(self):
+        frame = self.stack.pop()
+        seconds = perf_counter() - frame.start
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak = max(frame.peak, peak)
+        if self.stack:
+            parent = self.stack[-1]
+            parent.peak = max(parent.peak, frame.peak)
+
+        row = self.rows[frame.path]
+        row["calls"] += 1
+        row["seconds"] += seconds
+        row["peak"] = max(row["peak"], frame.peak - frame.mem_start)
+        row["net"] += current - frame.mem_start
+
+    def table(self) -> pd.DataFrame:
+        '''Sections in call order, indented by depth'''
+        return pd.DataFrame([{
+            "Section": "· " * (len(path) - 1) + path[-1],
+            "Calls": row["calls"],
+            "Time (ms)": row["seconds"] * 1000,
+            "Peak (MiB)": row["peak"] / MIB,
+            "Net (MiB)": row["net"] / MIB,
+        } for path, row in self.rows.items()])
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or perf_counter()) - self.started
+
+
+def profiled(label=None):
+    '''Time a function when profiling is on for the current rerun; a plain call otherwise.
+    Works bare (@profiled) or with a label (@profiled("Section name")).'''
+    if callable(label):
+        return profiled()(label)
+
+    def wrap(fn):
+        name = label or fn.__qualname__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            recorder = getattr(_local, "recorder", None)
+            if recorder is None:
+                return fn(*args, **kwargs)
+            recorder.enter(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.exit()
+        return inner
+    return wrap
+
+
+def instrument(cls):
+    '''Class decorator: profile every method the class defines itself'''
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("__"):
+            continue
+        label = f"{cls.__name__}.{name}"
+        if isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(profiled(label)(attr.__func__)))
+        elif isinstance(attr, classmethod):
+            setattr(cls, name, classmethod(profiled(label)(attr.__func__)))
+        elif inspect.isfunction(attr):
+            setattr(cls, name, profiled(label)(attr))
+    return cls
+
+
+def run_page(main, *args, **kwargs):
+    '''Run a page entry point, profiling the rerun and showing the sidebar panel when enabled'''
+    mode = profile_mode()
+    if mode == MODE_OFF:
+        return main(*args, **kwargs)
+
+    with _profile_lock:
+        recorder = Recorder()
+        profiler = cProfile.Profile() if mode == MODE_CPROFILE else None
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        _local.recorder = recorder
+        try:
+            if profiler:
+                profiler.enable()
+            recorder.enter("page")
+            try:
+                result = main(*args, **kwargs)
+            finally:
+                recorder.exit()
+                if profiler:
+                    profiler.disable()
+        finally:
+            recorder.finished = perf_counter()
+            _local.recorder = None
+            if started_tracing:
+                tracemalloc.stop()
+
+    profile_panel(recorder, profiler, page=os.path.splitext(os.path.basename(inspect.getfile(main)))[0])
+    return result
+
+
+def profile_panel(recorder: Recorder, profiler: cProfile.Profile = None, page: str = "page"):
+    with st.sidebar.expander("Profiler", expanded=True):
+        st.caption(f"Rerun took {recorder.seconds*1000:.0f} ms with memory tracing on. "
+                   "Peak is the traced allocation above the section's start. Profiled reruns run one at a time, "
+                   "but memory is traced process-wide, so other sessions active meanwhile add to the peaks.")
+        st.dataframe(recorder.table(), hide_index=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                    for c in ("Time (ms)", "Peak (MiB)", "Net (MiB)")})
+
+        if profiler is not None:
+            stats_text = io.StringIO()
+            pstats.Stats(profiler, stream=stats_text).strip_dirs().sort_stats("cumulative").print_stats(CPROFILE_LINES)
+            st.code(stats_text.getvalue(), language=None)
+
+            path = os.path.join(cache_dir("profiles"), f"{page}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+            profiler.dump_stats(path)
+            with open(path, "rb") as f:
+                st.download_button("Download cProfile dump", f.read(), os.path.basename(path), key="profile_dump")
+            st.caption(f"Saved to {path}; open with `python -m pstats` or snakeviz.")
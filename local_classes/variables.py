@@ -2,18 +2,12 @@ from enum import Enum
 import os
 import plotly.express as px
 import plotly.graph_objects as go
-import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
-from itertools import islice
-import streamlit as st
 import matplotlib.cm as cm
+from tidestats import linear_regression
+from stations import station_index
 
-class Lists(Enum):
-    ACCEPTED_UPLOAD_FORMATS = ['lev', 'cor', 'raw', 'dec', 'LEV', 'COR', 'RAW', 'DEC']
-    ACCEPTED_UPLOAD_FORMATS_WXTIDE = ["TXT"]
-    ACCEPTED_UPLOAD_FORMATS_WINDROSE = ["CSV"]
-    ACCEPTED_UPLOAD_FORMATS_SURFACE = ["CSV", "TXT"]
+from local_classes.constants import Lists, RESOURCES
 
 class Dicts(Enum):
     COLOR_PALETTES = {
@@ -81,6 +75,42 @@ class Dicts(Enum):
         }
     }
 
+    KRIGING_NEIGHBOURHOODS = {
+        "Automatic": "auto",
+        "Moving window": "local",
+        "Global": "global"
+    }
+
+    VARIOGRAM_MODELS = {
+        "Automatic (cross-validated)": "auto",
+        "Linear": "linear",
+        "Spherical": "spherical",
+        "Exponential": "exponential",
+        "Gaussian": "gaussian"
+    }
+
+    THINNING_AGGREGATES = {
+        "Median": "median",
+        "Mean": "mean"
+    }
+
+    REPROJECTION_MODES = {
+        "Resample the raster": "raster",
+        "Re-grid the soundings": "soundings"
+    }
+
+    RASTER_EXPORTS = {
+        "Cloud-optimized GeoTIFF (DEFLATE)": "DEFLATE",
+        "Cloud-optimized GeoTIFF (ZSTD)": "ZSTD",
+        "Cloud-optimized GeoTIFF (LZW)": "LZW",
+        "Plain GeoTIFF": None
+    }
+
+    STATION_PLACES = {
+        "Every city/municipality (ADM3 centroids)": "adm3",
+        "Coastal municipalities/barangays": "coastal"
+    }
+
 class Options(Enum):
     FOLIUM_DRAW_OPTIONS = {
         "polyline": False,
@@ -125,8 +155,8 @@ class Others(Enum):
             """
 
 class LVL3Locations(Enum):
-    Province = list(pd.unique(pd.read_csv(os.path.join("resources","geospatial","adm3_places.csv"))["ADM2_EN"]))
-    City_Municipality = list(pd.unique(pd.read_csv(os.path.join("resources","geospatial","adm3_places.csv"))["ADM3_EN"]))
+    Province = list(pd.unique(pd.read_csv(os.path.join(RESOURCES,"geospatial","adm3_places.csv"))["ADM2_EN"]))
+    City_Municipality = list(pd.unique(pd.read_csv(os.path.join(RESOURCES,"geospatial","adm3_places.csv"))["ADM3_EN"]))
 
 class CartoTileViews(Enum):
     tilesets = [
@@ -145,27 +175,14 @@ class Tools:
     def get_linear_regression(x: list, y: list):
         '''Get the linear regression of the given x and y values'''
 
-        x = np.array(x, dtype=np.float64)
-        y = np.array(y, dtype=np.float64)
-        m, b = np.polyfit(x, y, 1)
-
-        # return y_pred
-        y_pred = m * x + b
-        return y_pred,m, b
+        return linear_regression(x, y)
     
 
     @staticmethod
     def calculate_distances_from_points(point_coord: tuple, prim_stations: pd.DataFrame, sec_stations: pd.DataFrame, toprank=5):
-        profiles = {}
-
-        for _, prim_st in prim_stations.iterrows():
-            profiles[f"(PS) {prim_st['tidestatio']}"] = {"distance": geodesic(point_coord, (prim_st['Lat'], prim_st['Long'])).km, "coords": [prim_st['Lat'], prim_st['Long']]}
-        for _, sec_st in sec_stations.iterrows():
-            profiles[f"(SS) {sec_st['namesecond']}"] = {"distance": geodesic(point_coord, (sec_st['Lat'], sec_st['Long'])).km, "coords": [sec_st['Lat'], sec_st['Long']]}
-
-        # Fix sorting by accessing the 'distance' key in the nested dictionaries
-        sorted_dict = {k: v for k, v in sorted(profiles.items(), key=lambda item: item[1]['distance'], reverse=False)}
-        return dict(islice(sorted_dict.items(), toprank))
+        '''Nearest `toprank` stations of a (lat, lon) point, nearest first, by WGS84 geodesic distance in km'''
+        #the KD-tree index over the stations is built once and reused by every lookup
+        return station_index(prim_stations, sec_stations).nearest(point_coord, int(toprank))
     
 
     @staticmethod
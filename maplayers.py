@@ -0,0 +1,111 @@
+'''Map overlays handed to Leaflet as compact, pre-serialized GeoJSON.
+
+A shapefile is simplified once per level of detail, with a tolerance of about
+half a screen pixel at that zoom, and its coordinates are rounded to what the
+zoom can show. The GeoJSON text is saved under the cache dir, named by a hash
+of the shapefile and the level, so reruns and later sessions read text instead
+of reprocessing full-resolution geometry.
+'''
+import io
+import os
+import glob
+import math
+
+import shapely
+import geopandas as gpd
+
+from local_classes.cache import content_hash, cache_dir, LRUCache
+
+# levels of detail built; a map zoom is served by the first level at or above it
+LAYER_ZOOMS = (6, 8, 10, 12, 14)
+DEFAULT_ZOOM = 8
+TILE_SIZE = 256
+DATETIME_COLUMNS = ("date", "validOn", "validTo")
+
+
+def degrees_per_pixel(zoom: float) -> float:
+    '''Longitude span of one screen pixel of a web mercator map at the equator'''
+    return 360.0 / (TILE_SIZE * 2 ** zoom)
+
+
+def layer_zoom(zoom) -> int:
+    '''Level of detail serving a map zoom, DEFAULT_ZOOM when the zoom is unknown'''
+    zoom = DEFAULT_ZOOM if zoom is None else zoom
+    return next((level for level in LAYER_ZOOMS if level >= zoom), LAYER_ZOOMS[-1])
+
+
+def level_of_detail(level: int) -> tuple:
+    '''(simplification tolerance in degrees, coordinate decimals) of a level'''
+    pixel = degrees_per_pixel(level)
+    return pixel / 2, max(0, math.ceil(-math.log10(pixel / 4)))
+
+
+_SOURCE_HASHES = LRUCache(max_entries=64)
+
+def source_hash(path: str) -> str:
+    '''Hash of a shapefile and its sidecar files, re-read only when one of them changes'''
+    stem = os.path.splitext(path)[0]
+    files = sorted(glob.glob(f"{glob.escape(stem)}.*"))
+    signature = tuple((f, os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+    digest = _SOURCE_HASHES.get(signature)
+    if digest is None:
+        contents = []
+        for f in files:
+            with open(f, "rb") as handle:
+                contents.append(os.path.basename(f).encode() + handle.read())
+        digest = _SOURCE_HASHES.put(signature, content_hash(*contents))
+    return digest
+
+
+def simplify(geometry: gpd.GeoSeries, tolerance: float) -> gpd.GeoSeries:
+    '''Topology-preserving simplification. Polygon coverages such as administrative
+    boundaries are simplified as a whole, so neighbours keep their shared edges.'''
+    polygonal = geometry.geom_type.isin(["Polygon", "MultiPolygon"]).all()
+    if polygonal and len(geometry) and shapely.coverage_is_valid(geometry.values):
+        return gpd.GeoSeries(shapely.coverage_simplify(geometry.values, tolerance), index=geometry.index, crs=geometry.crs)
+    return geometry.simplify(tolerance, preserve_topology=True)
+
+
+def build_layer(path: str, level: int, columns: list = None) -> str:
+    '''GeoJSON text of a shapefile at one level of detail, in WGS84 with rounded coordinates'''
+    tolerance, decimals = level_of_detail(level)
+    layer = gpd.read_file(path, columns=columns)
+    #tolerances are in degrees
+    if layer.crs is not None and not layer.crs.equals("EPSG:4326"):
+        layer = layer.to_crs("EPSG:4326")
+    layer = layer.drop(columns=[c for c in DATETIME_COLUMNS if c in layer.columns])
+
+    layer["geometry"] = simplify(layer.geometry, tolerance)
+    layer = layer[~(layer.geometry.is_empty | layer.geometry.isna())]
+
+    buffer = io.BytesIO()
+    layer.to_file(buffer, driver="GeoJSON", COORDINATE_PRECISION=decimals, RFC7946="YES", WRITE_NAME="NO")
+    return buffer.getvalue().decode("utf-8")
+
+
+_LAYERS = LRUCache(max_entries=32, max_bytes=128 * 1024 * 1024, sizeof=len)
+
+def map_layer(path: str, zoom=None, columns: list = None) -> str:
+    '''Pre-serialized GeoJSON of a shapefile for a map zoom, built once per source and level.
+    Raises FileNotFoundError when the shapefile geometry (.shp) is missing.'''
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    level = layer_zoom(zoom)
+    key = content_hash(source_hash(path).encode(), f"{level}|{columns}".encode())
+    text = _LAYERS.get(key)
+    if text is not None:
+        return text
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    cached = os.path.join(cache_dir("layers"), f"{stem}-z{level}-{key}.geojson")
+    if os.path.exists(cached):
+        with open(cached, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = build_layer(path, level, columns)
+        #write then rename, so concurrent sessions never read a partial file
+        partial = f"{cached}.{os.getpid()}.tmp"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(partial, cached)
+    return _LAYERS.put(key, text)
@@ -0,0 +1,375 @@
+'''NAMRIA fixed-width tide files: vectorized decoding, the parse cache and multi-file ingest.
+
+Kept free of Streamlit, plotting and raster dependencies so the pages, the
+tidehunter CLI and parse workers import only what parsing needs.
+'''
+import os
+import atexit
+import threading
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+from time import perf_counter
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+
+from local_classes.cache import LRUCache, content_hash, cache_dir
+
+
+
+
+# NAMRIA fixed-width layout: 24 hourly readings of 3 characters each, followed by
+# an 8 character stamp (station id, day, month, 2-digit year) at the end of the line
+NAMRIA_READINGS_PER_DAY = 24
+NAMRIA_READING_WIDTH = 3
+NAMRIA_STAMP_WIDTH = 8
+NAMRIA_MISSING_VALUE = 999
+# streaming decode block size; bounds the scratch arrays of the vectorized decoder
+PARSE_CHUNK_BYTES = 256 * 1024
+# below this many bytes in total, shipping files to worker processes costs more than parsing them
+PARALLEL_INGEST_MIN_BYTES = 4 * 1024 * 1024
+# the pool is shared by every session of the server, so it stays small
+INGEST_MAX_WORKERS = 4
+TIDE_SERIES_NAME = "Tide Level"
+_NEWLINE = ord("\n")
+_WHITESPACE = np.frombuffer(b" \t\r\x0b\x0c\x1c\x1d\x1e\x1f", dtype=np.uint8)
+
+
+class TideReadings(NamedTuple):
+    '''Columnar NAMRIA dataset: one row of 24 hourly readings (cm) per record'''
+    readings: np.ndarray        # float32, shape (days, 24), NaN for missing values
+    dates: pd.DatetimeIndex     # one date per row
+    stations: np.ndarray        # station id per row
+
+    def consolidate(self) -> "TideReadings":
+        '''Sort by date and keep the last record of any repeated date'''
+        order = np.argsort(self.dates.values, kind="stable")
+        dates = self.dates[order]
+        keep = ~dates.duplicated(keep="last")
+        order = order[keep]
+        return TideReadings(self.readings[order], dates[keep], self.stations[order])
+
+    def to_series(self) -> pd.Series:
+        '''Long format: one float32 tide level per hourly observation.
+        Expects consolidated (sorted, one row per date) readings.'''
+        hours = self.readings.shape[1]
+        index = (np.repeat(self.dates.values, hours)
+                 + np.tile(np.arange(hours, dtype="timedelta64[h]"), len(self.dates)))
+        return pd.Series(self.readings.ravel(), index=pd.DatetimeIndex(index), name=TIDE_SERIES_NAME)
+
+
+def daily_frame(series: pd.Series) -> pd.DataFrame:
+    '''Day x hour view over a day-aligned hourly series, sharing its memory'''
+    hours = NAMRIA_READINGS_PER_DAY
+    return pd.DataFrame(series.values.reshape(-1, hours), index=series.index[::hours], copy=False)
+
+
+def hourly_frame(series: pd.Series) -> pd.DataFrame:
+    '''Hour x date wide view of a day-aligned hourly series, for display only'''
+    wide = daily_frame(series).T
+    wide.index = [f"Hour_{i}" for i in range(NAMRIA_READINGS_PER_DAY)]
+    return wide
+
+
+def _decode_digits(fields: np.ndarray):
+    '''Decode right-most axis of ASCII codes as padded unsigned integers.
+    Mirrors `int(f) if f.strip().isdigit() else nan` on every field.'''
+    digit = (fields >= ord("0")) & (fields <= ord("9"))
+    blank = np.isin(fields, _WHITESPACE)
+    width = fields.shape[-1]
+
+    values = np.zeros(fields.shape[:-1], dtype=np.int32)
+    for i in range(width):
+        values = np.where(digit[..., i], values * 10 + (fields[..., i].astype(np.int32) - ord("0")), values)
+
+    # digits have to be contiguous, whitespace is only allowed as padding
+    n_digits = digit.sum(axis=-1)
+    first = digit.argmax(axis=-1)
+    last = width - 1 - digit[..., ::-1].argmax(axis=-1)
+    valid = (digit | blank).all(axis=-1) & (n_digits > 0) & (last - first + 1 == n_digits)
+    return values, valid
+
+
+def _decode_fixed_width(buf: np.ndarray, line_offset: int = 0) -> TideReadings:
+    '''Decode a uint8 buffer of complete NAMRIA lines in a single vectorized pass'''
+    width = NAMRIA_READINGS_PER_DAY * NAMRIA_READING_WIDTH
+    if buf.size == 0:
+        return TideReadings(np.empty((0, NAMRIA_READINGS_PER_DAY), dtype=np.float32),
+                            pd.DatetimeIndex([]), np.empty(0, dtype=object))
+
+    newlines = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [buf.size]))
+
+    #rstrip every line: last non-whitespace position at or before each byte
+    solid = ~np.isin(buf, _WHITESPACE) & (buf != _NEWLINE)
+    last_solid = np.maximum.accumulate(np.where(solid, np.arange(buf.size), -1))
+    ends = np.where(ends > starts, last_solid[np.maximum(ends - 1, 0)] + 1, starts)
+    ends = np.maximum(ends, starts)
+
+    #blank lines carry no record
+    filled = ends > starts
+    line_no = np.flatnonzero(filled) + line_offset + 1
+    starts, ends = starts[filled], ends[filled]
+
+    #reading block: first 72 characters, short lines padded with blanks
+    idx = starts[:, None] + np.arange(width)
+    block = np.where(idx < ends[:, None], buf[np.minimum(idx, buf.size - 1)], ord(" ")).astype(np.uint8)
+    values, valid = _decode_digits(block.reshape(-1, NAMRIA_READINGS_PER_DAY, NAMRIA_READING_WIDTH))
+    readings = np.where(valid & (values != NAMRIA_MISSING_VALUE), values, np.nan).astype(np.float32)
+
+    #stamp block: last 8 characters of the stripped line
+    idx = ends[:, None] - NAMRIA_STAMP_WIDTH + np.arange(NAMRIA_STAMP_WIDTH)
+    stamp = np.where(idx >= starts[:, None], buf[np.maximum(idx, 0)], ord(" ")).astype(np.uint8)
+    stamp_values, stamp_valid = _decode_digits(stamp[:, 2:].reshape(-1, 3, 2))
+    if not stamp_valid.all():
+        bad = line_no[~stamp_valid.all(axis=1)][0]
+        raise ValueError(f"Malformed NAMRIA date stamp on line {bad}")
+
+    try:
+        dates = pd.to_datetime(pd.DataFrame({
+            "year": 2000 + stamp_values[:, 2],
+            "month": stamp_values[:, 1],
+            "day": stamp_values[:, 0],
+        }))
+    except ValueError as e:
+        raise ValueError(f"Invalid NAMRIA date stamp: {e}") from e
+
+    stations = np.char.strip(np.ascontiguousarray(stamp[:, :2]).view("S2").ravel()).astype(str).astype(object)
+    return TideReadings(readings, pd.DatetimeIndex(dates), stations)
+
+
+def _line_blocks(source, chunk_size: int = PARSE_CHUNK_BYTES):
+    '''Yield (uint8 block of whole lines, lines before it) from a bytes-like object,
+    sliced without copying, or from a binary stream read `chunk_size` bytes at a time'''
+    lines_before = 0
+    if hasattr(source, "read"):
+        carry = b""
+        while True:
+            block = source.read(chunk_size)
+            if not block:
+                break
+            block = carry + block
+            cut = block.rfind(b"\n") + 1
+            carry = block[cut:]
+            if cut:
+                yield np.frombuffer(block, dtype=np.uint8, count=cut), lines_before
+                lines_before += block.count(b"\n", 0, cut)
+        if carry:
+            yield np.frombuffer(carry, dtype=np.uint8), lines_before
+        return
+
+    buf = np.frombuffer(source, dtype=np.uint8)
+    pos = 0
+    while pos < buf.size:
+        end = min(pos + chunk_size, buf.size)
+        if end < buf.size:
+            #cut after the last newline in the window, or the next one for very long lines
+            found = np.flatnonzero(buf[pos:end] == _NEWLINE)
+            if found.size:
+                end = pos + found[-1] + 1
+            else:
+                found = np.flatnonzero(buf[end:] == _NEWLINE)
+                end = end + found[0] + 1 if found.size else buf.size
+        block = buf[pos:end]
+        yield block, lines_before
+        lines_before += int(np.count_nonzero(block == _NEWLINE))
+        pos = end
+
+
+class _ReadingsBuilder:
+    '''Preallocated output arrays filled block by block, grown by doubling'''
+
+    def __init__(self, capacity: int):
+        capacity = max(int(capacity), 1)
+        self.readings = np.empty((capacity, NAMRIA_READINGS_PER_DAY), dtype=np.float32)
+        self.dates = np.empty(capacity, dtype="datetime64[ns]")
+        self.stations = np.empty(capacity, dtype=object)
+        self.size = 0
+
+    def _grow(self, needed: int):
+        capacity = max(2 * len(self.dates), needed)
+        for name in ("readings", "dates", "stations"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, part: TideReadings):
+        n = len(part.dates)
+        if self.size + n > len(self.dates):
+            self._grow(self.size + n)
+        self.readings[self.size:self.size + n] = part.readings
+        self.dates[self.size:self.size + n] = part.dates.values
+        self.stations[self.size:self.size + n] = part.stations
+        self.size += n
+
+    def result(self) -> TideReadings:
+        #drop the unused tail instead of keeping it alive behind a view
+        n = self.size
+        trim = (lambda a: a[:n].copy()) if n < 0.9 * len(self.dates) else (lambda a: a[:n])
+        return TideReadings(trim(self.readings), pd.DatetimeIndex(trim(self.dates)), trim(self.stations))
+
+
+def _decode_stream(source, size_hint: int = 0, chunk_size: int = PARSE_CHUNK_BYTES) -> TideReadings:
+    '''Decode NAMRIA data block by block into preallocated arrays; the whole text is
+    never decoded or held at once'''
+    # a NAMRIA line is 72 reading + 8 stamp characters and a newline
+    builder = _ReadingsBuilder(size_hint // 81 + 1)
+    for block, lines_before in _line_blocks(source, chunk_size):
+        builder.append(_decode_fixed_width(block, line_offset=lines_before))
+    return builder.result()
+
+
+class ParseCache:
+    '''Parsed NAMRIA files keyed by a hash of their bytes, so Streamlit reruns and
+    repeated uploads skip parsing. Held in an LRU bounded by size, and optionally
+    spilled to Parquet (TIDEHUNTER_PARSE_SPILL=1) for reuse by later sessions.'''
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, spill: bool = None):
+        self.memory = LRUCache(max_entries=256, max_bytes=max_bytes, sizeof=self._sizeof)
+        if spill is None:
+            spill = os.environ.get("TIDEHUNTER_PARSE_SPILL", "0") == "1"
+        self.spill = spill
+
+    @staticmethod
+    def _sizeof(parsed: TideReadings) -> int:
+        return parsed.readings.nbytes + parsed.dates.nbytes + parsed.stations.size * 8
+
+    def _path(self, key: str) -> str:
+        return os.path.join(cache_dir("parsed"), f"{key}.parquet")
+
+    def get(self, key: str) -> TideReadings:
+        parsed = self.memory.get(key)
+        if parsed is None and self.spill and os.path.exists(self._path(key)):
+            table = pd.read_parquet(self._path(key))
+            hours = [c for c in table.columns if c.startswith("h")]
+            parsed = TideReadings(table[hours].to_numpy(np.float32),
+                                  pd.DatetimeIndex(table["date"]),
+                                  table["station"].to_numpy(object))
+            self.memory.put(key, parsed)
+        return parsed
+
+    def put(self, key: str, parsed: TideReadings) -> TideReadings:
+        self.memory.put(key, parsed)
+        if self.spill and not os.path.exists(self._path(key)):
+            table = pd.DataFrame(parsed.readings, columns=[f"h{i:02d}" for i in range(parsed.readings.shape[1])])
+            table["date"] = parsed.dates
+            table["station"] = parsed.stations
+            table.to_parquet(self._path(key), index=False)
+        return parsed
+
+    def clear(self):
+        '''Drop the in-memory entries; spilled files are left for later sessions'''
+        self.memory.clear()
+
+
+# shared by every session in the Streamlit process; cached arrays must not be mutated
+PARSE_CACHE = ParseCache()
+
+
+class IngestResult(NamedTuple):
+    '''Merged multi-file dataset plus the per-file ingest report'''
+    readings: TideReadings
+    files: pd.DataFrame         # one row per file: coverage, duplicates, overlaps, parse time
+    overlaps: pd.DataFrame      # one row per date found in more than one file
+
+
+def _parse_worker(payload):
+    '''Process pool entry point: parse one file and time it'''
+    name, data = payload
+    start = perf_counter()
+    parsed = _decode_stream(data, size_hint=len(data))
+    return name, parsed, perf_counter() - start
+
+
+def _ingest_workers() -> int:
+    '''Worker count of the ingest pool, at most INGEST_MAX_WORKERS'''
+    return min(INGEST_MAX_WORKERS, os.cpu_count() or 1)
+
+
+_INGEST_POOL = None
+_INGEST_POOL_LOCK = threading.Lock()
+
+def _ingest_pool() -> ProcessPoolExecutor:
+    '''Long-lived worker pool, kept warm across Streamlit reruns. Workers are spawned,
+    not forked, since forking the multi-threaded server can copy held locks.'''
+    global _INGEST_POOL
+    with _INGEST_POOL_LOCK:
+        if _INGEST_POOL is None:
+            _INGEST_POOL = ProcessPoolExecutor(max_workers=_ingest_workers(), mp_context=get_context("spawn"))
+            atexit.register(shutdown_ingest_pool)
+    return _INGEST_POOL
+
+
+def shutdown_ingest_pool():
+    '''Stop the worker pool; the next parallel ingest starts a new one'''
+    global _INGEST_POOL
+    with _INGEST_POOL_LOCK:
+        pool, _INGEST_POOL = _INGEST_POOL, None
+    if pool is not None:
+        atexit.unregister(shutdown_ingest_pool)
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def concat(parsed: list) -> TideReadings:
+    '''Combine several parsed files; later files win on repeated dates'''
+    parsed = [p for p in parsed if p is not None]
+    if not parsed:
+        return None
+    return TideReadings(
+        np.concatenate([p.readings for p in parsed]),
+        pd.DatetimeIndex(np.concatenate([p.dates.values for p in parsed])),
+        np.concatenate([p.stations for p in parsed]),
+    ).consolidate()
+
+
+def parse_many(files: list, parallel: bool = True) -> IngestResult:
+    '''Parse (name, bytes) pairs concurrently and merge them.
+    Later files win on repeated dates; every repeat is reported.'''
+    if not files:
+        return None
+
+    #only files not seen before are parsed
+    keys = [content_hash(data) for _, data in files]
+    results = [(name, PARSE_CACHE.get(key), 0.0) for (name, _), key in zip(files, keys)]
+    misses = [i for i, (_, parsed, _) in enumerate(results) if parsed is None]
+    payloads = [files[i] for i in misses]
+
+    total_bytes = sum(len(data) for _, data in payloads)
+    #small batches and single-core hosts parse inline
+    if parallel and len(payloads) > 1 and total_bytes >= PARALLEL_INGEST_MIN_BYTES and _ingest_workers() > 1:
+        #worker processes need their own copy of the bytes
+        parsed = list(_ingest_pool().map(_parse_worker, [(name, bytes(data)) for name, data in payloads]))
+    else:
+        parsed = [_parse_worker(p) for p in payloads]
+
+    for i, (name, readings, seconds) in zip(misses, parsed):
+        results[i] = (name, PARSE_CACHE.put(keys[i], readings), seconds)
+
+    #dates per file, repeats inside one file counted separately
+    owners = pd.DataFrame({
+        "date": np.concatenate([parsed.dates.values for _, parsed, _ in results]),
+        "file": np.repeat(np.arange(len(results)), [len(parsed.dates) for _, parsed, _ in results]),
+    })
+    repeated = owners.duplicated(keep="first")
+    unique_owners = owners[~repeated]
+    shared = unique_owners[unique_owners.duplicated("date", keep=False)]
+
+    names = np.array([name for name, _, _ in results], dtype=object)
+    overlaps = (shared.assign(file=names[shared["file"].values])
+                .groupby("date")["file"].agg(lambda f: ", ".join(f))
+                .rename("Files").rename_axis("Date").reset_index())
+
+    report = pd.DataFrame({
+        "File": names,
+        "Days": [len(parsed.dates) for _, parsed, _ in results],
+        "From": [parsed.dates.min() for _, parsed, _ in results],
+        "To": [parsed.dates.max() for _, parsed, _ in results],
+        "Duplicate Days": np.bincount(owners["file"][repeated], minlength=len(results)),
+        "Overlapping Days": np.bincount(shared["file"], minlength=len(results)),
+        "Parse Time (s)": [seconds for _, _, seconds in results],
+        "Cached": ~np.isin(np.arange(len(results)), misses),
+    })
+
+    return IngestResult(concat([parsed for _, parsed, _ in results]), report, overlaps)
@@ -3,25 +3,107 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from windrose import WindroseAxes
-from appcore import ElevationParser, TideParser, WindroseParser, SurfaceParser
+from appcore import ElevationParser, TideParser, WindroseParser, SurfaceParser, TideReadings, IngestResult, CleanReport, hourly_frame
 from streamlit_folium import st_folium
 from local_classes.variables import Lists, Dicts, Keys, Tools, LVL3Locations, CartoTileViews, Options, Others
+from local_classes.constants import RESOURCES
+from local_classes.cache import content_hash, upload_hash, LRUCache
+from local_classes.profiling import profiled, instrument
+from reprojection import same_crs
+from stations import assign_by_type, adm3_places, coastal_places, adm3_matrix
+from maplayers import map_layer, DEFAULT_ZOOM
+from vectortiles import current_tiles, missing_sources, vector_grid_options, TILE_LAYERS, SHAPEFILES
+from tidestats import TideAggregates, TideReport, TideSummary, TrendTest, summarize, report_text
 
 import plotly.express as px
 import plotly.graph_objects as go
 import os, json
-import geopandas as gpd
-from typing import Literal
-from folium.plugins import Draw
+from typing import Literal, NamedTuple
+from folium.plugins import Draw, VectorGridProtobuf
 import folium
 
-import pykrige
 
-from io import StringIO
 
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 
+@profiled("tide_summary")
+@st.cache_data(show_spinner="Computing tide statistics...", max_entries=16)
+def tide_summary(key: str, _series: pd.Series) -> TideSummary:
+    '''Tide statistics memoized by the content hash of the series, so widget changes only re-render'''
+    return summarize(_series)
+
+
+def series_key(series: pd.Series) -> str:
+    return content_hash(series.values, series.index.asi8)
+
+
+class SurfaceModel(NamedTuple):
+    '''An interpolated surface, as cached between reruns'''
+    gridx: np.ndarray
+    gridy: np.ndarray
+    z: np.ndarray
+    variance: np.ndarray = None
+    variogram: object = None
+
+
+class ExportOptions(NamedTuple):
+    '''How the Modeller exports its rasters, and how a survey is gridded again for another projection'''
+    targets: list               # Dicts.PROJECTIONS entries to export to
+    reprojection: str           # "raster" warps the survey raster, otherwise the soundings are gridded again
+    compress: str               # COG codec, None for a plain GTiff
+    resolution: int
+    method: str
+    neighbours: int
+    radius_m: float
+    variogram: str
+    variance_threshold: float
+
+
+#parsed surveys and their surfaces; kept out of st.cache_data because parsing reports through st.toast
+#and kriging updates a progress bar, neither of which a cache hit can replay
+SURVEY_CACHE = LRUCache(max_entries=4, max_bytes=512 * 1024 * 1024, sizeof=lambda survey: int(survey[0].memory_usage().sum()))
+SURFACE_CACHE = LRUCache(max_entries=8, max_bytes=512 * 1024 * 1024, sizeof=lambda model: 2 * model.z.nbytes)
+
+
+@profiled("survey_data")
+def survey_data(key: str, uploads: list, crs: str):
+    '''Cleaned soundings of all uploads in one frame and the combined cleaning report, with the
+    soundings outside the area of use of `crs` counted, memoized by the uploads' content hashes'''
+    key = f"{key}|{crs}"
+    cached = SURVEY_CACHE.get(key)
+    if cached is not None:
+        return cached
+    parse = SurfaceParser()
+    frames, reports = [], []
+    for upload in uploads:
+        #the ident column would complicate the merge
+        frames.append(Modeller.load_df(upload, parse, crs).drop(columns=['ident'], errors='ignore'))
+        reports.append(parse.cleaning)
+    return SURVEY_CACHE.put(key, (pd.concat(frames, ignore_index=True), CleanReport.total(reports)))
+
+
+def uploads_key(uploads: list) -> str:
+    return content_hash(*(upload_hash(upload).encode() for upload in uploads))
+
+
+@profiled("surface_model")
+def surface_model(key: str, data: pd.DataFrame, resolution: int, method: str,
+                  neighbours: int = None, radius: float = None, variogram: str = "linear", progress=None) -> SurfaceModel:
+    '''Interpolated grid memoized by survey hash, resolution and interpolator parameters (the search
+    radius is in the projection's units), so display and export changes skip the interpolation'''
+    model_key = (key, resolution, method, neighbours, radius, variogram)
+    cached = SURFACE_CACHE.get(model_key)
+    if cached is not None:
+        return cached
+
+    parse = SurfaceParser()
+    x, y, z = parse.interpolate_data(data, resolution, method=method, neighbours=neighbours, radius=radius,
+                                     variogram=variogram, progress=progress)
+    return SURFACE_CACHE.put(model_key, SurfaceModel(x, y, z, parse.variance, parse.variogram))
+
+
+@instrument
 class SingleProcessorAppWidgets:
     def __init__(self):    
         try:
@@ -45,10 +127,14 @@ class SingleProcessorAppWidgets:
             tide_data = st.file_uploader("Choose a file",type=Lists.ACCEPTED_UPLOAD_FORMATS.value)
 
             if tide_data is not None:
-                raw = parser.parse_upload_io(tide_data)
                 self.filename = tide_data.name
+                try:
+                    parsed = parser.parse_upload(tide_data).consolidate()
+                except ValueError as e:
+                    st.error(f"Unable to read {tide_data.name}: {e}")
+                    return None
                 st.success("File loaded!")
-                return parser.parse_data_linestring(raw)
+                return parsed
             
             else:
                 st.write("Upload a valid NAMRIA tide file.")
@@ -58,15 +144,15 @@ class SingleProcessorAppWidgets:
         with st.container():
             col1, col2 = st.columns([0.3, 0.7])
             with col1:
-                st.image(os.path.join("resources","media","logo.png"), use_container_width=True)
+                st.image(os.path.join(RESOURCES, "media", "logo.png"), use_container_width=True)
             with col2:
                 st.title("tideHunter")
                 st.write("A simplified, _friendly_ interface for processing :blue[NAMRIA Tide Data]")
                 st.write("_for :blue[MGBR3 - Coastal Assessment Team]_")
 
-    def date_filter(self, dataframe: pd.DataFrame, keycode: Literal["SN","MT"]):
-        dataframe = dataframe.replace(999,np.nan)
-        dataframe = dataframe.sort_index(axis=1)
+    def date_filter(self, series: pd.Series, keycode: Literal["SN","MT"]):
+        #wide view is only built for display
+        dataframe = hourly_frame(series)
         st.subheader("Filter Data by Date")
         st.text("Shows only data within specified timeframe. All measurements are in centimeters. You can also download a CSV copy of the data.")
         dates = dataframe.columns
@@ -85,16 +171,23 @@ class SingleProcessorAppWidgets:
         filtered_df.columns = [str(x.date()) for x in filtered_df]
         st.dataframe(filtered_df, height=200)
 
-    def calculate_stats(self, dataframe: pd.DataFrame):
-        dfmax = dataframe.T.max(axis=1).dropna()
-        dfmin = dataframe.T.min(axis=1).dropna()
-        dfdiff = dfmax - dfmin #mean tidal range
-        dfmean = dfmax+dfmin
-        return dfdiff.mean(), dfmean.div(2).mean()
+    def summarize(self, series: pd.Series) -> TideSummary:
+        return tide_summary(series_key(series), series)
+
+    def trend_table(self, trend: TrendTest):
+        if np.isnan(trend.tau):
+            st.caption(f"Not enough monthly means ({trend.n}) for a trend test.")
+            return
+        table = {
+            "Mann-Kendall": f"tau={trend.tau:.3f}, p={trend.mk_p_value:.3f}",
+            "Sen's Slope": f"{trend.sen_slope:.3f}cm",
+            "Trend": trend.direction,
+        }
+        st.table(pd.DataFrame(table, index=["Trend Test"]))
     
-    def monthly_hourly_average(self, dataframe: pd.DataFrame, keycode: Literal["SN","MT"]):
-        # Resample to monthly frequency and calculate the mean for each hour
-        monthly_hrly_avg = dataframe.T.resample(self.rsmp).mean().T
+    def monthly_hourly_average(self, aggregates: TideAggregates, keycode: Literal["SN","MT"]):
+        # Monthly mean for each hour, precomputed by the aggregate engine
+        monthly_hrly_avg = aggregates.monthly_hourly.T.copy()
         if keycode == Keys.SINGLE.value:
             monthly_hrly_avg.columns = [x.strftime('%B') for x in monthly_hrly_avg.columns]
         else:
@@ -115,11 +208,11 @@ class SingleProcessorAppWidgets:
 
         return monthly_hrly_avg
 
-    def monthly_average(self, dataframe: pd.DataFrame, keycode: Literal["SN","MT"]):
-        # Resample to monthly frequency and calculate the mean for each hour
-        monthly_avg = dataframe.T.resample(self.rsmp).mean().mean(axis=1).dropna()
-        max_monthly_tide = dataframe.T.resample(self.rsmp).max().max(axis=1)
-        min_monthly_tide = dataframe.T.resample(self.rsmp).min().min(axis=1)
+    def monthly_average(self, aggregates: TideAggregates, keycode: Literal["SN","MT"]):
+        # Monthly mean, max and min read from the aggregate tables
+        monthly_avg = aggregates.monthly["mean"].dropna()
+        max_monthly_tide = aggregates.monthly["max"].copy()
+        min_monthly_tide = aggregates.monthly["min"].copy()
 
         if keycode == Keys.SINGLE.value:
             monthly_avg.index = [x.strftime('%B') for x in monthly_avg.index]
@@ -140,69 +233,42 @@ class SingleProcessorAppWidgets:
         graph_obj_minmax = Tools.plot_high_low(min_df=min_monthly_tide, max_df=max_monthly_tide)
         st.plotly_chart(graph_obj_minmax, theme="streamlit", use_container_width=True, key=f"{keycode.lower()}_minmax")
 
-        #feed to next req
-        monthly_avg, slope, intercept = Tools.get_linear_regression(list(range(len(monthly_avg))), monthly_avg)
-        return monthly_avg, slope, intercept
-
-    def create_overview(self, dataset):
+    def create_overview(self, dataset: TideReadings):
         with st.expander('Dataset View'):
-            self.df = pd.DataFrame.from_dict(dataset)
-            self.df = self.df.iloc[1:].replace(999,np.nan)
+            #canonical hourly series, the wide frame is only for display
+            self.series = dataset.to_series()
 
-            #dummy copy
-            preview = self.df.copy()
-            preview.columns = [str(x) for x in self.df.columns]
-
-            #update to PD DATETIME Compatible
-            self.df.columns = pd.to_datetime(self.df.columns, format='%d-%m-%Y')
+            preview = hourly_frame(self.series)
+            preview.columns = preview.columns.strftime('%d-%m-%Y')
 
             #view
             st.dataframe(preview,height=850)
             st.text("You can also download a copy of the file. However your mouse to the dataframe and click the download icon.")
 
-    def generate_report(self, monthly_avg: pd.Series, monthly_hrly_avg, slope, intercept):
-        if isinstance(monthly_avg, pd.Series):
-            annual_avg_values = monthly_avg.mean()
-        else:
-            annual_avg_values = monthly_avg[0].mean()
-
-        df = self.df
-        MTL = self.df.T.max()+self.df.T.min()
-        MTR = self.df.T.max()-self.df.T.min()
-
-
+    def generate_report(self, report: TideReport, trend: TrendTest):
         st.header("Tide Report")
         st.text("Generate a summary report of the tide data.")
         st.divider()
 
         dataset = {
-            "Mean Sea Level": f"{annual_avg_values/100:.2f}m",
-            "Mean Tide Level": f"{round(MTL.div(2).mean()/100, 2)}m",
-            "Mean Tidal Range": f"{round(MTR.mean(), 2)}cm",
+            "Mean Sea Level": f"{report.msl/100:.2f}m",
+            "Mean Tide Level": f"{round(report.mtl/100, 2)}m",
+            "Mean Tidal Range": f"{round(report.mtr, 2)}cm",
         }
 
         st.table(pd.DataFrame(dataset,index=["Tidal Summary"]))
 
         regression = {
-            "Mean Rate of Change thru regression": f"{slope:.3f}cm",
-            "Equation of the line": f"y={slope:.3f}x + {intercept:.3f}"
+            "Mean Rate of Change thru regression": f"{report.slope:.3f}cm",
+            "Equation of the line": f"y={report.slope:.3f}x + {report.intercept:.3f}"
         }
 
         st.table(pd.DataFrame(regression,index=["Regression Summary"]))
+        self.trend_table(trend)
 
-        info_text = f"""
-                Mean Sea Level: {annual_avg_values/100:.2f}m
-                Mean Tide Level: {round(MTL.div(2).mean()/100, 2)}m
-                Mean Tidal Range: {round(MTR.mean(), 2)}cm
-                {'-'*8}
-                TEMPORAL REGRESSION
-                Tidal Linear Equation: y={slope:.3f}x + {intercept:.3f}
-                Equation of the line: {slope:.3f}cm
-                """
-        
         filename = self.filename.split(".")[0]
         download_button = st.download_button("Download a .txt summary copy",
-                                            info_text,
+                                            report_text(report),
                                             f"tide_report_{filename}.txt",
             key="gen_report_monthly"
         )
@@ -216,44 +282,46 @@ class SingleProcessorAppWidgets:
 
         dataset = self.upload_file_widget()
 
-        if dataset:
+        if dataset is not None:
             with st.container(border=True):
                 st.subheader("Dataset Overview")
                 self.create_overview(dataset=dataset)
+            try:
+                summary = self.summarize(self.series)
+            except ValueError as e:
+                st.error(f"Unable to summarize the tide data: {e}")
+                return
+            self.aggregates = summary.aggregates
 
             with st.container(border=True):
-                hourlyAvg = self.monthly_hourly_average(self.df, keycode=Keys.SINGLE.value)
+                self.monthly_hourly_average(self.aggregates, keycode=Keys.SINGLE.value)
             with st.container(border=True):
-                monthlyAvg, slope, intercept = self.monthly_average(self.df, keycode=Keys.SINGLE.value)
+                self.monthly_average(self.aggregates, keycode=Keys.SINGLE.value)
             with st.container(border=True):
-                self.generate_report(monthlyAvg, hourlyAvg, slope, intercept)
+                self.generate_report(summary.monthly_report, summary.monthly_trend)
             with st.container(border=True):
-                self.date_filter(self.df, keycode=Keys.SINGLE.value)
+                self.date_filter(self.series, keycode=Keys.SINGLE.value)
 
+@instrument
 class MultipleProcessorAppWidgets(SingleProcessorAppWidgets):
     def introduction(self):
         with st.container(border=True):
             st.subheader("What is Multiple Processor?")
             st.text("Multiple File Processor allows the user to upload more than 10-year data points. It enables user to create a comparative statistical analysis of tide data for different yearly tide facets.")
 
-    def yearly_average(self, dataframe: pd.DataFrame, keycode: Literal["SN","MT"]):
-        # Resample to yearly frequency and calculate the mean
-        try:
-            resamp_code = "YE"
-            yearly_avg = dataframe.T.resample(resamp_code).mean().mean(axis=1)
-        except ValueError:
-            resamp_code = "Y"
-            yearly_avg = dataframe.T.resample(resamp_code).mean().mean(axis=1)
+    def yearly_average(self, aggregates: TideAggregates, keycode: Literal["SN","MT"]):
+        # Yearly mean, max and min read from the aggregate tables
+        yearly_avg = aggregates.yearly["mean"].copy()
 
         year_data = yearly_avg.index
         yearly_avg.index = [x.year for x in year_data]
 
         # Calculate the maximum annual tide
-        max_annual_tide = dataframe.T.resample(resamp_code).max().max(axis=1)
+        max_annual_tide = aggregates.yearly["max"].copy()
         max_annual_tide.index = [x.year for x in max_annual_tide.index]
 
         # Calculate another mean annual tide (e.g., median)
-        min_annual_tide = dataframe.T.resample(resamp_code).min().min(axis=1)
+        min_annual_tide = aggregates.yearly["min"].copy()
         min_annual_tide.index = [x.year for x in min_annual_tide.index]
 
 
@@ -282,9 +350,6 @@ class MultipleProcessorAppWidgets(SingleProcessorAppWidgets):
         ))
 
         st.plotly_chart(fig, theme="streamlit", use_container_width=True, key=f"{keycode.lower()}_yr")
-        
-        y,m,b = Tools.get_linear_regression(list(range(len(yearly_avg))), yearly_avg)
-        return yearly_avg, y,m,b
 
     def upload_file_widget(self):
         parser = ElevationParser()
@@ -295,58 +360,57 @@ class MultipleProcessorAppWidgets(SingleProcessorAppWidgets):
             
 
             if tide_data is not None:
-                #process and merge
-                merged = {}
-                for data in tide_data:
-                    raw = parser.parse_upload_io(data)
-                    parsed = parser.parse_data_linestring(raw)
-                    merged.update(parsed)
-                return merged
+                #process in parallel and merge, later files win on repeated dates
+                try:
+                    ingest = parser.parse_uploads(tide_data)
+                except ValueError as e:
+                    st.error(f"Unable to read the uploaded files: {e}")
+                    return None
+                if ingest is None:
+                    return None
+
+                self.ingest_report(ingest)
+                return ingest.readings
             else:
                 st.write("Upload a valid NAMRIA tide file.")
                 return None
             
-    def generate_report_yr(self, yearly_avg: pd.Series, slope, intercept, raw):
-
-        #calculate the Mean Tide Lvl
-        MTR, MTL = self.calculate_stats(raw)
-
-        if isinstance(yearly_avg, pd.Series):
-            annual_avg_values = yearly_avg.mean().mean()
-        else:
-            annual_avg_values = yearly_avg.mean().mean()
-
+    def ingest_report(self, ingest: IngestResult):
+        if not ingest.overlaps.empty:
+            st.warning(f"{len(ingest.overlaps)} date(s) appear in more than one file. Readings from the file uploaded last were kept.")
+        with st.expander("Ingest Summary"):
+            st.dataframe(ingest.files, hide_index=True)
+            st.caption(f"Parsed {ingest.files['Days'].sum()} days in {ingest.files['Parse Time (s)'].sum():.3f}s of parser time.")
+            if not ingest.overlaps.empty:
+                st.text("Overlapping dates")
+                st.dataframe(ingest.overlaps, hide_index=True)
+
+    def generate_report_yr(self, report: TideReport, trend: TrendTest):
         st.header("Tide Report")
         st.text("Generate a summary report of the tide data.")
         st.divider()
 
         dataset = {
-            "Mean Sea Level": f"{annual_avg_values/100:.2f}m",
-            "Mean Tide Level": f"{round(MTL/100, 2)}m",
-            "Mean Tidal Range": f"{round(MTR, 2)}cm",
+            "Mean Sea Level": f"{report.msl/100:.2f}m",
+            "Mean Tide Level": f"{round(report.mtl/100, 2)}m",
+            "Mean Tidal Range": f"{round(report.mtr, 2)}cm",
         }
 
         st.table(pd.DataFrame(dataset,index=["Tidal Summary"]))
 
         regression = {
-            "Mean Rate of Change thru regression": f"{slope:.3f}cm",
-            "Equation of the line": f"y={slope:.3f}x + {intercept:.3f}"
+            "Mean Rate of Change thru regression": f"{report.slope:.3f}cm",
+            "Equation of the line": f"y={report.slope:.3f}x + {report.intercept:.3f}"
         }
 
         st.table(pd.DataFrame(regression,index=["Regression Summary"]))
+        self.trend_table(trend)
 
-        filename = f"{yearly_avg.index.min()}-{yearly_avg.index.max()}"
+        filename = f"{report.start.year}-{report.end.year}"
         st.divider()
-        info_text = f"""
-                Mean Sea Level: {annual_avg_values/100:.2f}m
-                Mean Tide Level: {round(MTL/100, 2)}m
-                Mean Tidal Range: {round(MTR, 2)}cm
-                {'-'*8}
-                TEMPORAL REGRESSION
-                Tidal Linear Equation: y={slope:.3f}x + {intercept:.3f}
-                Equation of the line: {slope:.3f}cm
-                """
+        info_text = report_text(report)
 
+        slope = report.slope
         color = "green" if slope < 0 else "red"
         remarks = "rising" if slope > 0 else "decreasing"
         st.write(f"Tide level is generally **:{color}[{remarks}]** by :{color}[{round(abs(slope),2)}cm].")
@@ -364,47 +428,39 @@ class MultipleProcessorAppWidgets(SingleProcessorAppWidgets):
 
         files = self.upload_file_widget()
 
-        if files:
+        if files is not None:
             with st.container(border=True):
                 st.subheader("Dataset Overview")
                 self.mdf = self.create_merged_overview(dataset=files)
+            try:
+                summary = self.summarize(self.mdf)
+            except ValueError as e:
+                st.error(f"Unable to summarize the tide data: {e}")
+                return
+            self.aggregates = summary.aggregates
+
             with st.container(border=True):
-                self.monthly_hourly_average(self.mdf, keycode=Keys.MULTIPLE.value)
+                self.monthly_hourly_average(self.aggregates, keycode=Keys.MULTIPLE.value)
                 
             with st.container(border=True):
-                yrly_pred, slope, intercept = self.monthly_average(self.mdf, keycode=Keys.MULTIPLE.value)
+                self.monthly_average(self.aggregates, keycode=Keys.MULTIPLE.value)
 
             with st.container(border=True):
-                try:
-                    pred, y, m, b = self.yearly_average(self.mdf, keycode=Keys.MULTIPLE.value)
-                except (AttributeError, np.linalg.LinAlgError):
-                    st.error("Not enough points to create a regression calculation. Consider uploading additional points.")
+                self.yearly_average(self.aggregates, keycode=Keys.MULTIPLE.value)
 
             with st.container(border=True):
-                try:
-                    # regression_pred, slope, intercpt = Tools.get_linear_regression(list(range(len(self.mdf))), self.mdf)
-                    self.generate_report_yr(pred, slope, intercept, self.mdf)
-                except UnboundLocalError:
-                    pass
+                self.generate_report_yr(summary.yearly_report, summary.monthly_trend)
         
             with st.container(border=True):
-                try:
-                    self.date_filter(self.mdf, keycode=Keys.MULTIPLE.value)
-                except UnboundLocalError:
-                    pass
+                self.date_filter(self.mdf, keycode=Keys.MULTIPLE.value)
 
-    def create_merged_overview(self, dataset):
+    def create_merged_overview(self, dataset: TideReadings):
         with st.expander('Dataset View'):
-            mdf = pd.DataFrame.from_dict(dataset)
-            mdf = mdf.iloc[1:].replace(999,np.nan)
+            #canonical hourly series, the wide frame is only for display
+            mdf = dataset.to_series()
 
-            #dummy copy
-            preview = mdf.copy().dropna()
-            preview.columns = [str(x) for x in mdf.columns]
-            
-            #update to PD DATETIME Compatible
-            mdf.columns = pd.to_datetime(mdf.columns, format='%d-%m-%Y')
-            mdf = mdf.sort_index(axis=1)
+            preview = hourly_frame(mdf).dropna()
+            preview.columns = preview.columns.strftime('%d-%m-%Y')
 
             #view
             st.dataframe(preview,height=850)
@@ -412,6 +468,7 @@ class MultipleProcessorAppWidgets(SingleProcessorAppWidgets):
 
             return mdf
         
+@instrument
 class TideStationLocator(SingleProcessorAppWidgets):
     def __init__(self):
         #dynamically fetch the window size of device
@@ -422,6 +479,8 @@ class TideStationLocator(SingleProcessorAppWidgets):
             st.session_state.download_report = {}
         if "folium_viewing_options" not in st.session_state:
             st.session_state.folium_viewing_options = {"expand": True}
+        if "locator_view" not in st.session_state:
+            st.session_state.locator_view = {"center": [15.0790122,120.8849141], "zoom": DEFAULT_ZOOM}
 
 
 
@@ -436,30 +495,38 @@ class TideStationLocator(SingleProcessorAppWidgets):
                      I use NAMRIA Administrative Boundary centroids as starting basepoint representing Region III cities and municipalities.''')
             st.subheader("Sample code")
             st.code('''
-                    from geopy.distance import geodesic
+                    from pyproj import Geod
 
                     # all using WGS84
+                    geod = Geod(ellps="WGS84")
                     point1 = (lat, long)
 
-                    from station_point to manyPoints:               # calculation
-                        print(geodesic(point1, station_point).km)   #calculate and prints out the distance 
+                    # only the few stations nearest on a KD-tree are measured
+                    _, _, meters = geod.inv(long, lat, station_longs, station_lats)
+                    print(meters / 1000)                            # distances in km
                     ''')
 
     def station_locator(self):
-        primary_ST = pd.read_csv(os.path.join("resources","geospatial","primary_stations.csv"))
-        secondary_ST = pd.read_csv(os.path.join("resources","geospatial","secondary_stations.csv"))
-        admin_places = pd.read_csv(os.path.join("resources","geospatial","adm3_places.csv"))
-
-        @st.cache_data(show_spinner=False)
-        def locate_map_elements():
-            roads = gpd.read_file(os.path.join(os.getcwd(),"resources","geospatial","shapefiles","roads","r3_road_diss.shp"))
-            boundaries = gpd.read_file(os.path.join(os.getcwd(),"resources","geospatial","shapefiles","boundaries","region_3.shp"))
-            
-            # Drop datetime columns from boundaries
-            datetime_columns = ["date", "validOn", "validTo"]
-            boundaries = boundaries.drop(columns=[col for col in datetime_columns if col in boundaries.columns])
-
-            return (roads.to_json(), boundaries.to_json())
+        primary_ST = pd.read_csv(os.path.join(RESOURCES, "geospatial", "primary_stations.csv"))
+        secondary_ST = pd.read_csv(os.path.join(RESOURCES, "geospatial", "secondary_stations.csv"))
+        admin_places = pd.read_csv(os.path.join(RESOURCES, "geospatial", "adm3_places.csv"))
+
+        def add_map_layer(layer, style, zoom, *maps):
+            #vector tiles when Streamlit serves static files and they are cut, otherwise GeoJSON simplified to the zoom of the last fetch
+            shapefile = TILE_LAYERS[layer][0]
+            try:
+                tiles = current_tiles(layer) if st.get_option("server.enableStaticServing") else None
+                if tiles is not None:
+                    base = st.get_option("server.baseUrlPath").strip("/")
+                    url = "/" + "/".join(part for part in (base, "app", "static", tiles["path"]) if part) + "/{z}/{x}/{y}.pbf"
+                    for target in maps:
+                        VectorGridProtobuf(url, layer.title(), vector_grid_options(tiles, style)).add_to(target)
+                else:
+                    data = map_layer(os.path.join(SHAPEFILES, shapefile), zoom)
+                    for target in maps:
+                        folium.GeoJson(data=data, name=layer.title(), style_function=lambda x: style).add_to(target)
+            except FileNotFoundError:
+                st.warning(f"The {layer} layer is not available: {os.path.basename(shapefile)} is missing.")
 
 
         with st.container():
@@ -485,8 +552,10 @@ class TideStationLocator(SingleProcessorAppWidgets):
                     col1, col2 = st.columns([1,1])
                     with col1:
                         show_ranked = st.text_input("Show how many stations nearby",'5',max_chars=2, key="show_ranked")
-                        show_roads = st.checkbox("Show Roads", value=False, key="show_roads_checkbox")
-                        show_boundaries = st.checkbox("Show Boundaries", value=False, key="show_boundaries_checkbox")
+                        #overlays whose shapefile is not bundled cannot be drawn, from tiles or otherwise
+                        missing_layers = missing_sources()
+                        show_roads = st.checkbox("Show Roads", value=False, key="show_roads_checkbox", disabled="roads" in missing_layers)
+                        show_boundaries = st.checkbox("Show Boundaries", value=False, key="show_boundaries_checkbox", disabled="boundaries" in missing_layers)
                         show_drawbox = st.checkbox("Show Draw Box", value=False, key="show_drawbox_checkbox")
 
                     with col2:
@@ -510,11 +579,15 @@ class TideStationLocator(SingleProcessorAppWidgets):
                                          key="province",
                                          disabled=show_drawbox)
 
-                    st.caption("Show roads will significantly slow down the map rendering. Use with caution.")
+                    st.caption("Roads and boundaries are drawn from vector tiles once `python tidehunter.py tiles` has cut them, otherwise simplified to the map zoom.")
+                    if missing_layers:
+                        st.caption("Not available, their shapefiles are missing from resources/geospatial/shapefiles: "
+                                   + ", ".join(f"{layer} ({os.path.basename(path)})" for layer, path in missing_layers.items()) + ".")
             
-            #initialize map
-            m = folium.Map(location=[15.0790122,120.8849141], zoom_start=8, tiles=tile_set)
-            n = folium.Map(location=[15.0790122,120.8849141], zoom_start=8, tiles=tile_set)
+            #initialize map, reopening at the last view so the layers match its zoom
+            view = st.session_state.locator_view
+            m = folium.Map(location=view["center"], zoom_start=view["zoom"], tiles=tile_set)
+            n = folium.Map(location=view["center"], zoom_start=view["zoom"], tiles=tile_set)
 
             with st.form(key="folium_map"):   
                 fetch = st.form_submit_button("Fetch Nearest Station", help="Fetch the nearest station based on the selected city/municipality and province.")
@@ -535,17 +608,14 @@ class TideStationLocator(SingleProcessorAppWidgets):
                             st.subheader("Map View")
                             st.caption("If marker was enabled, you can add up to 5 points. More than it would cause leaflet to slow down.")
                                             #initialize map
-                            #load shapefiles and add to map
-                            with st.spinner("Loading map data. This may take awhile."):
-                                roads, boundaries = locate_map_elements()
-
-                            #shows the elements
-                            if show_roads:
-                                folium.GeoJson(data=roads, name="Roads", style_function=lambda x: {"color": "cyan", "weight": 0.3}).add_to(m)
-                                folium.GeoJson(data=roads, name="Roads", style_function=lambda x: {"color": "cyan", "weight": 0.3}).add_to(n)
-                            if show_boundaries:
-                                folium.GeoJson(data=boundaries, name="Boundaries", style_function=lambda x: {"color": "yellow", "weight": 1}).add_to(m)
-                                folium.GeoJson(data=boundaries, name="Boundaries", style_function=lambda x: {"color": "yellow", "weight": 1}).add_to(n)
+                            #load only the ticked layers, so an unticked one is neither read nor warned about
+                            selected = [(layer, style) for layer, style, shown in (
+                                ("roads", {"color": "cyan", "weight": 0.3}, show_roads),
+                                ("boundaries", {"color": "yellow", "weight": 1}, show_boundaries)) if shown]
+                            if selected:
+                                with st.spinner("Loading map data. This may take awhile."):
+                                    for layer, style in selected:
+                                        add_map_layer(layer, style, view["zoom"], m, n)
 
                             for _, row in primary_ST.iterrows():
                                 folium.Marker([row["Lat"], row["Long"]],
@@ -565,11 +635,14 @@ class TideStationLocator(SingleProcessorAppWidgets):
                             
                         with st.expander('Viewfinder',expanded=st.session_state.folium_viewing_options['expand']):
                             fol_map = st_folium(m,use_container_width=True, height=350)
+                            if fol_map and fol_map.get("zoom") and fol_map.get("center"):
+                                st.session_state.locator_view = {"center": [fol_map["center"]["lat"], fol_map["center"]["lng"]], "zoom": fol_map["zoom"]}
 
                         with st.container():
                             if not show_drawbox:
                                 st.subheader(f"Tide Station: {place}, {prov}",divider=True)
-                                near_st = Tools.calculate_distances_from_points(st.session_state.subject_coordinates, primary_ST, secondary_ST, int(show_ranked))
+                                #municipality centroids are static: read their ranking from the precomputed matrix
+                                near_st = adm3_matrix(os.path.join(RESOURCES, "geospatial")).nearest(city_data.index[0], int(show_ranked))
                                 st.session_state.download_report = near_st
                                 for i, (k, v) in enumerate(near_st.items()):
                                     st.write(f"**Distance to :blue[_{k}_]** :green[_{round(v['distance'], 4)} km_]")
@@ -644,12 +717,46 @@ class TideStationLocator(SingleProcessorAppWidgets):
                 st.rerun()
                 self.__init__()
 
+    def bulk_assignment(self):
+        places_of = {"adm3": adm3_places, "coastal": coastal_places}
+        geospatial = os.path.join(RESOURCES, "geospatial")
+
+        with st.container(border=True):
+            st.subheader("Bulk Station Assignment")
+            st.text("Rank the nearest tide stations of every city/municipality or coastal place in one run.")
+
+            col1, col2 = st.columns([1,1])
+            with col1:
+                source = st.selectbox("Places", Dicts.STATION_PLACES.value.keys(), key="bulk_places")
+                per_type = st.checkbox("Rank primary and secondary stations separately", value=False, key="bulk_per_type")
+            with col2:
+                rank = st.number_input("Stations per place", min_value=1, max_value=20, value=5, key="bulk_rank")
+
+            if st.button("Assign Stations", key="bulk_assign"):
+                primary_ST = pd.read_csv(os.path.join(geospatial, "primary_stations.csv"))
+                secondary_ST = pd.read_csv(os.path.join(geospatial, "secondary_stations.csv"))
+                try:
+                    places = places_of[Dicts.STATION_PLACES.value[source]](geospatial)
+                    st.session_state.bulk_assignment = assign_by_type(primary_ST, secondary_ST, places, int(rank), per_type)
+                except FileNotFoundError as e:
+                    st.warning(f"{source} are not available: {os.path.basename(e.args[0])} is missing. "
+                               "Only the city/municipality centroids can be ranked until it is added.")
+
+            table = st.session_state.get("bulk_assignment")
+            if table is not None:
+                st.caption(f"{table['Place'].nunique()} places, {len(table)} ranked stations. Distances are WGS84 geodesics in km.")
+                st.dataframe(table, hide_index=True, height=400)
+                st.download_button("Download station assignment", table.to_csv(index=False),
+                                   file_name="station_assignment.csv", mime="text/csv", key="bulk_download")
+
     def body(self):
         #view the body if the dataset is not empty
         self.app_header()
         self.introduction()
         self.station_locator()
+        self.bulk_assignment()
 
+@instrument
 class WXTideProcessor(SingleProcessorAppWidgets):
     def introduction(self):
         with st.container(border=True):
@@ -664,10 +771,10 @@ class WXTideProcessor(SingleProcessorAppWidgets):
             tide_data = st.file_uploader("Choose a file",type=Lists.ACCEPTED_UPLOAD_FORMATS_WXTIDE.value, key="wxtide_upload")
 
             if tide_data is not None:
-                raw = parser.parse_upload_io(tide_data)
                 self.filename = tide_data.name
+                parsed = parser.parse_tide_stream(tide_data)
                 st.success("File loaded!")
-                return parser.parse_tide_data_linestring(raw)
+                return parsed
             
             else:
                 st.write("Upload a valid WXTide TXT tide file.")
@@ -748,6 +855,7 @@ class WXTideProcessor(SingleProcessorAppWidgets):
             df = self.plot_tide(dataset)
             get_mean = self.calculate_mean_tide(df)
 
+@instrument
 class WindroseProcessor(SingleProcessorAppWidgets):
     def introduction(self):
         with st.container(border=True):
@@ -755,15 +863,6 @@ class WindroseProcessor(SingleProcessorAppWidgets):
             st.text("Windrose Processor allows the user to create statistical inference derived from wind data from PAG-ASA.")
             st.caption("For more information, visit https://bagong.pagasa.dost.gov.ph/")
 
-    def deg_to_compass(self, degree):
-        if not pd.isna(degree):
-            directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
-                        'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
-            index = int((degree % 360) / 22.5 + 0.5)
-            return directions[index % 16]
-        else:
-            return np.nan
-
     def upload_file_widget(self):
         parser = WindroseParser()
 
@@ -772,23 +871,7 @@ class WindroseProcessor(SingleProcessorAppWidgets):
             tide_data = st.file_uploader("Choose a file",type=Lists.ACCEPTED_UPLOAD_FORMATS_WINDROSE.value, key="windrose_upload")
 
             if tide_data is not None:
-                #create an empty dataframe
-                new_df = pd.DataFrame()
-
-                #parse the data
-                raw = pd.read_csv(tide_data)
-
-                #create a dateobject by merging 2 columns of Year and Month
-                new_df["Date"] = pd.to_datetime(raw["YEAR"].astype(str) + "-" + raw["MONTH"].astype(str), format="%Y-%m")
-                new_df["STRDate"] = new_df["Date"].dt.strftime("%Y-%B")
-                new_df["WindSpeed"] = raw["WIND_SPEED"].replace(-999, np.nan)
-                new_df["WindDirection"] = raw["WIND_DIRECTION"].replace(-999, np.nan)
-
-                new_df['WindDirectionDesc'] = new_df["WindDirection"].apply(self.deg_to_compass)
-                
-                #create a col where it indicates where the wind is blowing to
-                new_df['WindDirectionTo'] = (new_df['WindDirection'] + 180) % 360
-                return new_df
+                return parser.read_wind_csv(tide_data)
             
             else:
                 st.write("Upload a valid wind data in CSV tide file.")
@@ -891,6 +974,7 @@ class WindroseProcessor(SingleProcessorAppWidgets):
         if dataset is not None and isinstance(dataset, pd.DataFrame):
             self.plot_windrose_widget(dataset)
             
+@instrument
 class Modeller(SingleProcessorAppWidgets):
     def __init__(self):
         super().__init__()
@@ -912,10 +996,8 @@ class Modeller(SingleProcessorAppWidgets):
                                           key="wxtide_upload")
 
             if tide_data is not None:
-                dump = []
-                for data in tide_data:
-                    raw = parser.parse_upload_io(data)
-                    dump.append(parser.parse_surface_data_linestring(raw))
+                #uploads are streamed later by load_df, empty files are skipped
+                dump = [data for data in tide_data if data.size]
                 st.success("File loaded!")
                 return dump
             
@@ -924,15 +1006,68 @@ class Modeller(SingleProcessorAppWidgets):
                 return None
             
 
-    def load_df(self, dataset, parse: SurfaceParser):
-        df = pd.read_csv(StringIO(dataset),delimiter=",")
-        if not parse.validate_df(df):
-            # remove incomplete rows
-            df.dropna(subset=["depth", "Latitude", "Longitude"], inplace=True)
-        parse.remove_zero_depth_rows(df)
+    @staticmethod
+    def load_df(dataset, parse: SurfaceParser, crs: str = None):
+        # streamed in row blocks, unusable and zero-depth rows are removed per block
+        df = parse.read_surface_csv(dataset, crs=crs)
         df['depth'] = df["depth"].mul(-1)
         return df
 
+    @staticmethod
+    def read_survey(dataset, projection: dict):
+        '''(survey key, cleaned soundings, cleaning report) of the uploads, or None once the reason is shown'''
+        if not dataset:
+            st.error("No dataset uploaded. Please upload a valid dataset.")
+            return None
+        survey = uploads_key(dataset)
+        try:
+            merged_df, cleaning = survey_data(survey, dataset, projection["COMPLETE_CRS_CODE"])
+        except KeyError as e:
+            st.error(f"Unable to read the survey: {e.args[0]}")
+            return None
+        return survey, merged_df, cleaning
+
+    def cleaning_summary(self, report: CleanReport, projection: dict):
+        st.caption(f"Read {report.rows:,} soundings and kept {report.kept:,}: {report.non_numeric:,} non-numeric, "
+                   f"{report.missing:,} incomplete and {report.zero_depth:,} zero-depth rows removed.")
+        if report.out_of_bounds:
+            st.warning(f"{report.out_of_bounds:,} soundings lie outside the area of use of {projection['ALIAS']}. Check that the selected projection matches the survey.")
+
+    def variogram_summary(self, fit):
+        st.caption(f"Variogram: {fit.model.title()} model, cross-validated RMSE {fit.rmse:.3f} m.")
+        with st.expander("Variogram fit"):
+            scores = pd.DataFrame({
+                "Model": [m.title() for m in fit.scores],
+                "CV RMSE (m)": list(fit.scores.values()),
+                "Parameters": [", ".join(f"{p:.4g}" for p in fit.fitted[m]) for m in fit.scores],
+            })
+            st.dataframe(scores, hide_index=True)
+            st.caption("Linear: slope, nugget. Others: partial sill, range, nugget. Scored by 5-fold moving-window kriging on a subsample of the soundings.")
+
+    def export_rasters(self, parse: SurfaceParser, raster_data, projection: dict, survey: str, data: pd.DataFrame,
+                       options: ExportOptions) -> dict:
+        '''GeoTIFF per export projection, by file name: the survey raster warped block by block,
+        or the soundings moved into the projection and gridded again'''
+        source = projection["COMPLETE_CRS_CODE"]
+        if not options.targets:
+            return {f"surface_model_{projection['ALIAS']}.tif": raster_data}
+
+        rasters = {}
+        for target in options.targets:
+            code = target["COMPLETE_CRS_CODE"]
+            if same_crs(source, code):
+                rasters[f"surface_model_{target['ALIAS']}.tif"] = raster_data
+            elif options.reprojection == "raster":
+                rasters[f"surface_model_{target['ALIAS']}.tif"] = parse.reproject_memfile(raster_data, code, compress=options.compress)
+            else:
+                moved = SurfaceParser.reproject_soundings(data, source, code)
+                regrid = surface_model(f"{survey}|{code}", moved, options.resolution, options.method, options.neighbours,
+                                       SurfaceParser.search_radius(options.radius_m, target), options.variogram)
+                surface = SurfaceParser.mask_variance(regrid.z, regrid.variance, options.variance_threshold)
+                rasters[f"surface_model_{target['ALIAS']}.tif"] = parse.raster_to_bytes(
+                    surface, regrid.gridx, regrid.gridy, code, variance=regrid.variance, compress=options.compress)
+        return rasters
+
     
     def body(self):
         self.app_header()
@@ -947,42 +1082,70 @@ class Modeller(SingleProcessorAppWidgets):
             color_choose = SurfaceParser.choose_colorscale()
             limit_padding_percentage = SurfaceParser.padding_percentage()
             reso = SurfaceParser.resolution_slider()
+            method = SurfaceParser.choose_interpolator()
+            variogram = SurfaceParser.choose_variogram()
+            thin_cell_m, thin_aggregate, thin_outliers = SurfaceParser.thinning_options()
+            neighbours, radius_m = SurfaceParser.kriging_neighbourhood()
             contour_interval = SurfaceParser.contour_interval()
+            variance_threshold = SurfaceParser.variance_mask()
+            compress = SurfaceParser.choose_export()
+            export_projections, reprojection = SurfaceParser.choose_export_projections()
 
             submit = st.form_submit_button("Generate Surface Model", help="Generate a surface model based on the uploaded data.")
             if submit:
-                if dataset:
-                    data = [self.load_df(d, parse) for d in dataset] 
-                    cleaned_data = [d.drop(columns=['ident']) for d in data] #removes the ident column because it will complicate the merge
-                    merged_df = pd.concat(cleaned_data, ignore_index=True)
-                    
-                    #list of dataframes or survey meshes
+                surveyed = self.read_survey(dataset, projections)
+                if surveyed:
+                    survey, merged_df, cleaning = surveyed
+                    self.cleaning_summary(cleaning, projections)
+                    if thin_cell_m:
+                        thin_cell = SurfaceParser.thinning_cell(thin_cell_m, projections,
+                                                                (merged_df['Latitude'].min() + merged_df['Latitude'].max()) / 2)
+                        merged_df, thinned = parse.thin_soundings(merged_df, thin_cell, thin_aggregate, thin_outliers)
+                        survey = f"{survey}|thin={thin_cell}|{thin_aggregate}|{thin_outliers}"
+                        st.caption(f"Thinned to {len(merged_df):,} soundings: {thinned.removed:,} removed, "
+                                   f"{thinned.outliers:,} of them rejected as outliers.")
+
+                    #interpolation is memoized, so a resubmit with only display changes just redraws
                     with st.spinner('Processing data...'):
                         # try:
                         fig = go.Figure()
-                        x,y,interpolated = parse.interpolate_data(merged_df, reso)
-                        raster_data = parse.raster_to_bytes(interpolated,x,y,projections["COMPLETE_CRS_CODE"])
+                        radius = SurfaceParser.search_radius(radius_m, projections)
+                        tiles = st.progress(0.0, text="Interpolating...")
+                        model = surface_model(survey, merged_df, reso, method, neighbours, radius, variogram,
+                                              progress=lambda done, total: tiles.progress(done / total, text=f"Interpolated tile {done} of {total}"))
+                        tiles.empty()
+                        #the variance mask is a display setting too, applied to the cached surface
+                        surface = SurfaceParser.mask_variance(model.z, model.variance, variance_threshold)
+                        raster_data = parse.raster_to_bytes(surface, model.gridx, model.gridy, projections["COMPLETE_CRS_CODE"],
+                                                            variance=model.variance, compress=compress)
                         if raster_data:
-                            parse.surface_fig(x, y, interpolated, fig, colorscale=color_choose, limit_padding=limit_padding_percentage, contour_interval=contour_interval)    
+                            parse.surface_fig(model.gridx, model.gridy, surface, fig, colorscale=color_choose, limit_padding=limit_padding_percentage, contour_interval=contour_interval)    
                         st.plotly_chart(fig, theme="streamlit", use_container_width=True, key="surface_plot")
-                        parse.temp_save(rdata=raster_data)
+                        if method == "kriging":
+                            self.variogram_summary(model.variogram)
+                        if surface is not model.z:
+                            hidden = int(np.count_nonzero(np.isnan(surface) & ~np.isnan(model.z)))
+                            st.caption(f"{hidden:,} of {surface.size:,} cells hidden with kriging variance above {variance_threshold:g} m².")
+                        export = ExportOptions(export_projections, reprojection, compress, reso, method, neighbours,
+                                               radius_m, variogram, variance_threshold)
+                        parse.temp_save(rdata=self.export_rasters(parse, raster_data, projections, survey, merged_df, export))
 
                         # except Exception as e:
                         #     st.error(f"An error occurred while processing the data: {e}")
                         #     return
-                else:
-                    st.error("No dataset uploaded. Please upload a valid dataset.")
 
         if st.session_state['raster_data_cache']:
             with st.container(border=True):
                 st.subheader("Download Raster Data", divider=True)
-                st.caption("You can download the previous raster data generated from the surface model. This is useful for further analysis or visualization in GIS software.")
-                download_raster = st.download_button(
-                    label="Download Raster Data",
-                    data=st.session_state["raster_data_cache"],
-                    file_name="surface_model.tif",
-                    mime="image/tiff"
-                )
-                if download_raster:
-                    st.success("Raster data downloaded successfully!")
+                st.caption("You can download the previous raster data generated from the surface model. This is useful for further analysis or visualization in GIS software. Kriged surfaces carry the kriging variance as a second band.")
+                for file_name, raster in st.session_state["raster_data_cache"].items():
+                    download_raster = st.download_button(
+                        label=f"Download {file_name}",
+                        data=raster,
+                        file_name=file_name,
+                        mime="image/tiff",
+                        key=f"download_{file_name}"
+                    )
+                    if download_raster:
+                        st.success("Raster data downloaded successfully!")
             
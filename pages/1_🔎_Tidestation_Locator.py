@@ -1,4 +1,5 @@
 import streamlit as st
+from local_classes.profiling import run_page
 from local_classes.variables import Lists
 from page_design import TideStationLocator
 
@@ -10,4 +11,4 @@ def main():
     st.caption("Developed and designed by: _:blue[JunnieBoy13]_ ")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_page(main)
\ No newline at end of file
@@ -5,6 +5,7 @@ import folium
 import geopandas as gpd
 import glob, os
 from streamlit_folium import st_folium
+from local_classes.profiling import run_page, instrument
 #create Enum classes
 class Places(Enum):
     PLACES = {
@@ -63,6 +64,7 @@ class Places(Enum):
 }
     
 
+@instrument
 class StormChase:
     def __init__(self) -> None:
         self.df = glob.glob(os.path.join("resources","geospatial","typ_1980_2024_r3.csv"))
@@ -74,6 +76,7 @@ class StormChase:
         return "Dataset from Storm tracks"
 
 
+@instrument
 class Body(StormChase):
     def __init__(self) -> None:
         super().__init__()
@@ -158,7 +161,8 @@ class Body(StormChase):
                     stormNames+=f"- _:blue[{i} {j}]_\n"
                 st.markdown(stormNames)
 
-            folium.GeoJson(data=filtered_tracks.to_json(),
+            #only the popup fields are embedded, the tracks carry some 180 attributes
+            folium.GeoJson(data=filtered_tracks[["NAME", "NATURE", "SID", "geometry"]].to_json(),
                         name='Storm Tracks', 
                         style_function=lambda x: {"color": "red", "weight": 1.2, "dashArray": "3, 2"},
                         popup=folium.GeoJsonPopup(
@@ -189,5 +193,4 @@ class Body(StormChase):
                 st_folium(m, use_container_width=True, height=600)
 
 if __name__ == "__main__":
-    a = Body()
-    a.body()
\ No newline at end of file
+    run_page(lambda: Body().body())
\ No newline at end of file
@@ -0,0 +1,58 @@
+'''Coordinate reprojection shared by the Surface Modeller and scripts.
+
+pyproj Transformers are expensive to build (they resolve the datum grids and
+the pipeline between the two CRSs), so one is kept per (source, target) pair
+and reused for every sounding of every rerun.
+'''
+import functools
+import numpy as np
+from pyproj import CRS, Transformer
+from rasterio.windows import Window
+
+# rows and columns of a raster warped at a time
+REPROJECT_BLOCK = 512
+
+
+@functools.lru_cache(maxsize=32)
+def transformer(src: str, dst: str) -> Transformer:
+    '''Transformer between two CRSs, built once per pair; coordinates are always (x/lon, y/lat)'''
+    return Transformer.from_crs(CRS.from_user_input(src), CRS.from_user_input(dst), always_xy=True)
+
+
+def same_crs(src: str, dst: str) -> bool:
+    return src == dst or CRS.from_user_input(src) == CRS.from_user_input(dst)
+
+
+@functools.lru_cache(maxsize=32)
+def crs_bounds(crs: str) -> tuple:
+    '''Area of use of a CRS in its own coordinates, (minx, miny, maxx, maxy)'''
+    area = CRS.from_user_input(crs).area_of_use
+    if area is None:
+        return (-np.inf, -np.inf, np.inf, np.inf)
+    return transformer("EPSG:4326", crs).transform_bounds(area.west, area.south, area.east, area.north)
+
+
+def degree_lengths(crs: str, latitude: float) -> tuple:
+    '''Metres per degree of longitude and of latitude at a latitude, on the ellipsoid of a geographic CRS'''
+    ellipsoid = CRS.from_user_input(crs).ellipsoid
+    a = ellipsoid.semi_major_metre
+    e2 = 1 - (ellipsoid.semi_minor_metre / a) ** 2
+    phi = np.radians(latitude)
+    w = 1 - e2 * np.sin(phi) ** 2
+    #radius of the parallel and of the meridian at phi, over one degree of arc
+    return float(np.radians(a * np.cos(phi) / np.sqrt(w))), float(np.radians(a * (1 - e2) / w ** 1.5))
+
+
+def transform_points(x, y, src: str, dst: str):
+    '''Vectorized reprojection of coordinate arrays'''
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if same_crs(src, dst):
+        return x, y
+    return transformer(src, dst).transform(x, y)
+
+
+def block_windows(height: int, width: int, block: int = REPROJECT_BLOCK):
+    '''Windows tiling a height x width raster in row-major order'''
+    for row in range(0, height, block):
+        for col in range(0, width, block):
+            yield Window(col, row, min(block, width - col), min(block, height - row))
@@ -0,0 +1,214 @@
+'''Nearest tide station search over the NAMRIA primary and secondary station lists.
+
+Stations are indexed once as unit vectors on the sphere in a KD-tree, where the
+straight-line (chord) distance grows with the great-circle distance, so the
+k nearest are found for many points in one vectorized query. The candidates
+are then measured exactly on the WGS84 ellipsoid with pyproj's Geod.inv, the
+same geodesic geopy computes.
+'''
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from pyproj import Geod
+from scipy.spatial import cKDTree
+
+from local_classes.cache import content_hash, cache_dir, LRUCache
+
+GEOD = Geod(ellps="WGS84")
+# extra sphere candidates refined on the ellipsoid, so near-ties are ranked by the exact distance
+REFINE_MARGIN = 4
+PRIMARY_PREFIX, SECONDARY_PREFIX = "(PS)", "(SS)"
+STATION_TYPES = {PRIMARY_PREFIX: "Primary", SECONDARY_PREFIX: "Secondary"}
+# points measured per vectorized query in a bulk assignment, bounds the (chunk, k) geodesic arrays
+ASSIGN_CHUNK = 8192
+PLACE_COLUMNS = ["Place", "Province", "PCODE", "Lat", "Long"]
+# bumped when the layout of the persisted ADM3 matrix changes
+MATRIX_VERSION = 1
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    '''(n, 3) unit vectors of geographic coordinates in degrees'''
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def geodesic_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    '''Element-wise WGS84 geodesic distance in km between broadcastable coordinate arrays'''
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64) for a in (lat1, lon1, lat2, lon2)))
+    _, _, meters = GEOD.inv(lon1.ravel(), lat1.ravel(), lon2.ravel(), lat2.ravel())
+    return (np.asarray(meters) / 1000.0).reshape(lat1.shape)
+
+
+class StationIndex:
+    '''KD-tree of station positions answering k-nearest queries for arrays of points'''
+
+    def __init__(self, labels, lat, lon):
+        self.labels = np.asarray(labels, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.tree = cKDTree(unit_vectors(self.lat, self.lon))
+
+    @classmethod
+    def from_frames(cls, primary: pd.DataFrame, secondary: pd.DataFrame) -> "StationIndex":
+        '''Index of the station CSVs, labelled "(PS) name" and "(SS) name" as the locator shows them'''
+        labels = ([f"{PRIMARY_PREFIX} {name}" for name in primary['tidestatio']]
+                  + [f"{SECONDARY_PREFIX} {name}" for name in secondary['namesecond']])
+        return cls(labels, np.concatenate([primary['Lat'].values, secondary['Lat'].values]),
+                   np.concatenate([primary['Long'].values, secondary['Long'].values]))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def query(self, lat, lon, k: int = 5, exact: bool = True):
+        '''Distances in km and station positions of the k nearest stations of every point,
+        both (n, k) and nearest first. `exact` ranks and measures on the WGS84 ellipsoid;
+        otherwise distances are great-circle on a sphere of the mean Earth radius.'''
+        lat, lon = np.atleast_1d(np.asarray(lat, dtype=np.float64)), np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        k = max(1, min(int(k), len(self)))
+        candidates = min(len(self), k + REFINE_MARGIN) if exact else k
+        chord, index = self.tree.query(unit_vectors(lat, lon), k=candidates)
+        chord, index = chord.reshape(len(lat), candidates), index.reshape(len(lat), candidates)
+
+        if not exact:
+            return 2 * 6371.0088 * np.arcsin(np.clip(chord / 2, 0, 1)), index
+
+        distance = geodesic_km(lat[:, None], lon[:, None], self.lat[index], self.lon[index])
+        order = np.argsort(distance, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distance, order, axis=1), np.take_along_axis(index, order, axis=1)
+
+    def nearest(self, point: tuple, k: int = 5) -> dict:
+        '''Nearest stations of one (lat, lon) point as {label: {"distance": km, "coords": [lat, lon]}}'''
+        distance, index = self.query([point[0]], [point[1]], k)
+        return {self.labels[i]: {"distance": float(d), "coords": [float(self.lat[i]), float(self.lon[i])]}
+                for d, i in zip(distance[0], index[0])}
+
+
+_INDEXES = LRUCache(max_entries=4)
+
+def station_index(primary: pd.DataFrame, secondary: pd.DataFrame) -> StationIndex:
+    '''Index of the station lists, built once per distinct content'''
+    key = content_hash(*(np.ascontiguousarray(frame[column].values, dtype=np.float64)
+                         for frame in (primary, secondary) for column in ('Lat', 'Long')),
+                       "\x1f".join(map(str, primary['tidestatio'])).encode(),
+                       "\x1f".join(map(str, secondary['namesecond'])).encode())
+    index = _INDEXES.get(key)
+    if index is None:
+        index = _INDEXES.put(key, StationIndex.from_frames(primary, secondary))
+    return index
+
+
+def assign_stations(index: StationIndex, places: pd.DataFrame, k: int = 5, chunk: int = ASSIGN_CHUNK) -> pd.DataFrame:
+    '''Ranked k nearest stations of every place (Lat/Long columns), one row per place and rank'''
+    lat, lon = places['Lat'].to_numpy(dtype=np.float64), places['Long'].to_numpy(dtype=np.float64)
+    distance, station = [], []
+    for start in range(0, len(places), chunk):
+        d, i = index.query(lat[start:start + chunk], lon[start:start + chunk], k)
+        distance.append(d)
+        station.append(i)
+
+    k = distance[0].shape[1] if distance else max(1, min(int(k), len(index)))
+    distance = np.concatenate(distance).ravel() if distance else np.empty(0)
+    station = np.concatenate(station).ravel() if station else np.empty(0, dtype=np.intp)
+
+    prefix, name = zip(*(label.split(" ", 1) for label in index.labels)) if len(index) else ((), ())
+    table = places.loc[places.index.repeat(k)].reset_index(drop=True)
+    table["Rank"] = np.tile(np.arange(1, k + 1), len(places))
+    table["Station"] = np.asarray(name, dtype=object)[station]
+    table["Type"] = np.asarray([STATION_TYPES.get(p, "") for p in prefix], dtype=object)[station]
+    table["Distance_km"] = distance
+    table["Station_Lat"], table["Station_Long"] = index.lat[station], index.lon[station]
+    return table
+
+
+def assign_by_type(primary: pd.DataFrame, secondary: pd.DataFrame, places: pd.DataFrame, k: int = 5,
+                   per_type: bool = False) -> pd.DataFrame:
+    '''Bulk assignment over both station lists, or the k nearest of each list ranked separately'''
+    if not per_type:
+        return assign_stations(station_index(primary, secondary), places, k)
+    tables = [assign_stations(station_index(primary, secondary.iloc[:0]), places, k),
+              assign_stations(station_index(primary.iloc[:0], secondary), places, k)]
+    #interleave back to place order: primaries then secondaries of each place
+    order = np.concatenate([np.repeat(np.arange(len(places)), len(table) // max(len(places), 1)) for table in tables])
+    return pd.concat(tables, ignore_index=True).iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+
+
+def adm3_places(geospatial: str) -> pd.DataFrame:
+    '''ADM3 (city/municipality) centroids of the NAMRIA boundaries'''
+    places = pd.read_csv(os.path.join(geospatial, "adm3_places.csv"))
+    return places.rename(columns={"ADM3_EN": "Place", "ADM2_EN": "Province", "ADM3_PCODE": "PCODE"})[PLACE_COLUMNS]
+
+
+def coastal_places(geospatial: str) -> pd.DataFrame:
+    '''Coastal features of coastal_brgy, located by the interior point of their geometry.
+    Raises FileNotFoundError when the geometry (.shp) is missing: its attributes alone would
+    only place each feature at its municipality centroid.'''
+    import geopandas as gpd
+
+    path = os.path.join(geospatial, "shapefiles", "coastal_brgy", "coastal_brgy.shp")
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    coastal = gpd.read_file(path).to_crs("EPSG:4326")
+    points = coastal.geometry.representative_point()
+    coastal = pd.DataFrame(coastal.drop(columns="geometry")).assign(Lat=points.y.values, Long=points.x.values)
+
+    name = "ADM4_EN" if "ADM4_EN" in coastal else "ADM3_EN"
+    pcode = "ADM4_PCODE" if "ADM4_PCODE" in coastal else "ADM3_PCODE"
+    coastal = coastal.rename(columns={name: "Place", "ADM2_EN": "Province", pcode: "PCODE"})
+    return coastal[PLACE_COLUMNS].reset_index(drop=True)
+
+
+class PlaceMatrix:
+    '''Distances from every row of adm3_places.csv to every station, sorted nearest first,
+    so the ranking of a municipality is a row slice instead of a search'''
+
+    def __init__(self, index: StationIndex, distance: np.ndarray, order: np.ndarray):
+        self.index = index
+        self.distance = distance
+        self.order = order
+
+    @classmethod
+    def build(cls, index: StationIndex, lat, lon) -> "PlaceMatrix":
+        distance, order = index.query(lat, lon, k=len(index))
+        return cls(index, distance, order.astype(np.int32))
+
+    def nearest(self, row: int, k: int = 5) -> dict:
+        '''Same result as StationIndex.nearest for the centroid in position `row`'''
+        k = max(1, min(int(k), self.order.shape[1]))
+        index = self.index
+        return {index.labels[i]: {"distance": float(d), "coords": [float(index.lat[i]), float(index.lon[i])]}
+                for d, i in zip(self.distance[row, :k], self.order[row, :k])}
+
+
+_MATRICES = LRUCache(max_entries=2)
+
+def adm3_matrix(geospatial: str) -> PlaceMatrix:
+    '''ADM3 x station matrix, loaded from the on-disk cache or built and saved on first use.
+    The file is named by a hash of the place and station CSVs, so editing any of them rebuilds it.'''
+    paths = [os.path.join(geospatial, name) for name in ("adm3_places.csv", "primary_stations.csv", "secondary_stations.csv")]
+    contents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    key = content_hash(*contents, str(MATRIX_VERSION).encode())
+    matrix = _MATRICES.get(key)
+    if matrix is not None:
+        return matrix
+
+    places, primary, secondary = (pd.read_csv(path) for path in paths)
+    index = station_index(primary, secondary)
+    path = os.path.join(cache_dir("stations"), f"adm3-{key}.npz")
+    try:
+        with np.load(path) as stored:
+            matrix = PlaceMatrix(index, stored["distance"], stored["order"])
+        if matrix.order.shape != (len(places), len(index)):
+            raise ValueError("stale matrix")
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        matrix = PlaceMatrix.build(index, places['Lat'].values, places['Long'].values)
+        #write then rename, so concurrent sessions never read a partial file
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "wb") as f:
+            np.savez(f, distance=matrix.distance, order=matrix.order)
+        os.replace(partial, path)
+    return _MATRICES.put(key, matrix)
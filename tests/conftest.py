@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def fixture_bytes():
+    '''Reads a file from tests/fixtures as bytes'''
+    def read(name: str) -> bytes:
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            return f.read()
+    return read
@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from appcore import ElevationParser, WindroseParser
+from benchmarks import synthetic
+from benchmarks.run import compare, measure
+
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {"results": {"a": {"median_s": 1.0, "peak_mib": 10.0}, "b": {"median_s": 1.0, "peak_mib": 10.0}}}
+    results = {"a": {"median_s": 1.1, "peak_mib": 10.0}, "b": {"median_s": 1.3, "peak_mib": 20.0},
+               "new": {"median_s": 5.0, "peak_mib": 1.0}}
+    table = compare(results, baseline, threshold=0.15)
+    assert table["regression"].to_dict() == {"a": False, "b": True, "new": False}
+    assert table.loc["b", "mem_change"] == 1.0 and np.isnan(table.loc["new", "time_change"])
+
+
+def test_measure_stops_at_the_budget():
+    calls = []
+    timing = measure(lambda: calls.append(1), repeat=1000, budget=0.0)
+    #warm-up, one timed call, one traced call
+    assert timing["repeats"] == 1 and len(calls) == 3
+    assert timing["min_s"] <= timing["median_s"]
+
+
+def test_synthetic_namria_file_parses_to_every_hour():
+    series = ElevationParser().parse_data_linestring(synthetic.namria_text(1, missing=0)).consolidate().to_series()
+    assert len(series) == 365 * 24 and series.notna().all()
+    assert series.index[0] == pd.Timestamp("2000-01-01") and series.index.to_series().diff().iloc[1:].eq(pd.Timedelta("1h")).all()
+
+
+def test_compass_lookup_matches_the_per_value_one():
+    def deg_to_compass(degree):
+        #the lookup WindroseProcessor applied row by row
+        directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                      'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+        return directions[int((degree % 360) / 22.5 + 0.5) % 16] if not pd.isna(degree) else np.nan
+
+    degrees = pd.Series(np.r_[np.arange(0, 721, 0.25), np.nan, 11.25, 348.75, 359.99])
+    pd.testing.assert_series_equal(WindroseParser.deg_to_compass(degrees), degrees.apply(deg_to_compass))
+
+
+def test_synthetic_wind_csv_reads_back():
+    raw = pd.read_csv(io.BytesIO(synthetic.wind_csv(rows=60)))
+    wind = WindroseParser().read_wind_csv(io.BytesIO(synthetic.wind_csv(rows=60)))
+    assert len(wind) == 60
+    assert wind["WindSpeed"].isna().sum() == (raw["WIND_SPEED"] == -999).sum()
+    assert wind["WindDirectionDesc"].isna().equals(wind["WindDirection"].isna())
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+import tidehunter
+from stations import coastal_places
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_imports_without_streamlit():
+    code = ("import sys, tidehunter; "
+            "print(sorted(m for m in ('streamlit', 'plotly', 'rasterio', 'pykrige', 'appcore', "
+            "'local_classes.variables') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_process_writes_station_reports(tmp_path, fixture_bytes):
+    source = tmp_path / "in"
+    source.mkdir()
+    (source / "a.lev").write_bytes(fixture_bytes("namria_2015.txt"))
+    (source / "b.lev").write_bytes(fixture_bytes("namria_edge.txt"))
+
+    assert tidehunter.main(["process", str(source), "-o", str(tmp_path / "out"), "--workers", "1"]) == 0
+
+    summary = pd.read_csv(tmp_path / "out" / "summary.csv")
+    assert list(summary["Station"]) == ["MN"]
+    assert (tmp_path / "out" / "MN" / "report.txt").exists()
+    assert (tmp_path / "out" / "MN" / "overlaps.csv").exists()
+
+
+def test_coastal_places_need_their_geometry(tmp_path, capsys, monkeypatch):
+    #attributes alone would place every coastal feature at its municipality centroid, so the source is skipped
+    monkeypatch.setitem(tidehunter.PLACE_SOURCES, "coastal", lambda geospatial: coastal_places(str(tmp_path)))
+    assert tidehunter.main(["stations", "-o", str(tmp_path / "out"), "-k", "2"]) == 0
+    assert "coastal: skipped" in capsys.readouterr().err
+    assert sorted(os.listdir(tmp_path / "out")) == ["stations_adm3.csv"]
+
+
+def test_tiles_report_when_no_source_is_present(tmp_path, capsys, monkeypatch):
+    import vectortiles
+    monkeypatch.setattr(vectortiles, "SHAPEFILES", str(tmp_path))
+    assert tidehunter.main(["tiles", "--static-dir", str(tmp_path / "static")]) == 1
+    err = capsys.readouterr().err
+    assert "No tile sources are present" in err and "r3_road_diss.shp" in err
+    assert not (tmp_path / "static").exists()
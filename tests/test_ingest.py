@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+
+import namria
+from namria import ParseCache, parse_many, shutdown_ingest_pool
+
+
+@pytest.fixture
+def payloads(fixture_bytes):
+    return [("a.lev", fixture_bytes("namria_2015.txt")), ("b.lev", fixture_bytes("namria_edge.txt"))]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(namria, "PARSE_CACHE", ParseCache(spill=False))
+
+
+def test_parallel_ingest_matches_inline(payloads, monkeypatch):
+    inline = parse_many(payloads, parallel=False)
+
+    monkeypatch.setattr(namria, "PARSE_CACHE", ParseCache(spill=False))
+    monkeypatch.setattr(namria, "PARALLEL_INGEST_MIN_BYTES", 0)
+    monkeypatch.setattr(namria, "_ingest_workers", lambda: 2)
+    try:
+        parallel = parse_many(payloads)
+        assert namria._INGEST_POOL is not None
+        assert namria._INGEST_POOL._mp_context.get_start_method() == "spawn"
+    finally:
+        shutdown_ingest_pool()
+    assert namria._INGEST_POOL is None
+
+    np.testing.assert_array_equal(parallel.readings.readings, inline.readings.readings)
+    assert parallel.readings.dates.equals(inline.readings.dates)
+    assert parallel.overlaps.equals(inline.overlaps)
+
+
+def test_small_batches_parse_inline(payloads, monkeypatch):
+    monkeypatch.setattr(namria, "_ingest_workers", lambda: 2)
+    parse_many(payloads)
+    assert namria._INGEST_POOL is None
+
+
+def test_repeated_dates_are_reported(payloads):
+    ingest = parse_many(payloads)
+    assert list(ingest.files["Duplicate Days"]) == [0, 3]
+    assert len(ingest.overlaps) == 4
+    assert (ingest.overlaps["Files"] == "a.lev, b.lev").all()
+    assert ingest.files["Cached"].tolist() == [False, False]
+    assert parse_many(payloads).files["Cached"].tolist() == [True, True]
+
+
+def test_upload_views_are_released(payloads):
+    from appcore import ElevationParser
+
+    uploads = []
+    for name, data in payloads:
+        upload = io.BytesIO(data)
+        upload.name = name
+        uploads.append(upload)
+
+    ingest = ElevationParser().parse_uploads(uploads)
+
+    assert len(ingest.files) == 2
+    for upload in uploads:
+        #raises BufferError while a getbuffer() view is alive
+        upload.truncate(0)
+        upload.close()
@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+from pykrige.ok import OrdinaryKriging
+
+import interpolation
+from benchmarks.synthetic import bathymetry_points
+from interpolation import (local_kriging, krige_grid, interpolate_grid, shutdown_tile_pool, pykrige_parameters,
+                           fit_model, fit_variogram, select_variogram, EmpiricalVariogram, AUTO_MODELS,
+                           _krige_nodes, VARIOGRAM_FUNCTIONS)
+
+
+@pytest.fixture
+def survey():
+    '''(x, y, z, gridx, gridy) of a small synthetic survey'''
+    points = bathymetry_points(60, seed=3)
+    x, y, z = points["Longitude"].values, points["Latitude"].values, points["depth"].values
+    return x, y, z, np.linspace(x.min(), x.max(), 15), np.linspace(y.min(), y.max(), 12)
+
+
+@pytest.mark.parametrize("model,params", [
+    ("linear", [50.0, 0.1]),
+    ("spherical", [8.0, 0.3, 0.5]),
+    ("exponential", [8.0, 0.2, 0.1]),
+    ("gaussian", [8.0, 0.2, 0.1]),
+])
+def test_window_over_every_point_matches_pykrige(model, params, survey):
+    x, y, z, gridx, gridy = survey
+    ok = OrdinaryKriging(x, y, z, variogram_model=model, variogram_parameters=pykrige_parameters(model, params))
+    expected, variance = ok.execute("grid", gridx, gridy)
+
+    z_grid, ss_grid = local_kriging(x, y, z, gridx, gridy, neighbours=len(z), model=model, params=params)
+
+    np.testing.assert_allclose(z_grid, expected, atol=1e-8)
+    np.testing.assert_allclose(ss_grid, variance, atol=1e-8)
+
+
+def test_small_batches_match_one_batch(survey):
+    x, y, z, gridx, gridy = survey
+    gamma = lambda d: VARIOGRAM_FUNCTIONS["linear"]([50.0, 0.1], d)
+    points = np.column_stack([x, y])
+    nodes = np.column_stack([g.ravel() for g in np.meshgrid(gridx, gridy)])
+
+    whole = _krige_nodes(points, z, nodes, 16, None, gamma)
+    batched = _krige_nodes(points, z, nodes, 16, None, gamma, batch_bytes=5 * 8 * 17 ** 2 * 7)
+    np.testing.assert_allclose(batched[0], whole[0])
+    np.testing.assert_allclose(batched[1], whole[1])
+
+
+def test_nodes_out_of_radius_are_blank(survey):
+    x, y, z, _, _ = survey
+    far = np.array([x.max() + 1.0]), np.array([y.max() + 1.0])
+    z_grid, ss_grid = local_kriging(x, y, z, *far, neighbours=8, radius=0.05, params=[50.0, 0.1])
+    assert np.isnan(z_grid).all() and np.isnan(ss_grid).all()
+
+
+def test_node_on_a_sounding_returns_its_depth(survey):
+    x, y, z, _, _ = survey
+    points = np.column_stack([x, y])
+    gamma = lambda d: VARIOGRAM_FUNCTIONS["linear"]([50.0, 0.0], d)
+    z_node, ss_node = _krige_nodes(points, z, points[4:5], 8, None, gamma)
+    assert z_node[0] == pytest.approx(z[4])
+    assert ss_node[0] == pytest.approx(0.0, abs=1e-8)
+
+
+def test_pooled_tiles_match_inline(survey, monkeypatch):
+    x, y, z, _, _ = survey
+    gridx, gridy = np.linspace(x.min(), x.max(), 40), np.linspace(y.min(), y.max(), 30)
+    inline, _ = interpolate_grid("idw", x, y, z, gridx, gridy, tile_size=16, workers=1, neighbours=8)
+
+    monkeypatch.setattr(interpolation, "PARALLEL_MIN_NODES", 0)
+    try:
+        pooled, _ = interpolate_grid("idw", x, y, z, gridx, gridy, tile_size=16, workers=2, neighbours=8)
+        assert interpolation._TILE_POOL._mp_context.get_start_method() == "spawn"
+    finally:
+        shutdown_tile_pool()
+    assert interpolation._TILE_POOL is None
+    np.testing.assert_array_equal(pooled, inline)
+
+
+def test_small_grids_run_inline(survey):
+    x, y, z, gridx, gridy = survey
+    interpolate_grid("idw", x, y, z, gridx, gridy, tile_size=4, workers=2, neighbours=8)
+    assert interpolation._TILE_POOL is None
+
+
+@pytest.mark.parametrize("method,options", [
+    ("idw", {}),
+    ("idw", {"radius": 0.03}),
+    ("rbf", {}),
+    ("rbf", {"radius": 0.03}),
+    ("rbf", {"neighbours": 8, "radius": 0.01}),
+    ("kriging", {"neighbours": 16, "radius": 0.03, "params": [50.0, 0.1]}),
+])
+def test_tiled_grid_matches_untiled(method, options):
+    points = bathymetry_points(300, seed=5)
+    x, y, z = points["Longitude"].values, points["Latitude"].values, points["depth"].values
+    gridx, gridy = np.linspace(x.min(), x.max(), 40), np.linspace(y.min(), y.max(), 30)
+
+    untiled, untiled_ss = interpolate_grid(method, x, y, z, gridx, gridy, tile_size=40, workers=1, **options)
+    tiled, tiled_ss = interpolate_grid(method, x, y, z, gridx, gridy, tile_size=7, workers=1, **options)
+
+    assert np.isfinite(untiled).any()
+    np.testing.assert_allclose(tiled, untiled, rtol=1e-9, atol=1e-9, equal_nan=True)
+    if untiled_ss is not None:
+        np.testing.assert_allclose(tiled_ss, untiled_ss, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_tiles_get_only_their_neighbourhood(monkeypatch):
+    points = bathymetry_points(300, seed=5)
+    x, y, z = points["Longitude"].values, points["Latitude"].values, points["depth"].values
+    gridx, gridy = np.linspace(x.min(), x.max(), 40), np.linspace(y.min(), y.max(), 30)
+    sizes = []
+    real_worker = interpolation._tile_worker
+    monkeypatch.setattr(interpolation, "_tile_worker", lambda job: sizes.append(len(job[5])) or real_worker(job))
+
+    interpolate_grid("idw", x, y, z, gridx, gridy, tile_size=8, workers=1)
+    assert max(sizes) < len(z)
+
+
+def test_rbf_with_too_few_soundings_is_blank():
+    z_grid, _ = interpolation.rbf_grid(np.array([0.0, 1.0]), np.array([0.0, 1.0]), np.array([1.0, 2.0]),
+                                       np.linspace(0, 1, 3), np.linspace(0, 1, 3))
+    assert np.isnan(z_grid).all()
+
+
+@pytest.mark.parametrize("model,params", [
+    ("linear", [30.0, 0.5]),
+    ("spherical", [20.0, 0.25, 1.0]),
+    ("exponential", [20.0, 0.1, 1.0]),
+    ("gaussian", [20.0, 0.15, 0.5]),
+])
+def test_fit_recovers_a_known_variogram(model, params):
+    lags = np.linspace(0.02, 0.4, 6)
+    empirical = EmpiricalVariogram(lags, VARIOGRAM_FUNCTIONS[model](params, lags), np.ones(6, dtype=np.int64))
+    np.testing.assert_allclose(fit_model(empirical, model), params, rtol=1e-6, atol=1e-8)
+
+
+@pytest.mark.parametrize("model", AUTO_MODELS)
+def test_fit_matches_pykrige(model):
+    points = bathymetry_points(300, seed=3)
+    x, y, z = points["Longitude"].values, points["Latitude"].values, points["depth"].values
+    expected = OrdinaryKriging(x, y, z, variogram_model=model).variogram_model_parameters
+    np.testing.assert_allclose(fit_variogram(x, y, z, model), expected, rtol=1e-4, atol=1e-8)
+
+
+def test_selection_keeps_the_best_scored_fit(survey):
+    x, y, z, _, _ = survey
+    fit = select_variogram(x, y, z, AUTO_MODELS)
+
+    assert fit.model == min(AUTO_MODELS, key=lambda m: fit.scores[m])
+    assert fit.params == fit.fitted[fit.model]
+    for model in AUTO_MODELS:
+        assert fit.fitted[model] == fit_model(fit.empirical, model)
+
+
+def test_cached_selection_returns_the_same_fit(survey, monkeypatch):
+    x, y, z, _, _ = survey
+    monkeypatch.setattr(interpolation, "_VARIOGRAM_CACHE", interpolation.LRUCache(max_entries=4))
+    first = select_variogram(x, y, z)
+
+    def no_refit(*args, **kwargs):
+        raise AssertionError("the cached fit was recomputed")
+    monkeypatch.setattr(interpolation, "fit_model", no_refit)
+    again = select_variogram(x.copy(), y.copy(), z.copy())
+
+    assert again is first
+    with pytest.raises(AssertionError):
+        select_variogram(x, y, z + 1.0)
+
+
+@pytest.mark.parametrize("model,params", [("linear", [50.0, 0.1]), ("spherical", [8.0, 0.3, 0.5]),
+                                          ("power", [30.0, 1.2, 0.1])])
+def test_global_kriging_uses_the_fitted_parameters(model, params, survey):
+    x, y, z, gridx, gridy = survey
+    z_global, ss_global = krige_grid(x, y, z, gridx, gridy, neighbours=0, model=model, params=params)
+    z_local, ss_local = local_kriging(x, y, z, gridx, gridy, neighbours=len(z), model=model, params=params)
+    np.testing.assert_allclose(z_global, z_local, atol=1e-8)
+    np.testing.assert_allclose(ss_global, ss_local, atol=1e-8)
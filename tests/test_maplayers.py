@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+import shapely
+import geopandas as gpd
+
+from maplayers import map_layer, simplify, layer_zoom, level_of_detail, LAYER_ZOOMS
+import maplayers
+
+
+def wiggly_coverage(cells: int = 4, steps: int = 200):
+    '''A row of squares whose shared edges are densely sampled sine waves'''
+    y = np.linspace(0, 1, steps)
+    edges = [np.column_stack([x + 0.002 * np.sin(40 * y), y]) for x in range(cells + 1)]
+    return gpd.GeoSeries([shapely.Polygon(np.vstack([edges[i], edges[i + 1][::-1]])) for i in range(cells)], crs="EPSG:4326")
+
+
+def test_layer_zoom_serves_the_first_level_at_or_above():
+    assert layer_zoom(None) == maplayers.DEFAULT_ZOOM
+    assert layer_zoom(7) == 8 and layer_zoom(8) == 8 and layer_zoom(3) == LAYER_ZOOMS[0]
+    assert layer_zoom(18) == LAYER_ZOOMS[-1]
+
+
+def test_coverage_simplification_keeps_shared_borders():
+    coverage = wiggly_coverage()
+    simplified = simplify(coverage, level_of_detail(8)[0])
+    assert shapely.coverage_is_valid(simplified.values)
+    assert shapely.get_num_coordinates(simplified.values).sum() < shapely.get_num_coordinates(coverage.values).sum()
+    assert simplified.union_all().area == pytest.approx(coverage.union_all().area, rel=1e-3)
+
+
+def test_map_layer_is_built_once_per_level(tmp_path, monkeypatch):
+    monkeypatch.setenv("TIDEHUNTER_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(maplayers, "_LAYERS", maplayers.LRUCache(max_entries=8))
+    path = str(tmp_path / "cells.shp")
+    gpd.GeoDataFrame({"name": ["a", "b", "c", "d"]}, geometry=wiggly_coverage()).to_file(path)
+
+    builds = []
+    build_layer = maplayers.build_layer
+    monkeypatch.setattr(maplayers, "build_layer", lambda *args: builds.append(args) or build_layer(*args))
+    text = map_layer(path, zoom=7)
+    assert map_layer(path, zoom=8) == text and len(builds) == 1
+    #a new session reads the saved text
+    monkeypatch.setattr(maplayers, "_LAYERS", maplayers.LRUCache(max_entries=8))
+    assert map_layer(path, zoom=8) == text and len(builds) == 1
+    assert [f["properties"]["name"] for f in json.loads(text)["features"]] == ["a", "b", "c", "d"]
+
+
+def test_map_layer_needs_the_shp(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        map_layer(str(tmp_path / "missing.shp"))
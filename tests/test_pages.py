@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from local_classes.constants import RESOURCES
+
+PAGES = os.path.join(os.path.dirname(RESOURCES), "pages")
+
+
+def test_locator_ranks_a_municipality_outside_the_project_root(tmp_path, monkeypatch):
+    #streamlit run is often started outside the project folder
+    monkeypatch.chdir(tmp_path)
+    place = pd.read_csv(os.path.join(RESOURCES, "geospatial", "adm3_places.csv")).iloc[0]
+    app = AppTest.from_file(os.path.join(PAGES, "1_🔎_Tidestation_Locator.py"), default_timeout=60).run()
+    app.selectbox(key="city_muni").select(place["ADM3_EN"])
+    app.selectbox(key="province").select(place["ADM2_EN"])
+    next(button for button in app.run().button if button.label == "Fetch Nearest Station").click().run()
+
+    assert not app.exception and not app.error
+    ranked = [m.value for m in app.markdown if m.value.startswith("**Distance to")]
+    assert len(ranked) == 5
+
+
+def test_locator_disables_overlays_without_a_shapefile(monkeypatch):
+    import vectortiles
+    monkeypatch.setattr(vectortiles, "SHAPEFILES", os.path.join(RESOURCES, "missing"))
+    app = AppTest.from_file(os.path.join(PAGES, "1_🔎_Tidestation_Locator.py"), default_timeout=60).run()
+    assert app.checkbox(key="show_roads_checkbox").disabled and app.checkbox(key="show_boundaries_checkbox").disabled
+    assert any("r3_road_diss.shp" in caption.value for caption in app.caption)
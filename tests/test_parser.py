@@ -0,0 +1,119 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from appcore import ElevationParser, hourly_frame, _decode_digits, _decode_fixed_width, _decode_stream
+
+NAMRIA_FIXTURES = ["namria_2015.txt", "namria_edge.txt"]
+
+
+def legacy_parse(dataset: str) -> dict:
+    '''The line-by-line parser the vectorized decoder replaced'''
+    data_collection = {}
+    for line_values in dataset.strip().split("\n"):
+        line_values = line_values.rstrip()
+        readings = line_values[:72]
+        mtd = line_values[-8:]
+        readings = [readings[i:i+3].strip() for i in range(0, 72, 3)]
+        readings = np.array([int(r) if r.isdigit() else np.nan for r in readings])
+        station_id, month, day, year = [x.strip() for x in (mtd[:2], mtd[2:4], mtd[4:6], mtd[6:])]
+        data_collection[f"{month}-{day}-20{year}"] = {
+            "Station_ID": station_id,
+            **{f"Hour_{i}": readings[i] for i in range(24)}
+        }
+    return data_collection
+
+
+def legacy_frame(dataset: str) -> pd.DataFrame:
+    '''Hour x date frame the processors used to build from the legacy parser'''
+    df = pd.DataFrame.from_dict(legacy_parse(dataset))
+    df = df.iloc[1:].astype(np.float64).replace(999, np.nan)
+    df.columns = pd.to_datetime(df.columns, format='%d-%m-%Y')
+    return df
+
+
+@pytest.mark.parametrize("name", NAMRIA_FIXTURES)
+def test_decoder_matches_legacy_parser(name, fixture_bytes):
+    data = fixture_bytes(name)
+    expected = legacy_frame(data.decode("ascii")).sort_index(axis=1)
+    stations = pd.Series({date: record["Station_ID"] for date, record in legacy_parse(data.decode("ascii")).items()})
+    stations.index = pd.to_datetime(stations.index, format='%d-%m-%Y')
+
+    parsed = _decode_fixed_width(np.frombuffer(data, dtype=np.uint8)).consolidate()
+
+    assert list(parsed.dates) == list(expected.columns)
+    np.testing.assert_array_equal(parsed.readings, expected.T.to_numpy(np.float32))
+    assert list(parsed.stations) == list(stations.sort_index().values)
+
+
+def test_fixtures_cover_gaps_short_lines_and_repeats(fixture_bytes):
+    edge = fixture_bytes("namria_edge.txt")
+    lengths = [len(line.rstrip()) for line in edge.splitlines()]
+    parsed = _decode_fixed_width(np.frombuffer(edge, dtype=np.uint8))
+
+    assert min(lengths) < 72 + 8
+    assert parsed.dates.duplicated().any()
+    assert np.isnan(parsed.readings).all(axis=1).any()
+    assert b"999" in fixture_bytes("namria_2015.txt")
+
+
+def test_repeated_dates_keep_the_last_record(fixture_bytes):
+    edge = fixture_bytes("namria_edge.txt")
+    lines = edge.decode("ascii").splitlines()
+    parsed = _decode_fixed_width(np.frombuffer(edge, dtype=np.uint8)).consolidate()
+
+    last = {}
+    for line in lines:
+        last[line.rstrip()[-6:]] = line
+    assert len(parsed.dates) == len(last)
+    #the record of 2 March 2016 is the second one in the file
+    row = parsed.readings[parsed.dates.get_loc(pd.Timestamp("2016-03-02"))]
+    assert row[0] == float(last[" 20316"][:3])
+
+
+def test_hourly_series_rebuilds_the_legacy_frame(fixture_bytes):
+    data = fixture_bytes("namria_2015.txt")
+    expected = legacy_frame(data.decode("ascii")).sort_index(axis=1)
+    series = ElevationParser().parse_data_linestring(data).consolidate().to_series()
+
+    assert len(series) == 24 * expected.shape[1] and series.index.is_monotonic_increasing
+    frame = hourly_frame(series)
+    assert list(frame.columns) == list(expected.columns)
+    np.testing.assert_array_equal(frame.to_numpy(), expected.to_numpy(np.float32))
+
+
+@pytest.mark.parametrize("chunk_size", [81, 1000, 4096])
+def test_streaming_blocks_match_single_pass(chunk_size, fixture_bytes):
+    data = fixture_bytes("namria_2015.txt")
+    whole = _decode_fixed_width(np.frombuffer(data, dtype=np.uint8))
+    streamed = _decode_stream(data, size_hint=len(data), chunk_size=chunk_size)
+
+    np.testing.assert_array_equal(streamed.readings, whole.readings)
+    assert streamed.dates.equals(whole.dates)
+
+
+def test_parse_data_linestring_accepts_text(fixture_bytes):
+    data = fixture_bytes("namria_edge.txt")
+    from_text = ElevationParser().parse_data_linestring(data.decode("ascii"))
+    from_bytes = ElevationParser().parse_data_linestring(data)
+    np.testing.assert_array_equal(from_text.readings, from_bytes.readings)
+
+
+def test_decode_digits_matches_isdigit():
+    alphabet = " 0123456789-x\t"
+    fields = ["".join(chars) for chars in itertools.product(alphabet, repeat=3)]
+    codes = np.frombuffer("".join(fields).encode("ascii"), dtype=np.uint8).reshape(-1, 3)
+
+    values, valid = _decode_digits(codes)
+
+    expected = [int(f.strip()) if f.strip().isdigit() else None for f in fields]
+    assert list(valid) == [e is not None for e in expected]
+    assert [int(v) for v, ok in zip(values, valid) if ok] == [e for e in expected if e is not None]
+
+
+def test_malformed_stamp_names_the_line():
+    data = b"1" * 72 + b"MN 10316\n" + b"1" * 72 + b"MNxx0316\n"
+    with pytest.raises(ValueError, match="line 2"):
+        _decode_fixed_width(np.frombuffer(data, dtype=np.uint8))
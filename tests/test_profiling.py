@@ -0,0 +1,42 @@
+import threading
+import time
+import tracemalloc
+
+from local_classes import profiling
+
+
+def test_profiled_reruns_take_turns(monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_ENV, profiling.MODE_CPROFILE)
+    panels = []
+    monkeypatch.setattr(profiling, "profile_panel", lambda recorder, profiler, page: panels.append(recorder))
+
+    active, overlap = [0], []
+    lock = threading.Lock()
+
+    @profiling.profiled("work")
+    def page():
+        with lock:
+            active[0] += 1
+            overlap.append(active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    errors = []
+    def rerun():
+        try:
+            profiling.run_page(page)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rerun) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert max(overlap) == 1
+    assert len(panels) == 3
+    assert all(list(r.table()["Section"]) == ["page", "· work"] for r in panels)
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from pyproj import Geod
+
+from local_classes.constants import RESOURCES
+from stations import StationIndex, adm3_places, assign_stations
+
+GEOSPATIAL = os.path.join(RESOURCES, "geospatial")
+
+
+@pytest.fixture(scope="module")
+def index():
+    return StationIndex.from_frames(pd.read_csv(os.path.join(GEOSPATIAL, "primary_stations.csv")),
+                                    pd.read_csv(os.path.join(GEOSPATIAL, "secondary_stations.csv")))
+
+
+def brute_force(index, lat, lon, k):
+    '''Every station measured on the WGS84 ellipsoid, nearest first'''
+    _, _, metres = Geod(ellps="WGS84").inv(np.full(len(index), lon), np.full(len(index), lat), index.lon, index.lat)
+    order = np.argsort(metres, kind="stable")[:k]
+    return [index.labels[i] for i in order], metres[order] / 1000
+
+
+def test_nearest_matches_a_brute_force_geodesic_ranking(index):
+    places = adm3_places(GEOSPATIAL)
+    for lat, lon in zip(places["Lat"], places["Long"]):
+        nearest = index.nearest((lat, lon), k=5)
+        labels, km = brute_force(index, lat, lon, 5)
+        assert list(nearest) == labels
+        assert [v["distance"] for v in nearest.values()] == pytest.approx(km, abs=1e-6)
+
+
+def test_chunked_assignment_ranks_like_nearest(index):
+    places = adm3_places(GEOSPATIAL).head(20)
+    table = assign_stations(index, places, k=3, chunk=7)
+    labels = (table["Type"].map({"Primary": "(PS)", "Secondary": "(SS)"}) + " " + table["Station"]).to_numpy().reshape(-1, 3)
+    for ranked, lat, lon in zip(labels, places["Lat"], places["Long"]):
+        assert list(ranked) == list(index.nearest((lat, lon), k=3))
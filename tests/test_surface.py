@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from rasterio.io import MemoryFile
+
+from appcore import SurfaceParser
+
+
+def read_raster(memfile):
+    with MemoryFile(memfile.getvalue()) as mem, mem.open() as src:
+        return src.read(), src.crs, src.descriptions, src.tags(ns="IMAGE_STRUCTURE")
+
+
+@pytest.fixture
+def raster():
+    '''Two-band lon/lat survey raster, as the Modeller exports it'''
+    gridx, gridy = np.linspace(120.55, 120.95, 300), np.linspace(14.35, 14.80, 340)
+    gx, gy = np.meshgrid(gridx, gridy)
+    depth = 2 + 25 * (gx - 120.55) + 3 * np.sin(20 * gy)
+    depth[:20, :30] = np.nan
+    return SurfaceParser().raster_to_bytes(depth, gridx, gridy, "EPSG:4326", variance=np.abs(depth) / 10)
+
+
+def test_surface_model_interpolates_once_per_parameter_set(monkeypatch):
+    import page_design
+    from benchmarks import synthetic
+    from local_classes.cache import LRUCache
+    monkeypatch.setattr(page_design, "SURFACE_CACHE", LRUCache(max_entries=8))
+    runs = []
+    interpolate = SurfaceParser.interpolate_data
+    monkeypatch.setattr(SurfaceParser, "interpolate_data", lambda self, *args, **kwargs: runs.append(args) or interpolate(self, *args, **kwargs))
+
+    data = synthetic.bathymetry_points(200)
+    first = page_design.surface_model("survey", data, 20, "idw")
+    #colour scale, padding and contour changes ask for the same model
+    assert page_design.surface_model("survey", data, 20, "idw") is first and len(runs) == 1
+    page_design.surface_model("survey", data, 30, "idw")
+    page_design.surface_model("other survey", data, 20, "idw")
+    assert len(runs) == 3
+
+
+def test_variance_is_written_as_band_two(raster):
+    bands, crs, descriptions, _ = read_raster(raster)
+    assert bands.shape == (2, 340, 300) and crs.to_epsg() == 4326
+    assert descriptions == ("depth", "kriging_variance")
+    #both bands are blank on the same cells
+    np.testing.assert_array_equal(np.isnan(bands[0]), np.isnan(bands[1]))
+    np.testing.assert_allclose(bands[1], np.abs(bands[0]) / 10, rtol=1e-6)
+
+    gridx, gridy = np.linspace(0, 1, 5), np.linspace(0, 1, 4)
+    single, *_ = read_raster(SurfaceParser().raster_to_bytes(np.ones((4, 5)), gridx, gridy, "EPSG:4326"))
+    assert single.shape == (1, 4, 5)
+
+
+def test_variance_mask_blanks_only_uncertain_cells():
+    z = np.arange(6.0).reshape(2, 3)
+    variance = np.array([[0.0, 1.0, 2.0], [3.0, 4.0, np.nan]])
+    masked = SurfaceParser.mask_variance(z, variance, 2.5)
+    np.testing.assert_array_equal(masked, [[0.0, 1.0, 2.0], [np.nan, np.nan, 5.0]])
+    assert SurfaceParser.mask_variance(z, variance, None) is z and SurfaceParser.mask_variance(z, None, 2.5) is z
+
+
+def test_cog_export_is_tiled_compressed_and_has_overviews(raster):
+    from appcore import RASTER_BLOCKSIZE
+    plain, *_ = read_raster(raster)
+    gridx, gridy = np.linspace(120.55, 120.95, 300), np.linspace(14.35, 14.80, 340)
+    cog = SurfaceParser().raster_to_bytes(np.flipud(plain[0]), gridx, gridy, "EPSG:4326",
+                                          variance=np.flipud(plain[1]), compress="DEFLATE")
+    with MemoryFile(cog.getvalue()) as mem, mem.open() as src:
+        assert src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG" and src.compression.name.upper() == "DEFLATE"
+        assert src.block_shapes[0] == (RASTER_BLOCKSIZE, RASTER_BLOCKSIZE) and src.overviews(1)
+        np.testing.assert_array_equal(src.read(), plain)
+        assert np.isnan(src.nodata)
+    assert len(cog.getvalue()) < len(raster.getvalue())
+
+
+def test_geotiff_is_north_up_with_nodes_at_cell_centres():
+    gridx, gridy = np.array([10.0, 11.0, 12.0]), np.array([20.0, 22.0])
+    z = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    with MemoryFile(SurfaceParser().raster_to_bytes(z, gridx, gridy, "EPSG:4326").getvalue()) as mem, mem.open() as src:
+        assert tuple(src.bounds) == (9.5, 19.0, 12.5, 23.0)
+        #first row is the northern one
+        np.testing.assert_array_equal(src.read(1), [[4.0, 5.0, 6.0], [1.0, 2.0, 3.0]])
+        assert src.xy(0, 0) == (10.0, 22.0)
+
+
+def test_reprojected_cog_matches_plain_warp(raster):
+    parser = SurfaceParser()
+    plain, crs, descriptions, _ = read_raster(parser.reproject_memfile(raster, "EPSG:32651"))
+    cog, cog_crs, cog_descriptions, layout = read_raster(parser.reproject_memfile(raster, "EPSG:32651", compress="DEFLATE"))
+
+    assert crs == cog_crs and crs.to_epsg() == 32651
+    assert descriptions == cog_descriptions == ("depth", "kriging_variance")
+    assert layout["LAYOUT"] == "COG"
+    np.testing.assert_array_equal(cog, plain)
+    assert np.isfinite(plain).any() and np.isnan(plain).any()
+
+
+def test_warp_does_not_depend_on_the_block_size(raster):
+    parser = SurfaceParser()
+    whole, *_ = read_raster(parser.reproject_memfile(raster, "EPSG:32651", block=4096))
+    blocks, *_ = read_raster(parser.reproject_memfile(raster, "EPSG:32651", block=64))
+    np.testing.assert_array_equal(blocks, whole)
+
+
+def test_geographic_thinning_cell_spans_the_metres_on_both_axes():
+    from pyproj import Geod
+    lon_cell, lat_cell = SurfaceParser.thinning_cell(50, {"COMPLETE_CRS_CODE": "EPSG:4326"}, 14.5)
+    geod = Geod(ellps="WGS84")
+    assert geod.inv(120.7, 14.5, 120.7 + lon_cell, 14.5)[2] == pytest.approx(50, rel=1e-6)
+    assert geod.inv(120.7, 14.5 - lat_cell / 2, 120.7, 14.5 + lat_cell / 2)[2] == pytest.approx(50, rel=1e-4)
+    assert SurfaceParser.thinning_cell(50, {"COMPLETE_CRS_CODE": "EPSG:32651"}, 14.5) == 50
+    assert SurfaceParser.thinning_cell(0, {"COMPLETE_CRS_CODE": "EPSG:4326"}, 14.5) is None
+
+
+def test_thinning_bins_by_each_axis_cell():
+    import pandas as pd
+    data = pd.DataFrame({"Longitude": [0.0, 0.5, 0.0, 0.5], "Latitude": [0.0, 0.0, 0.5, 0.5], "depth": [1.0, 2.0, 3.0, 4.0]})
+    assert len(SurfaceParser().thin_soundings(data, (1.0, 0.1), outlier_mad=0)[0]) == 2
+    assert len(SurfaceParser().thin_soundings(data, (0.1, 1.0), outlier_mad=0)[0]) == 2
+    assert len(SurfaceParser().thin_soundings(data, 1.0, outlier_mad=0)[0]) == 1
+
+
+def test_surface_csv_without_a_required_column_names_the_upload():
+    from io import BytesIO
+    upload = BytesIO(b"Longitude,Latitude,elevation\n120.5,14.5,-3\n")
+    upload.name = "survey.csv"
+    with pytest.raises(KeyError, match="survey.csv has no depth column"):
+        SurfaceParser().read_surface_csv(upload)
+
+
+def test_cleaning_counts_soundings_outside_the_survey_crs():
+    from io import BytesIO
+    upload = BytesIO(b"Longitude,Latitude,depth\n120.5,14.5,-3\n-70.0,40.0,-4\n120.6,14.6,0\nx,14.6,-2\n")
+    parser = SurfaceParser()
+    kept = parser.read_surface_csv(upload, crs="EPSG:4253")
+    assert len(kept) == 2
+    assert parser.cleaning == (4, 1, 0, 1, 1, 2)
+    assert SurfaceParser().read_surface_csv(upload).shape == kept.shape
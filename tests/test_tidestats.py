@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from appcore import ElevationParser
+from tidestats import TideAggregates, summarize
+from tests.test_parser import legacy_frame
+
+
+@pytest.fixture
+def tide_file(fixture_bytes):
+    '''(hourly series, legacy hour x date frame) of the fixture NAMRIA file'''
+    data = fixture_bytes("namria_2015.txt")
+    series = ElevationParser().parse_data_linestring(data).consolidate().to_series()
+    return series, legacy_frame(data.decode("ascii")).sort_index(axis=1)
+
+
+def assert_close(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=np.float64), np.asarray(expected, dtype=np.float64),
+                               rtol=1e-6, equal_nan=True)
+
+
+@pytest.mark.parametrize("freq,table", [("ME", "monthly"), ("YE", "yearly")])
+def test_aggregates_match_resample(freq, table, tide_file):
+    series, df = tide_file
+    aggregates = TideAggregates(series)
+    binned = getattr(aggregates, table)
+    resampled = df.T.resample(freq)
+
+    assert binned.index.equals(resampled.mean().index)
+    assert_close(binned["mean"], resampled.mean().mean(axis=1))
+    assert_close(binned["max"], resampled.max().max(axis=1))
+    assert_close(binned["min"], resampled.min().min(axis=1))
+    assert_close(getattr(aggregates, f"{table}_hourly"), resampled.mean())
+
+
+def test_daily_aggregates_match_groupby(tide_file):
+    series, df = tide_file
+    daily = TideAggregates(series).daily
+    by_day = series.groupby(series.index.normalize())
+
+    assert_close(daily["mean"], by_day.mean())
+    assert_close(daily["max"], df.T.max(axis=1))
+    assert_close(daily["min"], df.T.min(axis=1))
+    assert list(daily["count"]) == list(df.notna().sum())
+
+
+def test_single_file_report_matches_legacy(tide_file):
+    series, df = tide_file
+    report = summarize(series).monthly_report
+
+    monthly_avg = df.T.resample("ME").mean().mean(axis=1).dropna()
+    slope, intercept = np.polyfit(np.arange(len(monthly_avg)), monthly_avg, 1)
+    mtl = (df.T.max() + df.T.min()).div(2).mean()
+    mtr = (df.T.max() - df.T.min()).mean()
+
+    assert report.mtl == pytest.approx(mtl)
+    assert report.mtr == pytest.approx(mtr)
+    assert report.slope == pytest.approx(slope)
+    assert report.intercept == pytest.approx(intercept)
+
+
+def test_multi_file_report_matches_legacy(tide_file):
+    series, df = tide_file
+    report = summarize(series).yearly_report
+
+    dfmax = df.T.max(axis=1).dropna()
+    dfmin = df.T.min(axis=1).dropna()
+    yearly_avg = df.T.resample("YE").mean().mean(axis=1)
+
+    assert report.mtr == pytest.approx((dfmax - dfmin).mean())
+    assert report.mtl == pytest.approx((dfmax + dfmin).div(2).mean())
+    assert report.msl == pytest.approx(yearly_avg.mean())
+
+
+def test_single_file_msl_is_the_regression_at_the_first_month(tide_file):
+    series, df = tide_file
+    report = summarize(series).monthly_report
+
+    monthly_avg = df.T.resample("ME").mean().mean(axis=1).dropna()
+    slope, intercept = np.polyfit(np.arange(len(monthly_avg)), monthly_avg, 1)
+    assert report.msl == pytest.approx(intercept)
+
+
+@pytest.mark.parametrize("days,value", [(0, np.nan), (40, np.nan), (20, 150.0)])
+def test_unusable_data_raises_value_error(days, value):
+    hours = pd.date_range("2020-01-01", periods=days * 24, freq="h")
+    series = pd.Series(np.full(len(hours), value, dtype=np.float32), index=hours)
+    with pytest.raises(ValueError):
+        summarize(series)
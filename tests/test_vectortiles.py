@@ -0,0 +1,155 @@
+import struct
+
+import pytest
+import shapely
+import geopandas as gpd
+
+from vectortiles import encode_tile, build_tiles, current_tiles, EXTENT, POINT, LINESTRING, POLYGON
+import vectortiles
+
+
+def read_varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        value |= (byte & 0x7F) << shift
+        i, shift = i + 1, shift + 7
+        if byte < 0x80:
+            return value, i
+
+
+def read_fields(data):
+    '''(field number, value) pairs of a protobuf message; varints as ints, the rest as bytes'''
+    i, fields = 0, []
+    while i < len(data):
+        key, i = read_varint(data, i)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = read_varint(data, i)
+        elif wire == 1:
+            value, i = data[i:i + 8], i + 8
+        elif wire == 2:
+            size, i = read_varint(data, i)
+            value, i = data[i:i + size], i + size
+        else:
+            raise AssertionError(f"unexpected wire type {wire}")
+        fields.append((number, value))
+    return fields
+
+
+def packed(data):
+    values, i = [], 0
+    while i < len(data):
+        value, i = read_varint(data, i)
+        values.append(value)
+    return values
+
+
+def read_value(data):
+    number, value = read_fields(data)[0]
+    if number == 1:
+        return value.decode("utf-8")
+    if number == 3:
+        return struct.unpack("<d", value)[0]
+    if number == 6:
+        return (value >> 1) ^ -(value & 1)
+    if number == 7:
+        return bool(value)
+    raise AssertionError(f"unexpected value field {number}")
+
+
+def read_paths(commands):
+    '''[(command, points)] of a geometry, with the cursor deltas resolved'''
+    x = y = i = 0
+    paths = []
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        points = []
+        if command != 7:
+            for _ in range(count):
+                dx, dy = ((v >> 1) ^ -(v & 1) for v in commands[i:i + 2])
+                x, y, i = x + dx, y + dy, i + 2
+                points.append((x, y))
+        paths.append((command, points))
+    return paths
+
+
+def signed_area(ring):
+    '''Twice the signed area, positive clockwise with y pointing down'''
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+
+
+def decode(tile):
+    (number, layer), = read_fields(tile)
+    assert number == 3
+    fields = read_fields(layer)
+    meta = {n: v for n, v in fields if n in (1, 5, 15)}
+    keys = [v.decode("utf-8") for n, v in fields if n == 3]
+    values = [read_value(v) for n, v in fields if n == 4]
+    features = []
+    for feature in (read_fields(v) for n, v in fields if n == 2):
+        feature = dict(feature)
+        tags = packed(feature.get(2, b""))
+        properties = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+        features.append((feature[3], read_paths(packed(feature[4])), properties))
+    return meta[1].decode("utf-8"), meta[15], meta[5], features
+
+
+def rings(paths):
+    out = []
+    for command, points in paths:
+        if command == 1:
+            out.append(list(points))
+        elif command == 2:
+            out[-1].extend(points)
+    return out
+
+
+def test_tile_round_trips_geometry_winding_and_tags():
+    #exterior counter-clockwise and hole clockwise on input, so the encoder has to flip both
+    polygon = shapely.Polygon([(100, 100), (100, 900), (900, 900), (900, 100)],
+                              [[(300, 300), (600, 300), (600, 600), (300, 600)]])
+    line = shapely.LineString([(0, 0), (50, 10), (50, 10), (4096, 4096)])
+    points = shapely.MultiPoint([(5, 5), (10, 20)])
+    properties = [{"ADM3_EN": "Orani", "ADM2_EN": "Bataan"}, {"SID": 7, "WIND": 12.5, "MISSING": None},
+                  {"ADM3_EN": "Orani", "ACTIVE": True}]
+
+    name, version, extent, features = decode(encode_tile("boundaries", [polygon, line, points], properties))
+    assert (name, version, extent) == ("boundaries", 2, EXTENT)
+    (poly_type, poly_paths, poly_props), (line_type, line_paths, line_props), (point_type, point_paths, point_props) = features
+
+    assert poly_type == POLYGON and poly_props == properties[0]
+    exterior, hole = rings(poly_paths)
+    assert [command for command, _ in poly_paths] == [1, 2, 7, 1, 2, 7]
+    assert signed_area(exterior) > 0 > signed_area(hole)
+    decoded = shapely.Polygon(exterior, [hole])
+    assert decoded.equals(polygon)
+
+    #the repeated vertex is dropped, the rest survive exactly
+    assert line_type == LINESTRING and line_props == {"SID": 7, "WIND": 12.5}
+    assert rings(line_paths) == [[(0, 0), (50, 10), (4096, 4096)]]
+
+    assert point_type == POINT and point_props == {"ADM3_EN": "Orani", "ACTIVE": True}
+    assert point_paths == [(1, [(5, 5), (10, 20)])]
+
+
+def test_empty_geometries_make_no_tile():
+    assert encode_tile("roads", [shapely.LineString([(3, 3), (3, 3)])], [{}]) == b""
+
+
+def test_tiles_are_read_but_never_cut_by_current_tiles(tmp_path, monkeypatch):
+    folder = tmp_path / "shapefiles" / "roads"
+    folder.mkdir(parents=True)
+    gpd.GeoDataFrame(geometry=[shapely.LineString([(120.5, 14.5), (121.0, 15.0)])], crs="EPSG:4326").to_file(folder / "roads.shp")
+    monkeypatch.setattr(vectortiles, "SHAPEFILES", str(tmp_path / "shapefiles"))
+    monkeypatch.setitem(vectortiles.TILE_LAYERS, "roads", ("roads/roads.shp", []))
+
+    static = tmp_path / "static"
+    assert current_tiles("roads", str(static)) is None
+    metadata = build_tiles("roads", str(static))
+    assert metadata["tiles"] > 0
+    assert current_tiles("roads", str(static)) == metadata
+    monkeypatch.setitem(vectortiles.TILE_LAYERS, "roads", ("roads/missing.shp", []))
+    with pytest.raises(FileNotFoundError):
+        current_tiles("roads", str(static))
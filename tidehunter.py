@@ -0,0 +1,253 @@
+'''Headless batch processing for NAMRIA tide data.
+
+    python tidehunter.py process data/ "archive/*.lev" -o reports --format parquet
+
+Files are grouped by the station code in their date stamps, every station is
+processed on its own worker and the same aggregates and report the Streamlit
+processors show are written under <out>/<station>/, with one summary table
+for the whole run.
+
+    python tidehunter.py stations --places adm3 coastal -k 3 --per-type -o reports
+
+ranks the nearest tide stations of every ADM3 centroid and coastal place (or
+the Lat/Long rows of --points CSVs) into one table per source.
+
+    python tidehunter.py tiles
+
+cuts the roads and boundaries overlays into vector tiles under static/tiles;
+the locator draws them from there, and from simplified GeoJSON until they are cut.
+'''
+import os
+import sys
+import glob
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from namria import parse_many, NAMRIA_STAMP_WIDTH
+from local_classes.constants import Lists, RESOURCES
+from stations import assign_by_type, adm3_places, coastal_places, PLACE_COLUMNS
+from vectortiles import build_tiles, missing_sources, TILE_LAYERS, SHAPEFILES, STATIC_DIR
+from tidestats import summarize, report_text
+
+FORMATS = ("csv", "parquet", "json")
+PLACE_SOURCES = {"adm3": adm3_places, "coastal": coastal_places}
+UNKNOWN_STATION = "unknown"
+
+
+def expand_paths(patterns: list) -> list:
+    '''Files behind the given files, directories and glob patterns, NAMRIA extensions only'''
+    extensions = {f".{ext.lower()}" for ext in Lists.ACCEPTED_UPLOAD_FORMATS.value}
+    found = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or [pattern]
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    found.extend(os.path.join(root, name) for name in names)
+            elif os.path.isfile(match):
+                found.append(match)
+
+    files = [os.path.abspath(f) for f in found if os.path.splitext(f)[1].lower() in extensions]
+    return sorted(set(files))
+
+
+def station_code(path: str) -> str:
+    '''Station code from the date stamp of the first record of a file'''
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip()
+            if len(line) >= NAMRIA_STAMP_WIDTH:
+                return line[-NAMRIA_STAMP_WIDTH:-NAMRIA_STAMP_WIDTH + 2].decode("ascii", "replace").strip() or UNKNOWN_STATION
+    return UNKNOWN_STATION
+
+
+def group_by_station(files: list) -> dict:
+    stations = {}
+    for path in files:
+        stations.setdefault(station_code(path), []).append(path)
+    return stations
+
+
+def write_table(df: pd.DataFrame, path: str, fmt: str):
+    '''Write a table as <path>.<fmt>, keeping the index as a column'''
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    if fmt == "csv":
+        df.to_csv(f"{path}.csv")
+    elif fmt == "parquet":
+        df.to_parquet(f"{path}.parquet")
+    else:
+        df.reset_index().to_json(f"{path}.json", orient="records", date_format="iso", indent=1)
+
+
+def process_station(station: str, paths: list, out_dir: str, fmt: str, msl_basis: str = "auto") -> dict:
+    '''Parse, aggregate and report one station; returns its summary row'''
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            files.append((os.path.basename(path), f.read()))
+
+    ingest = parse_many(files, parallel=False)
+    readings = ingest.readings.consolidate()
+    stats = summarize(readings.to_series())
+    aggregates = stats.aggregates
+
+    #same basis as the pages: monthly for one file, yearly for a merged record
+    if msl_basis == "auto":
+        msl_basis = "monthly" if len(paths) == 1 else "yearly"
+    report = stats.monthly_report if msl_basis == "monthly" else stats.yearly_report
+    trend = stats.monthly_trend
+
+    target = os.path.join(out_dir, station)
+    os.makedirs(target, exist_ok=True)
+    write_table(aggregates.daily, os.path.join(target, "daily"), fmt)
+    write_table(aggregates.monthly, os.path.join(target, "monthly"), fmt)
+    write_table(aggregates.yearly, os.path.join(target, "yearly"), fmt)
+    write_table(aggregates.monthly_hourly.add_prefix("Hour_"), os.path.join(target, "monthly_hourly"), fmt)
+    write_table(ingest.files.set_index("File"), os.path.join(target, "ingest"), fmt)
+    if len(ingest.overlaps):
+        write_table(ingest.overlaps.set_index("Date"), os.path.join(target, "overlaps"), fmt)
+
+    summary = {"Station": station, "Files": len(paths), "Days": len(readings.dates), **report._asdict(),
+               "mk_tau": trend.tau, "mk_p_value": trend.mk_p_value, "sen_slope": trend.sen_slope,
+               "trend": trend.direction}
+    write_table(pd.DataFrame([summary]).set_index("Station"), os.path.join(target, "report"), fmt)
+    with open(os.path.join(target, "report.txt"), "w") as f:
+        f.write(report_text(report))
+
+    return summary
+
+
+def _run_station(args):
+    station, paths, out_dir, fmt, msl_basis = args
+    try:
+        return process_station(station, paths, out_dir, fmt, msl_basis)
+    except (ValueError, KeyError, OSError) as e:
+        return {"Station": station, "Files": len(paths), "Error": str(e)}
+
+
+def process(args) -> int:
+    files = expand_paths(args.paths)
+    if not files:
+        print("No NAMRIA files found.", file=sys.stderr)
+        return 1
+
+    stations = group_by_station(files)
+    jobs = [(station, paths, args.output, args.format, args.msl_basis) for station, paths in sorted(stations.items())]
+    os.makedirs(args.output, exist_ok=True)
+
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        rows = [_run_station(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_run_station, jobs))
+
+    summary = pd.DataFrame(rows).set_index("Station")
+    write_table(summary, os.path.join(args.output, "summary"), args.format)
+
+    failed = summary.index[summary["Error"].notna()] if "Error" in summary else []
+    for station in failed:
+        print(f"{station}: {summary.at[station, 'Error']}", file=sys.stderr)
+    print(f"Processed {len(jobs) - len(failed)} of {len(jobs)} stations from {len(files)} files into {args.output}")
+    return 1 if len(failed) else 0
+
+
+def read_points(path: str) -> pd.DataFrame:
+    '''Lat/Long rows of a CSV as places, named by a Name/Place column or their row number'''
+    points = pd.read_csv(path)
+    points = points.rename(columns={c: c.title() for c in points.columns if c.lower() in ("lat", "long", "name", "place")})
+    if "Name" in points and "Place" not in points:
+        points = points.rename(columns={"Name": "Place"})
+    if "Place" not in points:
+        points["Place"] = [f"Point {i + 1}" for i in range(len(points))]
+    for column in PLACE_COLUMNS:
+        if column not in points:
+            points[column] = ""
+    return points[PLACE_COLUMNS].dropna(subset=["Lat", "Long"])
+
+
+def stations(args) -> int:
+    geospatial = os.path.join(RESOURCES, "geospatial")
+    primary = pd.read_csv(os.path.join(geospatial, "primary_stations.csv"))
+    secondary = pd.read_csv(os.path.join(geospatial, "secondary_stations.csv"))
+
+    names = args.places or ([] if args.points else list(PLACE_SOURCES))
+    sources = {}
+    for name in dict.fromkeys(names):
+        try:
+            sources[name] = PLACE_SOURCES[name](geospatial)
+        except FileNotFoundError as e:
+            print(f"{name}: skipped, {e} is missing", file=sys.stderr)
+    for path in args.points or []:
+        sources[os.path.splitext(os.path.basename(path))[0]] = read_points(path)
+    if not sources:
+        print("No places to assign; name a source or pass --points.", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    for name, places in sources.items():
+        table = assign_by_type(primary, secondary, places, args.rank, args.per_type)
+        write_table(table.set_index("Place"), os.path.join(args.output, f"stations_{name}"), args.format)
+        print(f"{name}: {len(places)} places, {len(table)} rows")
+    return 0
+
+
+def tiles(args) -> int:
+    names = args.layers or list(TILE_LAYERS)
+    missing = missing_sources(names)
+    if len(missing) == len(names):
+        print(f"No tile sources are present; add the shapefiles (.shp and sidecars) under {SHAPEFILES}:", file=sys.stderr)
+        for path in missing.values():
+            print(f"  {os.path.relpath(path, SHAPEFILES)}", file=sys.stderr)
+        return 1
+    built = 0
+    for name in names:
+        try:
+            metadata = build_tiles(name, args.static_dir)
+        except FileNotFoundError as e:
+            print(f"{name}: skipped, {e} is missing", file=sys.stderr)
+            continue
+        built += 1
+        print(f"{name}: {metadata['tiles']} tiles, zoom {metadata['minzoom']}-{metadata['maxzoom']} in {metadata['path']}")
+    return 0 if built else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="tidehunter", description="Headless tideHunter batch processing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    proc = commands.add_parser("process", help="Aggregate and report NAMRIA tide files per station")
+    proc.add_argument("paths", nargs="+", help="NAMRIA files, directories or glob patterns")
+    proc.add_argument("-o", "--output", default="tidehunter_output", help="Output directory")
+    proc.add_argument("-f", "--format", choices=FORMATS, default="csv", help="Table format")
+    proc.add_argument("-w", "--workers", type=int, default=None, help="Stations processed at once (default: CPU count)")
+    proc.add_argument("--msl-basis", choices=("auto", "monthly", "yearly"), default="auto",
+                      help="Average MSL over monthly or yearly means (auto: monthly for a single file)")
+    proc.set_defaults(func=process)
+
+    near = commands.add_parser("stations", help="Nearest tide stations of every municipality or coastal place")
+    near.add_argument("-p", "--places", nargs="+", choices=list(PLACE_SOURCES),
+                      help="Bundled places to assign: adm3 centroids and/or coastal features (default: both, unless --points)")
+    near.add_argument("--points", nargs="+", metavar="CSV", help="Also assign the Lat/Long rows of these CSVs")
+    near.add_argument("-k", "--rank", type=int, default=5, help="Stations ranked per place (default 5)")
+    near.add_argument("--per-type", action="store_true", help="Rank primary and secondary stations separately")
+    near.add_argument("-o", "--output", default="tidehunter_output", help="Output directory")
+    near.add_argument("-f", "--format", choices=FORMATS, default="csv", help="Table format")
+    near.set_defaults(func=stations)
+
+    tile = commands.add_parser("tiles", help="Cut the locator overlays into vector tiles for static serving")
+    tile.add_argument("-l", "--layers", nargs="+", choices=list(TILE_LAYERS), help="Layers to cut (default: all)")
+    tile.add_argument("--static-dir", default=STATIC_DIR, help="Streamlit static folder (default: ./static)")
+    tile.set_defaults(func=tiles)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
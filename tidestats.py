@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+from scipy import stats
+
+# kept free of Streamlit and of the parsers so it can back both the pages and the CLI
+HOURS_PER_DAY = 24
+TREND_ALPHA = 0.05
+
+
+def _safe_divide(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    '''num / den with NaN wherever den is zero'''
+    out = np.full(np.broadcast(num, den).shape, np.nan)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _segments(keys: np.ndarray) -> np.ndarray:
+    '''Start offsets of the runs of equal keys in a sorted key array'''
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+class TideAggregates:
+    '''Daily, monthly and yearly mean/min/max/count/range of a day-aligned hourly
+    tide series, computed in one grouped pass and kept for every chart and report.
+
+    Monthly and yearly `mean` is the mean of the hour-of-day means within the bin,
+    the way the tide reports have always averaged. `monthly_hourly` and
+    `yearly_hourly` hold those hour-of-day means (bin x hour), `hourly_max` and
+    `hourly_min` the extremes of each hour of day over the whole series. Empty
+    bins between the first and last observation are kept as NaN rows, like `resample`.
+    '''
+
+    def __init__(self, series: pd.Series):
+        hours = HOURS_PER_DAY
+        if len(series) == 0:
+            raise ValueError("No tide readings to aggregate")
+
+        matrix = series.values.reshape(-1, hours)
+        days = series.index[::hours]
+
+        #the only full pass over the readings
+        valid = ~np.isnan(matrix)
+        filled = np.where(valid, matrix, 0).astype(np.float64)
+        day_count = valid.sum(axis=1)
+        with np.errstate(invalid="ignore"):
+            day_max = np.fmax.reduce(matrix, axis=1).astype(np.float64)
+            day_min = np.fmin.reduce(matrix, axis=1).astype(np.float64)
+            self.hourly_max = np.fmax.reduce(matrix, axis=0).astype(np.float64)
+            self.hourly_min = np.fmin.reduce(matrix, axis=0).astype(np.float64)
+
+        self.daily = pd.DataFrame({
+            "mean": _safe_divide(filled.sum(axis=1), day_count),
+            "min": day_min,
+            "max": day_max,
+            "count": day_count,
+            "range": day_max - day_min,
+        }, index=days)
+
+        #monthly bins from the sorted days, yearly bins from the monthly ones
+        starts = _segments(days.year.values * 12 + days.month.values)
+        month_sum = np.add.reduceat(filled, starts, axis=0)
+        month_count = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        month_max = np.fmax.reduceat(day_max, starts)
+        month_min = np.fmin.reduceat(day_min, starts)
+        month_labels = pd.DatetimeIndex(days[starts] + pd.offsets.MonthEnd(0))
+        self.monthly, self.monthly_hourly = self._table(month_labels, month_sum, month_count,
+                                                        month_max, month_min, pd.offsets.MonthEnd())
+
+        starts = _segments(month_labels.year.values)
+        self.yearly, self.yearly_hourly = self._table(
+            pd.DatetimeIndex(month_labels[starts] + pd.offsets.YearEnd(0)),
+            np.add.reduceat(month_sum, starts, axis=0),
+            np.add.reduceat(month_count, starts, axis=0),
+            np.fmax.reduceat(month_max, starts),
+            np.fmin.reduceat(month_min, starts),
+            pd.offsets.YearEnd())
+
+    @staticmethod
+    def _table(labels, hourly_sum, hourly_count, maxima, minima, freq):
+        '''Aggregate table and hour-of-day means for one bin size'''
+        hourly_mean = _safe_divide(hourly_sum, hourly_count)
+        valid_hours = hourly_count > 0
+
+        table = pd.DataFrame({
+            "mean": _safe_divide(np.where(valid_hours, hourly_mean, 0).sum(axis=1), valid_hours.sum(axis=1)),
+            "min": minima,
+            "max": maxima,
+            "count": hourly_count.sum(axis=1),
+            "range": maxima - minima,
+        }, index=labels)
+        hourly = pd.DataFrame(hourly_mean, index=labels)
+
+        full = pd.date_range(labels[0], labels[-1], freq=freq)
+        table = table.reindex(full)
+        table["count"] = table["count"].fillna(0).astype(np.int64)
+        return table, hourly.reindex(full)
+
+    def tidal_datums(self):
+        '''Mean tidal range and mean tide level (cm) from the daily extremes'''
+        daily = self.daily.dropna(subset=["max", "min"])
+        mtr = daily["range"].mean()
+        mtl = ((daily["max"] + daily["min"]) / 2).mean()
+        return float(mtr), float(mtl)
+
+    def hourly_datums(self):
+        '''Mean tidal range and mean tide level (cm) from the extremes of each hour of day,
+        as the single file report has always defined them'''
+        mtr = np.nanmean(self.hourly_max - self.hourly_min)
+        mtl = np.nanmean((self.hourly_max + self.hourly_min) / 2)
+        return float(mtr), float(mtl)
+
+
+def linear_regression(x, y):
+    '''Least-squares line through (x, y); returns the fitted values, slope and intercept'''
+    x = np.array(x, dtype=np.float64)
+    y = np.array(y, dtype=np.float64)
+    m, b = np.polyfit(x, y, 1)
+
+    y_pred = m * x + b
+    return y_pred, m, b
+
+
+class TideReport(NamedTuple):
+    '''Tidal summary shared by the processors and the CLI (levels in cm)'''
+    msl: float
+    mtl: float
+    mtr: float
+    slope: float        # cm per month, from the monthly means
+    intercept: float
+    start: pd.Timestamp
+    end: pd.Timestamp
+
+
+def tide_report(aggregates: TideAggregates, msl_basis: str = "monthly") -> TideReport:
+    '''Tidal datums and the temporal regression over the monthly means.
+
+    The monthly (single file) report takes mean sea level from the regression line
+    at the first month and MTL/MTR from the hour-of-day extremes; the yearly one
+    takes the mean of the yearly means and MTL/MTR from the daily extremes.
+    Raises ValueError when there are too few readings for the regression.'''
+    monthly = aggregates.monthly["mean"].dropna()
+    if monthly.empty:
+        raise ValueError("The data holds no valid tide readings.")
+    if len(monthly) < 2:
+        raise ValueError("Not enough points to create a regression calculation. Consider uploading additional points.")
+    y_pred, slope, intercept = linear_regression(list(range(len(monthly))), monthly)
+
+    if msl_basis == "yearly":
+        msl = aggregates.yearly["mean"].mean()
+        mtr, mtl = aggregates.tidal_datums()
+    else:
+        msl = y_pred[0]
+        mtr, mtl = aggregates.hourly_datums()
+    return TideReport(float(msl), mtl, mtr, float(slope), float(intercept),
+                      aggregates.daily.index[0], aggregates.daily.index[-1])
+
+
+def report_text(report: TideReport) -> str:
+    '''Plain-text tide report, as offered for download'''
+    return f"""
+                Mean Sea Level: {report.msl/100:.2f}m
+                Mean Tide Level: {round(report.mtl/100, 2)}m
+                Mean Tidal Range: {round(report.mtr, 2)}cm
+                {'-'*8}
+                TEMPORAL REGRESSION
+                Tidal Linear Equation: y={report.slope:.3f}x + {report.intercept:.3f}
+                Equation of the line: {report.slope:.3f}cm
+                """
+
+
+class TrendTest(NamedTuple):
+    '''Monotonic trend of an evenly spaced series (slopes in units per step)'''
+    n: int
+    slope: float        # least squares
+    intercept: float
+    r_squared: float
+    p_value: float      # of the least-squares slope
+    tau: float          # Mann-Kendall
+    mk_p_value: float
+    sen_slope: float    # Theil-Sen
+
+    @property
+    def direction(self) -> str:
+        if not self.mk_p_value < TREND_ALPHA:
+            return "no significant trend"
+        return "rising" if self.tau > 0 else "falling"
+
+
+def trend_test(values) -> TrendTest:
+    '''Least-squares fit, Mann-Kendall test and Sen's slope over the non-missing values'''
+    y = np.asarray(values, dtype=np.float64)
+    x = np.arange(len(y), dtype=np.float64)
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    n = len(y)
+
+    #too short for a trend, report it as undetermined instead of failing the page
+    if n < 3 or np.ptp(y) == 0:
+        return TrendTest(n, *([np.nan] * 7))
+
+    fit = stats.linregress(x, y)
+    tau, mk_p = stats.kendalltau(x, y)
+    sen = stats.theilslopes(y, x)[0]
+    return TrendTest(n, float(fit.slope), float(fit.intercept), float(fit.rvalue ** 2), float(fit.pvalue),
+                     float(tau), float(mk_p), float(sen))
+
+
+class TideSummary(NamedTuple):
+    '''Everything the tide processors show for one hourly series'''
+    aggregates: TideAggregates
+    monthly_report: TideReport
+    yearly_report: TideReport
+    monthly_trend: TrendTest
+    yearly_trend: TrendTest
+
+
+def summarize(series: pd.Series) -> TideSummary:
+    '''Aggregates, reports and trend tests of a day-aligned hourly tide series'''
+    aggregates = TideAggregates(series)
+    return TideSummary(
+        aggregates,
+        tide_report(aggregates, msl_basis="monthly"),
+        tide_report(aggregates, msl_basis="yearly"),
+        trend_test(aggregates.monthly["mean"]),
+        trend_test(aggregates.yearly["mean"]),
+    )
@@ -0,0 +1,309 @@
+'''Mapbox Vector Tiles (MVT) of the heavy map overlays, served as static files.
+
+A shapefile is cut once per source hash into static/tiles/<layer>-<hash>/{z}/{x}/{y}.pbf,
+which Streamlit serves with server.enableStaticServing, and Leaflet.VectorGrid
+fetches only the tiles in view. The map payload is then a URL template instead
+of the layer's geometry, whatever the size of the layer. Tiles follow
+vector_tile.proto 2.1 and are encoded here, so no tile library is required.
+'''
+import os
+import glob
+import json
+import math
+import shutil
+import struct
+
+import numpy as np
+import shapely
+import geopandas as gpd
+
+from maplayers import simplify, source_hash, DATETIME_COLUMNS
+from local_classes.cache import content_hash
+
+EXTENT = 4096
+# tile units kept past each edge, so strokes are not cut at the tile seams
+BUFFER = 64
+MIN_ZOOM, MAX_ZOOM = 5, 12
+# bumped when the tile layout or encoding changes
+TILES_VERSION = 1
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+SHAPEFILES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "geospatial", "shapefiles")
+WEB_MERCATOR_HALF = 20037508.342789244
+
+# overlays the locator draws from tiles: shapefile under SHAPEFILES and the attributes kept in the tiles
+TILE_LAYERS = {
+    "roads": (os.path.join("roads", "r3_road_diss.shp"), []),
+    "boundaries": (os.path.join("boundaries", "region_3.shp"), ["ADM3_EN", "ADM2_EN"]),
+}
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POINT, LINESTRING, POLYGON = 1, 2, 3
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    '''Length-delimited protobuf field'''
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _varint_field(number: int, value: int) -> bytes:
+    return _varint(number << 3) + _varint(value)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+
+def _value(value) -> bytes:
+    '''Tile Value message of an attribute'''
+    if isinstance(value, (bool, np.bool_)):
+        return _varint_field(7, int(value))
+    if isinstance(value, (int, np.integer)):
+        return _varint_field(6, _zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _varint(3 << 3 | 1) + struct.pack("<d", float(value))
+    return _field(1, str(value).encode("utf-8"))
+
+
+class _Cursor:
+    '''Geometry commands of one feature; coordinates are deltas from the previous point'''
+
+    def __init__(self):
+        self.x = self.y = 0
+        self.commands = []
+
+    def path(self, coords: np.ndarray, ring: bool):
+        #drop the points that quantization merged, and the closing point of a ring
+        keep = np.ones(len(coords), dtype=bool)
+        keep[1:] = np.any(coords[1:] != coords[:-1], axis=1)
+        coords = coords[keep]
+        if ring and len(coords) > 1 and (coords[0] == coords[-1]).all():
+            coords = coords[:-1]
+        if len(coords) < (3 if ring else 2):
+            return False
+
+        deltas = np.diff(coords, axis=0, prepend=[[self.x, self.y]])
+        zigzag = (deltas << 1) ^ (deltas >> 63)
+        self.commands += [_command(MOVE_TO, 1), *zigzag[0].tolist(), _command(LINE_TO, len(coords) - 1)]
+        self.commands += zigzag[1:].ravel().tolist()
+        if ring:
+            self.commands.append(_command(CLOSE_PATH, 1))
+        self.x, self.y = coords[-1].tolist()
+        return True
+
+    def points(self, coords: np.ndarray):
+        deltas = np.diff(coords, axis=0, prepend=[[self.x, self.y]])
+        self.commands += [_command(MOVE_TO, len(coords)), *((deltas << 1) ^ (deltas >> 63)).ravel().tolist()]
+        self.x, self.y = coords[-1].tolist()
+
+
+def _ring_area(coords: np.ndarray) -> int:
+    '''Twice the signed area; positive is clockwise with the tile's y axis pointing down'''
+    x, y = coords[:, 0], coords[:, 1]
+    return int(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+
+def encode_geometry(geometry) -> tuple:
+    '''(GeomType, command integers) of a shapely geometry already in integer tile coordinates'''
+    cursor = _Cursor()
+    kind = shapely.get_type_id(geometry)
+    parts = shapely.get_parts(geometry)
+    if kind == 7:
+        #clipping can leave a collection; keep its highest dimension
+        dimension = shapely.get_dimensions(parts).max(initial=-1)
+        parts = shapely.get_parts(parts[shapely.get_dimensions(parts) == dimension])
+        kind = {0: 4, 1: 5, 2: 6}.get(int(dimension), 4)
+
+    if kind in (0, 4):
+        cursor.points(shapely.get_coordinates(parts).astype(np.int64))
+        return POINT, cursor.commands
+
+    if kind in (1, 2, 5):
+        for line in parts:
+            cursor.path(shapely.get_coordinates(line).astype(np.int64), ring=False)
+        return LINESTRING, cursor.commands
+
+    for polygon in parts:
+        rings = [shapely.get_coordinates(polygon.exterior).astype(np.int64)]
+        rings += [shapely.get_coordinates(hole).astype(np.int64) for hole in polygon.interiors]
+        for i, ring in enumerate(rings):
+            area = _ring_area(ring)
+            if area == 0:
+                if i == 0:
+                    break
+                continue
+            #exterior rings clockwise, holes counter-clockwise
+            if (area > 0) != (i == 0):
+                ring = ring[::-1]
+            if not cursor.path(ring, ring=True) and i == 0:
+                break
+    return POLYGON, cursor.commands
+
+
+def encode_tile(name: str, geometries, properties: list) -> bytes:
+    '''One-layer MVT tile of geometries in tile coordinates and their attribute dicts'''
+    keys, values, features = {}, {}, []
+    for geometry, attributes in zip(geometries, properties):
+        kind, commands = encode_geometry(geometry)
+        if not commands:
+            continue
+        tags = []
+        for key, value in attributes.items():
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(_value(value), len(values)))
+        feature = _field(2, b"".join(map(_varint, tags))) if tags else b""
+        feature += _varint_field(3, kind) + _field(4, b"".join(map(_varint, commands)))
+        features.append(_field(2, feature))
+
+    if not features:
+        return b""
+    layer = _varint_field(15, 2) + _field(1, name.encode("utf-8")) + b"".join(features)
+    layer += b"".join(_field(3, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_field(4, value) for value in values)
+    layer += _varint_field(5, EXTENT)
+    return _field(3, layer)
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    '''Web mercator bounds of a tile, (minx, miny, maxx, maxy) in metres'''
+    size = 2 * WEB_MERCATOR_HALF / 2 ** z
+    return (-WEB_MERCATOR_HALF + x * size, WEB_MERCATOR_HALF - (y + 1) * size,
+            -WEB_MERCATOR_HALF + (x + 1) * size, WEB_MERCATOR_HALF - y * size)
+
+
+def tile_range(bounds, z: int) -> tuple:
+    '''First and last tile columns and rows covering mercator bounds at a zoom'''
+    size = 2 * WEB_MERCATOR_HALF / 2 ** z
+    last = 2 ** z - 1
+    col = lambda v: min(max(int((v + WEB_MERCATOR_HALF) // size), 0), last)
+    row = lambda v: min(max(int((WEB_MERCATOR_HALF - v) // size), 0), last)
+    return col(bounds[0]), row(bounds[3]), col(bounds[2]), row(bounds[1])
+
+
+def cut_tiles(layer: gpd.GeoDataFrame, name: str, zooms=range(MIN_ZOOM, MAX_ZOOM + 1)):
+    '''Yield (z, x, y, tile bytes) of a WGS84 layer, skipping empty tiles'''
+    properties = layer.drop(columns=layer.geometry.name)
+    attributes = properties.to_dict("records") if len(properties.columns) else [{}] * len(layer)
+    mercator = layer.to_crs("EPSG:3857").geometry
+
+    for z in zooms:
+        size = 2 * WEB_MERCATOR_HALF / 2 ** z
+        #half a screen pixel, as for the inline GeoJSON layers
+        geometries = simplify(mercator, size / 512).values
+        valid = ~(shapely.is_empty(geometries) | shapely.is_missing(geometries))
+        tree = shapely.STRtree(geometries[valid])
+        rows = np.flatnonzero(valid)
+
+        x0, y0, x1, y1 = tile_range(shapely.total_bounds(geometries[valid]), z)
+        margin = size * BUFFER / EXTENT
+        scale = EXTENT / size
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                minx, miny, maxx, maxy = tile_bounds(z, x, y)
+                candidates = rows[tree.query(shapely.box(minx - margin, miny - margin, maxx + margin, maxy + margin))]
+                if not len(candidates):
+                    continue
+                clipped = shapely.clip_by_rect(geometries[candidates], minx - margin, miny - margin, maxx + margin, maxy + margin)
+                #tile coordinates: origin at the top-left corner, y down, snapped to the integer grid
+                local = shapely.transform(clipped, lambda c: np.rint((c - [minx, maxy]) * [scale, -scale]))
+                keep = ~shapely.is_empty(local)
+                tile = encode_tile(name, local[keep], [attributes[i] for i in candidates[keep]])
+                if tile:
+                    yield z, x, y, tile
+
+
+def tiles_path(name: str) -> str:
+    '''Folder of a layer's current tiles, relative to the static folder'''
+    shapefile, columns = TILE_LAYERS[name]
+    key = content_hash(source_hash(os.path.join(SHAPEFILES, shapefile)).encode(), json.dumps(columns).encode())
+    return f"tiles/{name}-{key[:16]}-v{TILES_VERSION}"
+
+
+def missing_sources(names=None) -> dict:
+    '''Shapefiles (.shp) of the tile layers that are not present, by layer'''
+    paths = {name: os.path.join(SHAPEFILES, TILE_LAYERS[name][0]) for name in (names or TILE_LAYERS)}
+    return {name: path for name, path in paths.items() if not os.path.exists(path)}
+
+
+def current_tiles(name: str, static_dir: str = STATIC_DIR) -> dict:
+    '''Metadata of a layer's tiles if they are cut for its current source, else None.
+    Raises FileNotFoundError when the shapefile geometry (.shp) is missing.'''
+    path = os.path.join(SHAPEFILES, TILE_LAYERS[name][0])
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    metadata_path = os.path.join(static_dir, tiles_path(name), "metadata.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f)
+
+
+def build_tiles(name: str, static_dir: str = STATIC_DIR) -> dict:
+    '''Cut a layer into static_dir/tiles once per source content; returns its metadata.
+    Raises FileNotFoundError when the shapefile geometry (.shp) is missing.'''
+    metadata = current_tiles(name, static_dir)
+    if metadata is not None:
+        return metadata
+
+    shapefile, columns = TILE_LAYERS[name]
+    path = os.path.join(SHAPEFILES, shapefile)
+    target = os.path.join(static_dir, tiles_path(name))
+    layer = gpd.read_file(path, columns=columns).to_crs("EPSG:4326")
+    layer = layer.drop(columns=[c for c in DATETIME_COLUMNS if c in layer.columns])
+    layer = layer[~(layer.geometry.is_empty | layer.geometry.isna())]
+
+    #cut into a scratch folder and rename it in place, so a server never sees half a layer
+    partial = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(partial, ignore_errors=True)
+    count = 0
+    for z, x, y, tile in cut_tiles(layer, name):
+        folder = os.path.join(partial, str(z), str(x))
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{y}.pbf"), "wb") as f:
+            f.write(tile)
+        count += 1
+
+    west, south, east, north = layer.total_bounds.tolist()
+    metadata = {"name": name, "minzoom": MIN_ZOOM, "maxzoom": MAX_ZOOM, "tiles": count,
+                "bounds": [[south, west], [north, east]], "path": tiles_path(name)}
+    os.makedirs(partial, exist_ok=True)
+    with open(os.path.join(partial, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+    try:
+        os.replace(partial, target)
+    except OSError:
+        #another process finished the same layer first
+        shutil.rmtree(partial, ignore_errors=True)
+
+    #tiles of earlier versions of the source are no longer referenced
+    for stale in glob.glob(os.path.join(static_dir, "tiles", f"{glob.escape(name)}-*")):
+        if os.path.abspath(stale) != os.path.abspath(target) and not stale.endswith(".tmp"):
+            shutil.rmtree(stale, ignore_errors=True)
+    return metadata
+
+
+def vector_grid_options(metadata: dict, style: dict) -> str:
+    '''Leaflet.VectorGrid options of a tile layer, drawn on canvas and overzoomed past its last level'''
+    options = {
+        "vectorTileLayerStyles": {metadata["name"]: style},
+        "minNativeZoom": metadata["minzoom"],
+        "maxNativeZoom": metadata["maxzoom"],
+        "bounds": metadata["bounds"],
+        "interactive": False,
+    }
+    #the renderer is a JavaScript reference, so the options are passed to folium as source text
+    return json.dumps(options)[:-1] + ', "rendererFactory": L.canvas.tile}'
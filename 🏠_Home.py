@@ -1,4 +1,5 @@
 import streamlit as st
+from local_classes.profiling import run_page
 import os
 
 def main():
@@ -36,4 +37,4 @@ def main():
     st.caption('Source code was also available at :blue[https://github.com/junealexis13/tideHunter]')
     st.caption('License under Creative Commons Non-Commercial License (CC BY-NC 4.0)')
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    run_page(main)
\ No newline at end of file